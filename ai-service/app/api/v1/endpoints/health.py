@@ -2,8 +2,8 @@
 Health check endpoints
 """
 
-from fastapi import APIRouter, Depends
-from app.core.database import get_db
+from fastapi import APIRouter, Depends, Request
+from app.core.database import get_db, get_pool_metrics, get_status_writer
 from app.core.models import ModelManager
 from app.core.logging import get_logger
 
@@ -47,3 +47,69 @@ async def detailed_health_check(db=Depends(get_db)):
             "models": models_status
         }
     }
+
+
+@router.get("/database/pool")
+async def database_pool_metrics():
+    """Connection pool size, in-use count and checkout wait times"""
+    return get_pool_metrics()
+
+
+@router.get("/database/writes")
+async def database_write_stats():
+    """Batched status write counters"""
+    status_writer = get_status_writer()
+    if status_writer is None:
+        return {"enabled": False}
+    return {"enabled": True, **status_writer.get_stats()}
+
+
+@router.get("/queue")
+async def job_queue_stats(request: Request):
+    """Job queue depth and worker pool activity"""
+    return {
+        "queue": await request.app.state.job_queue.get_stats(),
+        "workers": request.app.state.worker_pool.get_stats()
+    }
+
+
+@router.get("/cache")
+async def result_cache_stats(request: Request):
+    """Result cache and face detection cache hit/miss counters"""
+    model_manager = request.app.state.model_manager
+    result_cache = model_manager.result_cache
+    return {
+        "results": {"enabled": False} if result_cache is None
+        else {"enabled": True, **result_cache.get_stats()},
+        "face_detections": model_manager.face_detector.get_stats()
+    }
+
+
+@router.get("/models")
+async def model_registry_stats(request: Request):
+    """Resident models, memory budget usage and load/eviction counters"""
+    return request.app.state.model_manager.registry.get_stats()
+
+
+@router.get("/batching")
+async def model_batching_stats(request: Request):
+    """Micro-batch sizes, queue waits and forward pass times per batched model"""
+    return request.app.state.model_manager.get_batching_stats()
+
+
+@router.get("/storage")
+async def storage_stats(request: Request):
+    """Object storage upload counters"""
+    uploader = request.app.state.uploader
+    if uploader is None:
+        return {"enabled": False}
+    return {"enabled": True, **uploader.get_stats()}
+
+
+@router.get("/rate-limit")
+async def rate_limit_stats(request: Request):
+    """Rate limiter configuration and allowed/limited counters"""
+    rate_limiter = getattr(request.app.state, "rate_limiter", None)
+    if rate_limiter is None:
+        return {"enabled": False}
+    return {"enabled": True, **rate_limiter.get_stats()}
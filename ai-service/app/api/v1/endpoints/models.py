@@ -41,5 +41,5 @@ async def get_model_status(model_name: str, request: Request):
     return {
         "model": model_name,
         "loaded": is_loaded,
-        "status": model_manager.model_status.get(model_name, "unknown")
+        "status": model_manager.registry.status(model_name)
     }
@@ -3,19 +3,38 @@ Image transformation endpoints
 """
 
 import os
+import json
 import asyncio
 import uuid
-from typing import Dict, Any
-from fastapi import APIRouter, Request, BackgroundTasks, HTTPException, Depends
-from pydantic import BaseModel
+from typing import Dict, Any, List, Optional
+from fastapi import APIRouter, Request, HTTPException, Depends, UploadFile, File, Form
+from fastapi.responses import Response, StreamingResponse
+from pydantic import BaseModel, conint
 from app.core.database import get_db, DatabaseManager
-from app.core.exceptions import ValidationError, ProcessingError
+from app.core.exceptions import ValidationError, ProcessingError, FileError
+from app.core.queue import MAX_PRIORITY, MIN_PRIORITY, Job
+from app.core.events import TERMINAL_EVENTS, make_event, track_progress
+from app.core.status_cache import invalidate_transformations
+from app.core.models import PIPELINE_TYPE, OUTPUT_FORMATS, OUTPUT_SUFFIXES
+from app.core.storage import guess_mime_type
+from app.core.metrics import TRANSFORMATION_LATENCY, TRANSFORMATIONS, stage_timer
 from app.core.logging import get_logger
 from app.core.config import settings
 
 router = APIRouter()
 logger = get_logger(__name__)
 
+Priority = conint(ge=MIN_PRIORITY, le=MAX_PRIORITY)
+
+VALID_TRANSFORMATION_TYPES = [
+    'background_removal',
+    'style_transfer', 
+    'age_progression',
+    'face_enhancement',
+    'object_removal',
+    'background_replacement'
+]
+
 
 class TransformationRequest(BaseModel):
     """Request model for image transformation"""
@@ -23,6 +42,21 @@ class TransformationRequest(BaseModel):
     input_image_path: str
     transformation_type: str
     parameters: Dict[str, Any]
+    priority: Priority = 0
+
+
+class PipelineStep(BaseModel):
+    """A single step of a transformation pipeline"""
+    transformation_type: str
+    parameters: Dict[str, Any] = {}
+
+
+class PipelineRequest(BaseModel):
+    """Request model for a chained multi-step transformation"""
+    transformation_id: str
+    input_image_path: str
+    steps: List[PipelineStep]
+    priority: Priority = 0
 
 
 class TransformationResponse(BaseModel):
@@ -34,10 +68,19 @@ class TransformationResponse(BaseModel):
     processing_time_ms: int = None
 
 
+class BatchTransformationRequest(BaseModel):
+    """Request model for a batch of image transformations"""
+    items: List[TransformationRequest]
+
+
+class BatchTransformationResponse(BaseModel):
+    """Response model for a batch of transformations"""
+    results: List[TransformationResponse]
+
+
 @router.post("/process", response_model=TransformationResponse)
 async def process_transformation(
     request: TransformationRequest,
-    background_tasks: BackgroundTasks,
     app_request: Request,
     db=Depends(get_db)
 ):
@@ -50,52 +93,256 @@ async def process_transformation(
     )
     
     # Validate transformation type
-    valid_types = [
-        'background_removal',
-        'style_transfer', 
-        'age_progression',
-        'face_enhancement',
-        'object_removal',
-        'background_replacement'
-    ]
-    
-    if request.transformation_type not in valid_types:
+    if request.transformation_type not in VALID_TRANSFORMATION_TYPES:
         raise ValidationError(f"Invalid transformation type: {request.transformation_type}")
     
     # Check if input file exists
     if not os.path.exists(request.input_image_path):
         raise ValidationError(f"Input image not found: {request.input_image_path}")
     
-    # Update transformation status to processing
-    await DatabaseManager.update_transformation_status(
-        request.transformation_id, 
-        'processing'
+    # Queue for the worker pool; raises QueueFullError when over the admission limit
+    await app_request.app.state.job_queue.submit(Job(
+        job_id=request.transformation_id,
+        payload={
+            'input_image_path': request.input_image_path,
+            'transformation_type': request.transformation_type,
+            'parameters': request.parameters
+        },
+        priority=request.priority
+    ))
+    # A resubmitted transformation's row was reset by the backend, so drop any cached final status
+    await invalidate_transformations([request.transformation_id])
+    
+    return TransformationResponse(
+        transformation_id=request.transformation_id,
+        status="pending"
     )
+
+
+@router.post("/process/pipeline", response_model=TransformationResponse)
+async def process_pipeline(
+    request: PipelineRequest,
+    app_request: Request,
+    db=Depends(get_db)
+):
+    """Process a chain of transformations with a single decode and encode"""
     
-    # Start background processing
-    background_tasks.add_task(
-        process_image_background,
-        request.transformation_id,
-        request.input_image_path,
-        request.transformation_type,
-        request.parameters,
-        app_request.app.state.model_manager
+    logger.info(
+        "Pipeline request received",
+        transformation_id=request.transformation_id,
+        steps=[step.transformation_type for step in request.steps]
     )
     
+    if not request.steps:
+        raise ValidationError("Pipeline has no steps")
+    
+    if len(request.steps) > settings.PIPELINE_MAX_STEPS:
+        raise ValidationError(
+            f"Pipeline too long: {len(request.steps)} steps (max {settings.PIPELINE_MAX_STEPS})"
+        )
+    
+    # Steps run in one process, so each needs a kernel; queued jobs would only fail later
+    for step in request.steps:
+        if step.transformation_type not in OUTPUT_SUFFIXES:
+            raise ValidationError(f"Unsupported pipeline step: {step.transformation_type}")
+    
+    if not os.path.exists(request.input_image_path):
+        raise ValidationError(f"Input image not found: {request.input_image_path}")
+    
+    await app_request.app.state.job_queue.submit(Job(
+        job_id=request.transformation_id,
+        payload={
+            'input_image_path': request.input_image_path,
+            'transformation_type': PIPELINE_TYPE,
+            'parameters': {'steps': [step.dict() for step in request.steps]}
+        },
+        priority=request.priority
+    ))
+    await invalidate_transformations([request.transformation_id])
+    
     return TransformationResponse(
         transformation_id=request.transformation_id,
-        status="processing"
+        status="pending"
     )
 
 
+def _parse_in_memory_request(
+    transformation_type: str,
+    parameters: str,
+    output_format: Optional[str]
+) -> Dict[str, Any]:
+    """Validate an in-memory transformation request and decode its JSON parameters"""
+    if transformation_type != PIPELINE_TYPE and transformation_type not in OUTPUT_SUFFIXES:
+        raise ValidationError(f"Invalid transformation type: {transformation_type}")
+    
+    if output_format is not None and output_format not in OUTPUT_FORMATS:
+        raise ValidationError(f"Invalid output format: {output_format}")
+    
+    try:
+        parsed = json.loads(parameters or "{}")
+    except json.JSONDecodeError as e:
+        raise ValidationError(f"Invalid parameters JSON: {e}")
+    if not isinstance(parsed, dict):
+        raise ValidationError("Parameters must be a JSON object")
+    
+    if transformation_type == PIPELINE_TYPE:
+        steps = parsed.get('steps')
+        if not isinstance(steps, list) or not steps:
+            raise ValidationError("Pipeline has no steps")
+        if len(steps) > settings.PIPELINE_MAX_STEPS:
+            raise ValidationError(f"Pipeline too long (max {settings.PIPELINE_MAX_STEPS} steps)")
+        for step in steps:
+            if not isinstance(step, dict) or step.get('transformation_type') not in OUTPUT_SUFFIXES:
+                raise ValidationError(f"Invalid pipeline step: {step}")
+            if not isinstance(step.get('parameters') or {}, dict):
+                raise ValidationError("Pipeline step parameters must be a JSON object")
+    return parsed
+
+
+async def _transform_in_memory(
+    app_request: Request,
+    image_bytes: bytes,
+    transformation_type: str,
+    parameters: Dict[str, Any],
+    output_format: Optional[str]
+) -> Response:
+    """Run an in-memory transformation and return the encoded image as the response body"""
+    if not image_bytes:
+        raise FileError("Empty image")
+    if len(image_bytes) > settings.MAX_FILE_SIZE:
+        raise FileError(f"Image too large (max {settings.MAX_FILE_SIZE} bytes)")
+    
+    start_time = asyncio.get_event_loop().time()
+    
+    model_manager = app_request.app.state.model_manager
+    content, media_type = await model_manager.process_bytes(
+        image_bytes,
+        transformation_type,
+        parameters,
+        output_format
+    )
+    
+    processing_time_ms = int((asyncio.get_event_loop().time() - start_time) * 1000)
+    return Response(
+        content=content,
+        media_type=media_type,
+        headers={"X-Processing-Time-Ms": str(processing_time_ms)}
+    )
+
+
+@router.post("/process/upload")
+async def process_upload(
+    app_request: Request,
+    file: UploadFile = File(...),
+    transformation_type: str = Form(...),
+    parameters: str = Form("{}"),
+    output_format: Optional[str] = Form(None)
+):
+    """Transform a multipart-uploaded image in memory and return the encoded result"""
+    
+    parsed = _parse_in_memory_request(transformation_type, parameters, output_format)
+    
+    # The form parser has already spooled the upload (to disk past 1 MB); read
+    # one byte past the limit so an oversized file is not loaded into memory
+    image_bytes = await file.read(settings.MAX_FILE_SIZE + 1)
+    
+    return await _transform_in_memory(
+        app_request, image_bytes, transformation_type, parsed, output_format
+    )
+
+
+@router.post("/process/raw")
+async def process_raw(
+    app_request: Request,
+    transformation_type: str,
+    parameters: str = "{}",
+    output_format: Optional[str] = None
+):
+    """Transform an image sent as the raw request body and return the encoded result"""
+    
+    parsed = _parse_in_memory_request(transformation_type, parameters, output_format)
+    
+    content_length = app_request.headers.get("content-length")
+    if content_length and content_length.isdigit() and int(content_length) > settings.MAX_FILE_SIZE:
+        raise FileError(f"Image too large (max {settings.MAX_FILE_SIZE} bytes)")
+    
+    # A chunked body has no Content-Length, so enforce the limit while reading
+    body = bytearray()
+    async for chunk in app_request.stream():
+        body += chunk
+        if len(body) > settings.MAX_FILE_SIZE:
+            raise FileError(f"Image too large (max {settings.MAX_FILE_SIZE} bytes)")
+    image_bytes = body
+    
+    return await _transform_in_memory(
+        app_request, image_bytes, transformation_type, parsed, output_format
+    )
+
+
+async def run_transformation_job(job: Job, model_manager, uploader=None, events=None) -> None:
+    """Worker pool handler for queued transformation jobs"""
+    
+    # Update transformation status to processing
+    await DatabaseManager.start_transformation(job.job_id)
+    if events is not None:
+        events.publish(job.job_id, 'processing', status='processing')
+    
+    # Stages started while processing are published as the job's progress
+    with track_progress(events, job.job_id):
+        await process_image_background(
+            job.job_id,
+            job.payload['input_image_path'],
+            job.payload['transformation_type'],
+            job.payload['parameters'],
+            model_manager,
+            uploader,
+            events
+        )
+
+
+async def fail_dead_job(job: Job, events=None) -> None:
+    """Dead-letter handler: mark a job that kept dying with its worker as failed"""
+    error_message = f"Processing was interrupted {job.attempts} times"
+    await DatabaseManager.finish_transformation({
+        'transformation_id': job.job_id,
+        'processing_time_ms': None,
+        'error_message': error_message
+    })
+    if events is not None:
+        events.publish(job.job_id, 'failed', status='failed', error_message=error_message)
+
+
+async def store_output(
+    transformation_id: str,
+    output_image_path: str,
+    uploader=None
+) -> Dict[str, Any]:
+    """Upload an output image to object storage, returning its S3 key, MIME type and size"""
+    extension = os.path.splitext(output_image_path)[1] or ".jpg"
+    s3_key = f"transformations/{transformation_id}/output{extension}"
+    mime_type = guess_mime_type(output_image_path)
+    
+    if uploader is not None:
+        file_size = await uploader.upload_file(output_image_path, s3_key, mime_type)
+    else:
+        file_size = os.path.getsize(output_image_path)
+    
+    return {'s3_key': s3_key, 'mime_type': mime_type, 'file_size': file_size}
+
+
 async def process_image_background(
     transformation_id: str,
     input_image_path: str,
     transformation_type: str,
     parameters: Dict[str, Any],
-    model_manager
+    model_manager,
+    uploader=None,
+    events=None
 ):
-    """Background task for processing image transformation"""
+    """Background task for processing image transformation
+    
+    With an event broker, publishes the final status once it is stored.
+    """
     
     start_time = asyncio.get_event_loop().time()
     
@@ -116,38 +363,43 @@ async def process_image_background(
         # Calculate processing time
         processing_time_ms = int((asyncio.get_event_loop().time() - start_time) * 1000)
         
-        # Upload output image to S3 (placeholder for now)
-        # In production, you'd upload to S3 and get the S3 key
-        output_s3_key = f"transformations/{transformation_id}/output.jpg"
+        # Upload output image to S3
+        with stage_timer('upload', transformation_type):
+            stored = await store_output(transformation_id, output_image_path, uploader)
         
-        # Create output image record in database
-        output_image_id = await DatabaseManager.create_output_image(
-            user_id="placeholder",  # This should come from the transformation record
-            original_filename=f"transformed_{transformation_id}.jpg",
-            s3_key=output_s3_key,
-            s3_bucket=settings.AWS_S3_BUCKET,
-            mime_type="image/jpeg",
-            file_size=os.path.getsize(output_image_path),
-            metadata={
-                "transformation_type": transformation_type,
-                "parameters": parameters,
-                "processing_time_ms": processing_time_ms
-            }
-        )
+        # Create the output image record and mark the transformation completed together
+        with stage_timer('db_update', transformation_type):
+            output_image_id = await DatabaseManager.finish_transformation({
+                'transformation_id': transformation_id,
+                'processing_time_ms': processing_time_ms,
+                'output': {
+                    'original_filename': f"transformed_{transformation_id}{os.path.splitext(stored['s3_key'])[1]}",
+                    's3_key': stored['s3_key'],
+                    'mime_type': stored['mime_type'],
+                    'file_size': stored['file_size'],
+                    'metadata': {
+                        "transformation_type": transformation_type,
+                        "parameters": parameters,
+                        "processing_time_ms": processing_time_ms
+                    }
+                }
+            })
         
-        # Update transformation status to completed
-        await DatabaseManager.update_transformation_status(
-            transformation_id,
-            'completed',
-            output_image_id=output_image_id,
-            processing_time_ms=processing_time_ms
-        )
+        if events is not None:
+            events.publish(
+                transformation_id,
+                'completed',
+                status='completed',
+                output_image_id=output_image_id,
+                processing_time_ms=processing_time_ms
+            )
         
         logger.info(
             "Transformation completed successfully",
             transformation_id=transformation_id,
             processing_time_ms=processing_time_ms
         )
+        TRANSFORMATIONS.labels(transformation_type, 'completed').inc()
         
     except Exception as e:
         processing_time_ms = int((asyncio.get_event_loop().time() - start_time) * 1000)
@@ -160,11 +412,188 @@ async def process_image_background(
         )
         
         # Update transformation status to failed
-        await DatabaseManager.update_transformation_status(
-            transformation_id,
-            'failed',
-            error_message=str(e)
+        with stage_timer('db_update', transformation_type):
+            await DatabaseManager.finish_transformation({
+                'transformation_id': transformation_id,
+                'processing_time_ms': processing_time_ms,
+                'error_message': str(e)
+            })
+        if events is not None:
+            events.publish(
+                transformation_id,
+                'failed',
+                status='failed',
+                error_message=str(e),
+                processing_time_ms=processing_time_ms
+            )
+        TRANSFORMATIONS.labels(transformation_type, 'failed').inc()
+    
+    finally:
+        TRANSFORMATION_LATENCY.labels(transformation_type).observe(
+            asyncio.get_event_loop().time() - start_time
+        )
+
+
+async def _process_batch_items(
+    items: List[TransformationRequest],
+    app_request: Request,
+    responses: Dict[str, TransformationResponse]
+) -> List[Dict[str, Any]]:
+    """Process and store a batch's valid items, adding their responses; returns their DB results"""
+    model_manager = app_request.app.state.model_manager
+    results = await model_manager.process_batch([
+        {
+            'image_path': item.input_image_path,
+            'transformation_type': item.transformation_type,
+            'parameters': item.parameters
+        }
+        for item in items
+    ])
+    
+    # Upload successful outputs concurrently over the shared client
+    async def store(item: TransformationRequest, result: Dict[str, Any]) -> Dict[str, Any]:
+        if 'error' in result:
+            return None
+        try:
+            with stage_timer('upload', item.transformation_type):
+                return await store_output(
+                    item.transformation_id, result['output_path'], app_request.app.state.uploader
+                )
+        except Exception as e:
+            result['error'] = str(e)
+            return None
+    
+    stored_outputs = await asyncio.gather(
+        *(store(item, result) for item, result in zip(items, results))
+    )
+    
+    db_results = []
+    for item, result, stored in zip(items, results, stored_outputs):
+        db_result = {
+            'transformation_id': item.transformation_id,
+            'processing_time_ms': result['processing_time_ms']
+        }
+        if 'error' in result:
+            db_result['error_message'] = result['error']
+        else:
+            db_result['output'] = {
+                'original_filename': f"transformed_{item.transformation_id}{os.path.splitext(stored['s3_key'])[1]}",
+                's3_key': stored['s3_key'],
+                'mime_type': stored['mime_type'],
+                'file_size': stored['file_size'],
+                'metadata': {
+                    "transformation_type": item.transformation_type,
+                    "parameters": item.parameters,
+                    "processing_time_ms": result['processing_time_ms']
+                }
+            }
+        db_results.append(db_result)
+        
+        responses[item.transformation_id] = TransformationResponse(
+            transformation_id=item.transformation_id,
+            status="failed" if 'error' in result else "completed",
+            output_image_path=None if 'error' in result else result['output_path'],
+            error_message=result.get('error'),
+            processing_time_ms=result['processing_time_ms']
+        )
+        TRANSFORMATIONS.labels(
+            item.transformation_type, 'failed' if 'error' in result else 'completed'
+        ).inc()
+        TRANSFORMATION_LATENCY.labels(item.transformation_type).observe(
+            result['processing_time_ms'] / 1000
+        )
+    
+    return db_results
+
+
+async def _fail_batch_items(items: List[TransformationRequest], error: BaseException, events) -> None:
+    """Record a batch whose processing was aborted as failed, so no row stays 'processing'"""
+    error_message = str(error) if isinstance(error, Exception) else "Batch processing was interrupted"
+    try:
+        await DatabaseManager.finish_transformations(
+            [
+                {'transformation_id': item.transformation_id, 'processing_time_ms': None, 'error_message': error_message}
+                for item in items
+            ],
+            settings.AWS_S3_BUCKET
+        )
+    except Exception as e:
+        logger.error("Failed to record batch failure", size=len(items), error=str(e))
+        return
+    
+    for item in items:
+        events.publish(item.transformation_id, 'failed', status='failed', error_message=error_message)
+        TRANSFORMATIONS.labels(item.transformation_type, 'failed').inc()
+
+
+@router.post("/process/batch", response_model=BatchTransformationResponse)
+async def process_transformation_batch(
+    request: BatchTransformationRequest,
+    app_request: Request
+):
+    """Process a batch of image transformations and return per-item results"""
+    
+    if len(request.items) > settings.BATCH_MAX_SIZE:
+        raise ValidationError(
+            f"Batch too large: {len(request.items)} items (max {settings.BATCH_MAX_SIZE})"
         )
+    
+    logger.info("Batch transformation request received", size=len(request.items))
+    
+    # Reject invalid items individually instead of failing the whole batch
+    errors: Dict[str, str] = {}
+    valid_items: List[TransformationRequest] = []
+    for item in request.items:
+        if item.transformation_type not in VALID_TRANSFORMATION_TYPES:
+            errors[item.transformation_id] = f"Invalid transformation type: {item.transformation_type}"
+        elif not os.path.exists(item.input_image_path):
+            errors[item.transformation_id] = f"Input image not found: {item.input_image_path}"
+        else:
+            valid_items.append(item)
+    
+    responses: Dict[str, TransformationResponse] = {
+        transformation_id: TransformationResponse(
+            transformation_id=transformation_id,
+            status="failed",
+            error_message=error
+        )
+        for transformation_id, error in errors.items()
+    }
+    
+    if valid_items:
+        await DatabaseManager.start_transformations(
+            [item.transformation_id for item in valid_items]
+        )
+        
+        events = app_request.app.state.event_broker
+        try:
+            db_results = await _process_batch_items(valid_items, app_request, responses)
+            
+            # All final statuses and output image records in one round trip; the
+            # write covers mixed transformation types, so it is labelled 'batch'
+            with stage_timer('db_update', 'batch'):
+                output_image_ids = await DatabaseManager.finish_transformations(db_results, settings.AWS_S3_BUCKET)
+        except BaseException as e:
+            # The items run inside this request rather than as queued jobs, so
+            # no lease recovers them: record them as failed before giving up
+            logger.error("Batch transformation failed", size=len(valid_items), error=str(e))
+            await asyncio.shield(_fail_batch_items(valid_items, e, events))
+            raise
+        
+        for db_result in db_results:
+            failed = 'error_message' in db_result
+            events.publish(
+                db_result['transformation_id'],
+                'failed' if failed else 'completed',
+                status='failed' if failed else 'completed',
+                output_image_id=output_image_ids.get(db_result['transformation_id']),
+                error_message=db_result.get('error_message'),
+                processing_time_ms=db_result['processing_time_ms']
+            )
+    
+    return BatchTransformationResponse(
+        results=[responses[item.transformation_id] for item in request.items]
+    )
 
 
 @router.get("/{transformation_id}/status")
@@ -196,6 +625,70 @@ async def get_transformation_status(transformation_id: str, db=Depends(get_db)):
         raise HTTPException(status_code=500, detail="Internal server error")
 
 
+def _format_event(event: Dict[str, Any]) -> str:
+    """Encode an event as a server-sent event"""
+    return f"event: {event['event']}\ndata: {json.dumps(event, default=str)}\n\n"
+
+
+async def _stream_events(subscription, first_event: Dict[str, Any]):
+    """Yield a transformation's events until it finishes, with keep-alive comments while idle"""
+    try:
+        yield _format_event(first_event)
+        if first_event['event'] in TERMINAL_EVENTS:
+            return
+        
+        while True:
+            event = await subscription.get(timeout=settings.EVENTS_KEEPALIVE_INTERVAL)
+            if event is None:
+                yield ": keep-alive\n\n"
+            elif event['event'] == 'stage' or event['event'] != first_event['event']:
+                # The current state can also arrive through the subscription
+                yield _format_event(event)
+                if event['event'] in TERMINAL_EVENTS:
+                    return
+    finally:
+        subscription.close()
+
+
+@router.get("/{transformation_id}/events")
+async def stream_transformation_events(transformation_id: str, app_request: Request):
+    """Stream a transformation's status and stage events as server-sent events
+    
+    The first event is the current state; the stream ends after the
+    completed or failed event. Replaces polling the status endpoint.
+    """
+    events = app_request.app.state.event_broker
+    
+    # Subscribe before reading the current state so no event falls in between
+    subscription = events.subscribe(transformation_id)
+    try:
+        current = await events.latest(transformation_id)
+        if current is None:
+            # Nothing published recently: read the stored status once
+            transformation = await DatabaseManager.get_transformation(transformation_id)
+            if not transformation:
+                raise HTTPException(status_code=404, detail="Transformation not found")
+            
+            status = transformation['status']
+            current = make_event(
+                transformation_id,
+                'queued' if status == 'pending' else status,
+                status=status,
+                output_image_id=transformation['output_image_id'],
+                error_message=transformation['error_message'],
+                processing_time_ms=transformation['processing_time_ms']
+            )
+    except BaseException:
+        subscription.close()
+        raise
+    
+    return StreamingResponse(
+        _stream_events(subscription, current),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
 @router.get("/{transformation_id}/result")
 async def get_transformation_result(transformation_id: str, db=Depends(get_db)):
     """Get the result of a completed transformation"""
@@ -0,0 +1,238 @@
+"""
+Micro-batching for MorphFlux AI Service
+Collects concurrent requests for a network into batched forward passes
+"""
+
+import asyncio
+import math
+import time
+from dataclasses import dataclass
+from typing import Dict, Any, Callable, List, Optional, Tuple
+import cv2
+import numpy as np
+from app.core.config import settings
+from app.core.exceptions import ValidationError
+from app.core.logging import get_logger
+from app.core.metrics import MODEL_BATCH_SIZE
+
+logger = get_logger(__name__)
+
+# Largest padded batch area, relative to the images' own area, worth one forward pass
+MAX_PADDING_OVERHEAD = 1.5
+
+# forward maps a uint8 NHWC batch to a uint8 NHWC batch of the same shape
+Forward = Callable[[np.ndarray], np.ndarray]
+
+
+@dataclass(frozen=True)
+class BatchPolicy:
+    """Latency and throughput knobs for one model's batcher
+
+    A batch runs once it has max_batch images, or max_wait_ms after its
+    first image arrived. Images are padded to a multiple of pad_multiple
+    (the network's total stride), or, with resize_to, resized to
+    [height, width] and back.
+    """
+    max_batch: int = 8
+    max_wait_ms: float = 5.0
+    pad_multiple: int = 8
+    resize_to: Optional[Tuple[int, int]] = None
+
+
+def batch_policy(model_name: str, input_size: Optional[Tuple[int, int]] = None) -> BatchPolicy:
+    """Get a model's policy: the MODEL_BATCH_* defaults with its MODEL_BATCHING overrides
+
+    input_size is the network's fixed input [height, width], if it has one.
+    Batches of any other shape would not fit, so it is then resize_to.
+    """
+    overrides = dict(settings.MODEL_BATCHING.get(model_name, {}))
+    if overrides.get('resize_to') is not None:
+        overrides['resize_to'] = tuple(overrides['resize_to'])
+    if input_size is not None:
+        input_size = tuple(input_size)
+        if overrides.get('resize_to') not in (None, input_size):
+            logger.warning(
+                "MODEL_BATCHING resize_to does not match the network's fixed input size",
+                model=model_name,
+                resize_to=overrides['resize_to'],
+                input_size=input_size
+            )
+        overrides['resize_to'] = input_size
+    try:
+        policy = BatchPolicy(**{
+            'max_batch': settings.MODEL_BATCH_MAX_SIZE,
+            'max_wait_ms': settings.MODEL_BATCH_MAX_WAIT_MS,
+            'pad_multiple': settings.MODEL_BATCH_PAD_MULTIPLE,
+            **overrides
+        })
+    except TypeError as e:
+        raise ValidationError(f"Invalid MODEL_BATCHING for {model_name}: {str(e)}")
+    if policy.max_batch < 1 or policy.pad_multiple < 1:
+        raise ValidationError(f"Invalid MODEL_BATCHING for {model_name}: max_batch and pad_multiple must be positive")
+    return policy
+
+
+def torch_forward(module: Any, device: str) -> Forward:
+    """Wrap an image-to-image torch module, taking and returning RGB in [0, 1], as a Forward
+
+    Imports torch, so only call it from a torch model's loader.
+    """
+    import torch
+
+    def forward(batch: np.ndarray) -> np.ndarray:
+        with torch.inference_mode():
+            inputs = torch.from_numpy(batch).to(device)
+            # uint8 BGR NHWC -> float RGB NCHW
+            inputs = inputs.permute(0, 3, 1, 2).flip(1).float().div_(255)
+            outputs = module(inputs)
+            outputs = outputs.flip(1).clamp_(0, 1).mul_(255).round_().to(torch.uint8)
+            return outputs.permute(0, 2, 3, 1).contiguous().cpu().numpy()
+
+    return forward
+
+
+def _round_up(value: int, multiple: int) -> int:
+    return math.ceil(value / multiple) * multiple
+
+
+def group_by_shape(shapes: List[Tuple[int, ...]], pad_multiple: int) -> List[List[int]]:
+    """Split images into groups that can share one padded batch shape
+
+    Images are taken smallest first; a group closes when padding the next
+    image in would push the batch past MAX_PADDING_OVERHEAD times the
+    images' own area.
+    """
+    groups: List[List[int]] = []
+    by_channels: Dict[Tuple[int, ...], List[int]] = {}
+    for index, shape in enumerate(shapes):
+        by_channels.setdefault(shape[2:], []).append(index)
+
+    for indices in by_channels.values():
+        current: List[int] = []
+        height = width = area = 0
+        for index in sorted(indices, key=lambda i: shapes[i][0] * shapes[i][1]):
+            h, w = shapes[index][:2]
+            padded_height = max(height, _round_up(h, pad_multiple))
+            padded_width = max(width, _round_up(w, pad_multiple))
+            padded_area = padded_height * padded_width * (len(current) + 1)
+            if current and padded_area > MAX_PADDING_OVERHEAD * (area + h * w):
+                groups.append(current)
+                current, area = [], 0
+                padded_height, padded_width = _round_up(h, pad_multiple), _round_up(w, pad_multiple)
+            current.append(index)
+            height, width, area = padded_height, padded_width, area + h * w
+        if current:
+            groups.append(current)
+    return groups
+
+
+class MicroBatcher:
+    """Runs one network on batches of concurrently submitted images
+
+    Forward passes for a model run one at a time in a thread, and images
+    submitted meanwhile queue for the next batch, so batches grow with load
+    while a lone request waits at most max_wait_ms.
+    """
+
+    def __init__(self, model_name: str, forward: Forward, policy: BatchPolicy):
+        self.model_name = model_name
+        self.forward = forward
+        self.policy = policy
+        self._queue: List[Tuple[np.ndarray, asyncio.Future, float]] = []
+        self._full = asyncio.Event()
+        self._runner: Optional[asyncio.Task] = None
+        self._stats = {'batches': 0, 'images': 0, 'forward_ms': 0.0, 'wait_ms': 0.0}
+
+    async def submit(self, image: np.ndarray) -> np.ndarray:
+        """Run the network on one image as part of a batch"""
+        future = asyncio.get_running_loop().create_future()
+        self._queue.append((image, future, time.perf_counter()))
+        if len(self._queue) >= self.policy.max_batch:
+            self._full.set()
+        if self._runner is None or self._runner.done():
+            self._runner = asyncio.create_task(self._run(), name=f"batcher-{self.model_name}")
+        return await future
+
+    async def _run(self) -> None:
+        while self._queue:
+            # The oldest image sets the deadline; a full batch runs immediately
+            waited = time.perf_counter() - self._queue[0][2]
+            remaining = self.policy.max_wait_ms / 1000 - waited
+            if remaining > 0 and len(self._queue) < self.policy.max_batch:
+                try:
+                    await asyncio.wait_for(self._full.wait(), remaining)
+                except asyncio.TimeoutError:
+                    pass
+
+            batch = self._queue[:self.policy.max_batch]
+            del self._queue[:self.policy.max_batch]
+            if len(self._queue) < self.policy.max_batch:
+                self._full.clear()
+
+            batch = [entry for entry in batch if not entry[1].done()]
+            if batch:
+                await self._run_batch(batch)
+
+    async def _run_batch(self, batch: List[Tuple[np.ndarray, asyncio.Future, float]]) -> None:
+        start = time.perf_counter()
+        images = [image for image, _, _ in batch]
+        try:
+            outputs = await asyncio.to_thread(self._forward_all, images)
+        except Exception as e:
+            logger.error("Batched forward pass failed", model=self.model_name, size=len(batch), error=str(e))
+            outputs = [e] * len(batch)
+
+        self._stats['batches'] += 1
+        self._stats['images'] += len(batch)
+        self._stats['forward_ms'] += (time.perf_counter() - start) * 1000
+        self._stats['wait_ms'] += sum(start - submitted for _, _, submitted in batch) * 1000
+        MODEL_BATCH_SIZE.labels(self.model_name).observe(len(batch))
+
+        for (_, future, _), output in zip(batch, outputs):
+            if future.done():
+                continue
+            if isinstance(output, Exception):
+                future.set_exception(output)
+            else:
+                future.set_result(output)
+
+    def _forward_all(self, images: List[np.ndarray]) -> List[np.ndarray]:
+        """Run every image through the network, one forward pass per shape group"""
+        outputs: List[Optional[np.ndarray]] = [None] * len(images)
+        if self.policy.resize_to is not None:
+            height, width = self.policy.resize_to
+            batch = np.stack([
+                cv2.resize(image, (width, height), interpolation=cv2.INTER_AREA) for image in images
+            ])
+            results = self.forward(batch)
+            for index, (image, result) in enumerate(zip(images, results)):
+                outputs[index] = cv2.resize(result, (image.shape[1], image.shape[0]), interpolation=cv2.INTER_LINEAR)
+            return outputs
+
+        for group in group_by_shape([image.shape for image in images], self.policy.pad_multiple):
+            height = _round_up(max(images[i].shape[0] for i in group), self.policy.pad_multiple)
+            width = _round_up(max(images[i].shape[1] for i in group), self.policy.pad_multiple)
+            batch = np.stack([
+                cv2.copyMakeBorder(
+                    images[i], 0, height - images[i].shape[0], 0, width - images[i].shape[1], cv2.BORDER_REPLICATE
+                )
+                for i in group
+            ])
+            results = self.forward(batch)
+            for i, result in zip(group, results):
+                outputs[i] = np.ascontiguousarray(result[:images[i].shape[0], :images[i].shape[1]])
+        return outputs
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get batching statistics"""
+        batches, images = self._stats['batches'], self._stats['images']
+        return {
+            'max_batch': self.policy.max_batch,
+            'max_wait_ms': self.policy.max_wait_ms,
+            'queued': len(self._queue),
+            'batches': batches,
+            'images': images,
+            'avg_batch_size': round(images / batches, 2) if batches else 0.0,
+            'avg_wait_ms': round(self._stats['wait_ms'] / images, 2) if images else 0.0,
+            'avg_forward_ms': round(self._stats['forward_ms'] / batches, 2) if batches else 0.0,
+        }
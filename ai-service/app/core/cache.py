@@ -0,0 +1,141 @@
+"""
+Result cache for MorphFlux AI Service
+Content-addressed cache of transformation outputs, keyed by input bytes,
+transformation type and parameters
+"""
+
+import asyncio
+import hashlib
+import json
+import os
+import shutil
+from collections import OrderedDict
+from typing import Dict, Any, Optional, Tuple
+from app.core.config import settings
+from app.core.logging import get_logger
+
+logger = get_logger(__name__)
+
+
+def content_hash(data: bytes) -> str:
+    """Content hash of encoded image bytes"""
+    return hashlib.sha256(data).hexdigest()
+
+
+class ResultCache:
+    """Size-bounded LRU cache of output files stored on disk"""
+
+    def __init__(self, directory: Optional[str] = None, max_bytes: Optional[int] = None):
+        self.directory = directory or os.path.join(settings.OUTPUT_DIR, "cache")
+        self.max_bytes = max_bytes or settings.RESULT_CACHE_MAX_BYTES
+        self._entries: "OrderedDict[str, Tuple[str, int]]" = OrderedDict()
+        self._size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def make_key(image_digest: str, transformation_type: str, parameters: Dict[str, Any]) -> str:
+        """Build a cache key from the input content hash, transformation and canonical parameters"""
+        canonical = json.dumps(parameters or {}, sort_keys=True, separators=(",", ":"), default=str)
+        return hashlib.sha256(
+            f"{image_digest}:{transformation_type}:{canonical}".encode()
+        ).hexdigest()
+
+    def _load_sync(self) -> None:
+        os.makedirs(self.directory, exist_ok=True)
+        files = []
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            if os.path.isfile(path) and not name.endswith(".tmp"):
+                stat = os.stat(path)
+                files.append((stat.st_atime, os.path.splitext(name)[0], path, stat.st_size))
+
+        # Oldest access first, so the least recently used are evicted first
+        for _, key, path, size in sorted(files):
+            self._entries[key] = (path, size)
+            self._size += size
+        self._evict()
+
+    async def load(self) -> None:
+        """Index output files already in the cache directory"""
+        await asyncio.to_thread(self._load_sync)
+        logger.info(
+            "Result cache loaded",
+            directory=self.directory,
+            entries=len(self._entries),
+            size_bytes=self._size
+        )
+
+    def get(self, key: str) -> Optional[str]:
+        """Get the cached output path for a key"""
+        entry = self._entries.get(key)
+        if entry is not None and os.path.exists(entry[0]):
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+        if entry is not None:
+            self._remove(key)
+        self.misses += 1
+        return None
+
+    def _store_sync(self, source_path: str, cache_path: str) -> int:
+        # Copy rather than hard link: output paths are rewritten in place by later runs
+        tmp_path = f"{cache_path}.tmp"
+        shutil.copyfile(source_path, tmp_path)
+        os.replace(tmp_path, cache_path)
+        return os.path.getsize(cache_path)
+
+    @staticmethod
+    def copy_out(cache_path: str, output_path: str) -> None:
+        """Copy a cached output to a request's own path; blocking, so run it in a thread
+
+        Requests never hold the cache's file, which eviction deletes. Raises
+        FileNotFoundError if the entry was evicted meanwhile.
+        """
+        tmp_path = f"{output_path}.tmp"
+        shutil.copyfile(cache_path, tmp_path)
+        os.replace(tmp_path, output_path)
+
+    async def put(self, key: str, output_path: str) -> str:
+        """Store an output file under a key and return the cached path"""
+        extension = os.path.splitext(output_path)[1]
+        cache_path = os.path.join(self.directory, f"{key}{extension}")
+        size = await asyncio.to_thread(self._store_sync, output_path, cache_path)
+
+        if key in self._entries:
+            self._remove(key, delete=False)
+        self._entries[key] = (cache_path, size)
+        self._size += size
+        self._evict()
+        return cache_path
+
+    def _remove(self, key: str, delete: bool = True) -> None:
+        path, size = self._entries.pop(key)
+        self._size -= size
+        if delete:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def _evict(self) -> None:
+        """Drop least recently used entries until under the size bound"""
+        while self._size > self.max_bytes and self._entries:
+            key = next(iter(self._entries))
+            self._remove(key)
+            self.evictions += 1
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get cache statistics"""
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "size_bytes": self._size,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions
+        }
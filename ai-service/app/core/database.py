@@ -3,12 +3,17 @@ Database configuration for MorphFlux AI Service
 """
 
 import asyncio
-from typing import AsyncGenerator
+import json
+import time
+import uuid
+from contextlib import asynccontextmanager
+from typing import AsyncGenerator, AsyncIterator, Awaitable, Callable, Dict, Any, List, Optional, Tuple
 import asyncpg
 from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine, async_sessionmaker
 from sqlalchemy.orm import declarative_base
 from app.core.config import settings
 from app.core.logging import get_logger
+from app.core.status_cache import get_status_cache, invalidate_transformations
 
 logger = get_logger(__name__)
 
@@ -34,6 +39,43 @@ AsyncSessionLocal = async_sessionmaker(
 # Create base class for models
 Base = declarative_base()
 
+# Application-lifetime asyncpg pool, created in main.lifespan
+_pool: Optional[asyncpg.Pool] = None
+
+
+class PoolMetrics:
+    """Connection pool usage metrics"""
+    
+    def __init__(self):
+        self.acquisitions = 0
+        self.total_wait_ms = 0.0
+        self.max_wait_ms = 0.0
+        self.in_use = 0
+    
+    def record_acquire(self, wait_ms: float) -> None:
+        """Record a connection checkout"""
+        self.acquisitions += 1
+        self.total_wait_ms += wait_ms
+        self.max_wait_ms = max(self.max_wait_ms, wait_ms)
+        self.in_use += 1
+    
+    def record_release(self) -> None:
+        """Record a connection checkin"""
+        self.in_use -= 1
+    
+    def snapshot(self) -> dict:
+        """Get a snapshot of the metrics"""
+        avg_wait_ms = self.total_wait_ms / self.acquisitions if self.acquisitions else 0.0
+        return {
+            "acquisitions": self.acquisitions,
+            "in_use": self.in_use,
+            "avg_wait_ms": round(avg_wait_ms, 3),
+            "max_wait_ms": round(self.max_wait_ms, 3),
+        }
+
+
+pool_metrics = PoolMetrics()
+
 
 async def init_db() -> None:
     """Initialize database connection"""
@@ -60,6 +102,71 @@ async def get_db() -> AsyncGenerator[AsyncSession, None]:
             await session.close()
 
 
+async def init_pool() -> asyncpg.Pool:
+    """Create the shared asyncpg connection pool"""
+    global _pool
+    if _pool is None:
+        _pool = await asyncpg.create_pool(
+            settings.DATABASE_URL,
+            min_size=settings.DB_POOL_MIN_SIZE,
+            max_size=settings.DB_POOL_MAX_SIZE,
+            max_inactive_connection_lifetime=settings.DB_POOL_MAX_INACTIVE_LIFETIME,
+            statement_cache_size=settings.DB_STATEMENT_CACHE_SIZE,
+        )
+        logger.info(
+            "Database pool created",
+            min_size=settings.DB_POOL_MIN_SIZE,
+            max_size=settings.DB_POOL_MAX_SIZE
+        )
+    return _pool
+
+
+async def close_pool() -> None:
+    """Close the shared asyncpg connection pool"""
+    global _pool
+    if _pool is not None:
+        await _pool.close()
+        _pool = None
+        logger.info("Database pool closed")
+
+
+def get_pool_metrics() -> dict:
+    """Get connection pool size and usage metrics"""
+    metrics = pool_metrics.snapshot()
+    if _pool is None:
+        return {"status": "not_initialized", **metrics}
+    
+    return {
+        "status": "active",
+        "size": _pool.get_size(),
+        "idle": _pool.get_idle_size(),
+        "min_size": _pool.get_min_size(),
+        "max_size": _pool.get_max_size(),
+        **metrics
+    }
+
+
+@asynccontextmanager
+async def acquire_connection() -> AsyncIterator[asyncpg.Connection]:
+    """Check out a connection from the pool, falling back to a direct connection"""
+    if _pool is None:
+        conn = await get_asyncpg_connection()
+        try:
+            yield conn
+        finally:
+            await conn.close()
+        return
+    
+    start = time.perf_counter()
+    conn = await _pool.acquire()
+    pool_metrics.record_acquire((time.perf_counter() - start) * 1000)
+    try:
+        yield conn
+    finally:
+        pool_metrics.record_release()
+        await _pool.release(conn)
+
+
 async def get_asyncpg_connection() -> asyncpg.Connection:
     """Get direct asyncpg connection for raw queries"""
     try:
@@ -70,44 +177,122 @@ async def get_asyncpg_connection() -> asyncpg.Connection:
         raise
 
 
+# Fixed statements. Keeping the text constant lets asyncpg's per-connection
+# statement cache prepare each one once per pooled connection.
+GET_TRANSFORMATION_QUERY = """
+    SELECT t.*, 
+           i1.original_filename as input_filename,
+           i1.s3_key as input_s3_key,
+           i2.original_filename as output_filename,
+           i2.s3_key as output_s3_key
+    FROM transformations t
+    LEFT JOIN images i1 ON t.input_image_id = i1.id
+    LEFT JOIN images i2 ON t.output_image_id = i2.id
+    WHERE t.id = $1
+"""
+
+COMPLETE_TRANSFORMATION_COMMAND = """
+    UPDATE transformations 
+    SET status = $2, 
+        output_image_id = $3,
+        completed_at = NOW(),
+        processing_time_ms = $4
+    WHERE id = $1
+"""
+
+FAIL_TRANSFORMATION_COMMAND = """
+    UPDATE transformations 
+    SET status = $2, 
+        error_message = $3,
+        completed_at = NOW()
+    WHERE id = $1
+"""
+
+SET_TRANSFORMATION_STATUS_COMMAND = """
+    UPDATE transformations 
+    SET status = $2, 
+        started_at = CASE WHEN $2 = 'processing' THEN NOW() ELSE started_at END
+    WHERE id = $1
+"""
+
+CREATE_OUTPUT_IMAGE_COMMAND = """
+    INSERT INTO images (
+        user_id, original_filename, stored_filename, file_path,
+        s3_key, s3_bucket, mime_type, file_size, width, height, metadata
+    ) VALUES ($1, $2, $3, $4, $5, $6, $7, $8, $9, $10, $11)
+    RETURNING id
+"""
+
+START_TRANSFORMATIONS_COMMAND = """
+    UPDATE transformations 
+    SET status = 'processing', 
+        started_at = NOW()
+    WHERE id = ANY($1::uuid[])
+"""
+
+# Records every result of a batch in one statement: output image rows are
+# inserted (owned by the transformation's user) and statuses updated together
+FINISH_TRANSFORMATIONS_COMMAND = """
+    WITH results AS (
+        SELECT *
+        FROM unnest(
+            $1::uuid[], $2::text[], $3::text[], $4::int[], $5::uuid[],
+            $6::text[], $7::text[], $8::text[], $9::text[], $10::int[], $11::text[], $12::text[]
+        ) AS r(
+            transformation_id, status, error_message, processing_time_ms, output_image_id,
+            original_filename, stored_filename, file_path, s3_key, file_size, metadata, mime_type
+        )
+    ),
+    new_images AS (
+        INSERT INTO images (
+            id, user_id, original_filename, stored_filename, file_path,
+            s3_key, s3_bucket, mime_type, file_size, metadata
+        )
+        SELECT r.output_image_id, t.user_id, r.original_filename, r.stored_filename, r.file_path,
+               r.s3_key, $13, r.mime_type, r.file_size, r.metadata::json
+        FROM results r
+        JOIN transformations t ON t.id = r.transformation_id
+        WHERE r.output_image_id IS NOT NULL
+    )
+    UPDATE transformations t
+    SET status = r.status,
+        output_image_id = r.output_image_id,
+        error_message = r.error_message,
+        processing_time_ms = r.processing_time_ms,
+        completed_at = NOW()
+    FROM results r
+    WHERE t.id = r.transformation_id
+"""
+
+
 class DatabaseManager:
     """Database manager for common operations"""
     
     @staticmethod
     async def execute_query(query: str, *args) -> list:
         """Execute a raw SQL query"""
-        conn = await get_asyncpg_connection()
-        try:
+        async with acquire_connection() as conn:
             result = await conn.fetch(query, *args)
             return [dict(row) for row in result]
-        finally:
-            await conn.close()
     
     @staticmethod
     async def execute_command(command: str, *args) -> str:
         """Execute a SQL command"""
-        conn = await get_asyncpg_connection()
-        try:
-            result = await conn.execute(command, *args)
-            return result
-        finally:
-            await conn.close()
+        async with acquire_connection() as conn:
+            return await conn.execute(command, *args)
     
     @staticmethod
     async def get_transformation(transformation_id: str) -> dict:
-        """Get transformation by ID"""
-        query = """
-            SELECT t.*, 
-                   i1.original_filename as input_filename,
-                   i1.s3_key as input_s3_key,
-                   i2.original_filename as output_filename,
-                   i2.s3_key as output_s3_key
-            FROM transformations t
-            LEFT JOIN images i1 ON t.input_image_id = i1.id
-            LEFT JOIN images i2 ON t.output_image_id = i2.id
-            WHERE t.id = $1
-        """
-        results = await DatabaseManager.execute_query(query, transformation_id)
+        """Get transformation by ID, through the status cache if enabled"""
+        status_cache = get_status_cache()
+        if status_cache is None:
+            return await DatabaseManager.fetch_transformation(transformation_id)
+        return await status_cache.get(str(transformation_id), DatabaseManager.fetch_transformation)
+    
+    @staticmethod
+    async def fetch_transformation(transformation_id: str) -> dict:
+        """Get transformation by ID from the database"""
+        results = await DatabaseManager.execute_query(GET_TRANSFORMATION_QUERY, transformation_id)
         return results[0] if results else None
     
     @staticmethod
@@ -120,36 +305,19 @@ class DatabaseManager:
     ) -> None:
         """Update transformation status"""
         if output_image_id:
-            command = """
-                UPDATE transformations 
-                SET status = $2, 
-                    output_image_id = $3,
-                    completed_at = NOW(),
-                    processing_time_ms = $5
-                WHERE id = $1
-            """
             await DatabaseManager.execute_command(
-                command, transformation_id, status, output_image_id, processing_time_ms
+                COMPLETE_TRANSFORMATION_COMMAND,
+                transformation_id, status, output_image_id, processing_time_ms
             )
         elif error_message:
-            command = """
-                UPDATE transformations 
-                SET status = $2, 
-                    error_message = $3,
-                    completed_at = NOW()
-                WHERE id = $1
-            """
             await DatabaseManager.execute_command(
-                command, transformation_id, status, error_message
+                FAIL_TRANSFORMATION_COMMAND, transformation_id, status, error_message
             )
         else:
-            command = """
-                UPDATE transformations 
-                SET status = $2, 
-                    started_at = CASE WHEN $2 = 'processing' THEN NOW() ELSE started_at END
-                WHERE id = $1
-            """
-            await DatabaseManager.execute_command(command, transformation_id, status)
+            await DatabaseManager.execute_command(
+                SET_TRANSFORMATION_STATUS_COMMAND, transformation_id, status
+            )
+        await invalidate_transformations([transformation_id])
     
     @staticmethod
     async def create_output_image(
@@ -164,20 +332,214 @@ class DatabaseManager:
         metadata: dict = None
     ) -> str:
         """Create output image record"""
-        command = """
-            INSERT INTO images (
-                user_id, original_filename, stored_filename, file_path,
-                s3_key, s3_bucket, mime_type, file_size, width, height, metadata
-            ) VALUES ($1, $2, $3, $4, $5, $6, $7, $8, $9, $10, $11)
-            RETURNING id
-        """
         stored_filename = s3_key.split('/')[-1]
         file_path = f"s3://{s3_bucket}/{s3_key}"
         
         result = await DatabaseManager.execute_query(
-            command, user_id, original_filename, stored_filename, file_path,
+            CREATE_OUTPUT_IMAGE_COMMAND, user_id, original_filename, stored_filename, file_path,
             s3_key, s3_bucket, mime_type, file_size, width, height, 
             str(metadata) if metadata else None
         )
         
         return result[0]['id'] if result else None
+    
+    @staticmethod
+    async def start_transformations(transformation_ids: List[str]) -> None:
+        """Mark several transformations as processing in one round trip"""
+        await DatabaseManager.execute_command(START_TRANSFORMATIONS_COMMAND, transformation_ids)
+        await invalidate_transformations(transformation_ids)
+    
+    @staticmethod
+    async def finish_transformations(
+        results: List[Dict[str, Any]],
+        s3_bucket: str
+    ) -> Dict[str, str]:
+        """Record the outcome of several transformations in one round trip
+        
+        Each result has 'transformation_id', 'processing_time_ms' and either
+        'error_message' or an 'output' dict with 'original_filename', 's3_key',
+        'file_size', 'metadata' and optionally 'mime_type' (default
+        image/jpeg). Returns output image IDs by transformation ID.
+        """
+        columns = [[] for _ in range(12)]
+        output_image_ids = {}
+        
+        for result in results:
+            output = result.get('output')
+            output_image_id = str(uuid.uuid4()) if output else None
+            if output_image_id:
+                output_image_ids[result['transformation_id']] = output_image_id
+            
+            row = [
+                result['transformation_id'],
+                'completed' if output else 'failed',
+                result.get('error_message'),
+                result.get('processing_time_ms'),
+                output_image_id,
+                output['original_filename'] if output else None,
+                output['s3_key'].split('/')[-1] if output else None,
+                f"s3://{s3_bucket}/{output['s3_key']}" if output else None,
+                output['s3_key'] if output else None,
+                output['file_size'] if output else None,
+                json.dumps(output.get('metadata')) if output else None,
+                output.get('mime_type', 'image/jpeg') if output else None,
+            ]
+            for column, value in zip(columns, row):
+                column.append(value)
+        
+        await DatabaseManager.execute_command(
+            FINISH_TRANSFORMATIONS_COMMAND, *columns, s3_bucket
+        )
+        await invalidate_transformations(result['transformation_id'] for result in results)
+        return output_image_ids
+    
+    @staticmethod
+    async def start_transformation(transformation_id: str) -> None:
+        """Mark a transformation as processing, batched with other jobs' status writes"""
+        if _status_writer is None:
+            await DatabaseManager.start_transformations([transformation_id])
+        else:
+            await _status_writer.start_transformation(transformation_id)
+    
+    @staticmethod
+    async def finish_transformation(result: Dict[str, Any]) -> Optional[str]:
+        """Record a transformation's outcome, batched with other jobs' status writes
+        
+        result is one finish_transformations result. Returns the output image ID, if any.
+        """
+        if _status_writer is None:
+            output_image_ids = await DatabaseManager.finish_transformations([result], settings.AWS_S3_BUCKET)
+            return output_image_ids.get(result['transformation_id'])
+        return await _status_writer.finish_transformation(result)
+
+
+class StatusWriter:
+    """Write-behind batcher for job status transitions
+    
+    Start and finish writes arriving within window seconds of each other are
+    flushed together: one start_transformations and one finish_transformations
+    statement, which inserts output images and sets final statuses atomically.
+    Callers wait for their flush, so a status is stored before it is
+    published. Flushes run one at a time, so a job's start is always written
+    before its finish.
+    """
+    
+    def __init__(self, window: float, max_batch: int):
+        self.window = window
+        self.max_batch = max_batch
+        self._starts: List[Tuple[str, asyncio.Future]] = []
+        self._finishes: List[Tuple[Dict[str, Any], asyncio.Future]] = []
+        self._pending = asyncio.Event()
+        self._closing = False
+        self._flusher: Optional[asyncio.Task] = None
+        self._stats = {'flushes': 0, 'writes': 0, 'retried_flushes': 0}
+    
+    def start(self) -> None:
+        """Start flushing writes"""
+        self._flusher = asyncio.create_task(self._run(), name="status-writer")
+    
+    async def close(self) -> None:
+        """Flush pending writes and stop"""
+        if self._flusher is not None:
+            self._closing = True
+            self._pending.set()
+            await self._flusher
+            self._flusher = None
+    
+    def _submit(self, batch: list, item: Any) -> asyncio.Future:
+        future = asyncio.get_running_loop().create_future()
+        batch.append((item, future))
+        self._pending.set()
+        return future
+    
+    async def start_transformation(self, transformation_id: str) -> None:
+        await self._submit(self._starts, str(transformation_id))
+    
+    async def finish_transformation(self, result: Dict[str, Any]) -> Optional[str]:
+        return await self._submit(self._finishes, result)
+    
+    async def _run(self) -> None:
+        while True:
+            await self._pending.wait()
+            if not self._closing and len(self._starts) + len(self._finishes) < self.max_batch:
+                # Let concurrent jobs' writes join this flush
+                await asyncio.sleep(self.window)
+            
+            starts, self._starts = self._starts[:self.max_batch], self._starts[self.max_batch:]
+            finishes, self._finishes = self._finishes[:self.max_batch], self._finishes[self.max_batch:]
+            if not self._starts and not self._finishes:
+                self._pending.clear()
+            
+            if starts:
+                await self._write(starts, DatabaseManager.start_transformations, lambda _, item: None)
+            if finishes:
+                await self._write(
+                    finishes,
+                    lambda results: DatabaseManager.finish_transformations(results, settings.AWS_S3_BUCKET),
+                    lambda output_image_ids, item: output_image_ids.get(item['transformation_id'])
+                )
+            
+            if self._closing and not self._starts and not self._finishes:
+                return
+    
+    async def _write(
+        self,
+        batch: List[Tuple[Any, asyncio.Future]],
+        write: Callable[[list], Awaitable[Any]],
+        result_of: Callable[[Any, Any], Any]
+    ) -> None:
+        try:
+            outcome = await write([item for item, _ in batch])
+            self._stats['flushes'] += 1
+            self._stats['writes'] += len(batch)
+        except Exception as e:
+            if len(batch) > 1:
+                # Retry one by one, so a bad row only fails its own job
+                logger.warning("Batched status write failed, retrying individually", size=len(batch), error=str(e))
+                self._stats['retried_flushes'] += 1
+                for entry in batch:
+                    await self._write([entry], write, result_of)
+                return
+            outcome = e
+        
+        for item, future in batch:
+            if future.done():
+                continue
+            if isinstance(outcome, Exception):
+                future.set_exception(outcome)
+            else:
+                future.set_result(result_of(outcome, item))
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """Get batching statistics"""
+        return {
+            'pending': len(self._starts) + len(self._finishes),
+            'avg_batch_size': round(self._stats['writes'] / self._stats['flushes'], 2) if self._stats['flushes'] else 0.0,
+            **self._stats
+        }
+
+
+# Application-lifetime status writer, started in main.lifespan
+_status_writer: Optional[StatusWriter] = None
+
+
+async def start_status_writer() -> Optional[StatusWriter]:
+    """Start batching job status writes"""
+    global _status_writer
+    if settings.STATUS_WRITE_BATCHING and _status_writer is None:
+        _status_writer = StatusWriter(settings.STATUS_WRITE_WINDOW, settings.STATUS_WRITE_MAX_BATCH)
+        _status_writer.start()
+    return _status_writer
+
+
+async def stop_status_writer() -> None:
+    """Flush pending status writes and stop batching"""
+    global _status_writer
+    if _status_writer is not None:
+        writer, _status_writer = _status_writer, None
+        await writer.close()
+
+
+def get_status_writer() -> Optional[StatusWriter]:
+    """Get the status writer, if batching is enabled"""
+    return _status_writer
@@ -0,0 +1,42 @@
+"""
+Compute device selection for MorphFlux AI Service
+Resolves DEVICE=auto lazily, so torch is imported only by torch-backed models
+"""
+
+from typing import Optional
+from app.core.config import settings
+from app.core.logging import get_logger
+
+logger = get_logger(__name__)
+
+_resolved: Optional[str] = None
+
+
+def resolve_device() -> str:
+    """Get the device for torch models, importing torch on the first call"""
+    global _resolved
+    if _resolved is not None:
+        return _resolved
+
+    device = settings.DEVICE
+    if device == "auto":
+        try:
+            import torch
+        except ImportError:
+            device = "cpu"
+        else:
+            if torch.cuda.is_available():
+                device = "cuda"
+            elif hasattr(torch.backends, 'mps') and torch.backends.mps.is_available():
+                device = "mps"
+            else:
+                device = "cpu"
+
+    _resolved = device
+    logger.info("Compute device resolved", device=device, configured=settings.DEVICE)
+    return device
+
+
+def current_device() -> str:
+    """Get the resolved device, or the configured value if no torch model has loaded yet"""
+    return _resolved or settings.DEVICE
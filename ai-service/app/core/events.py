@@ -0,0 +1,294 @@
+"""
+Progress events for MorphFlux AI Service
+Publishes transformation status and stage events to subscribers, in process or over Redis pub/sub
+"""
+
+import asyncio
+import json
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Any, Optional, Callable, Iterator, Set, Tuple
+from app.core.config import settings
+from app.core.exceptions import ValidationError
+from app.core.logging import get_logger
+
+logger = get_logger(__name__)
+
+# Events after which a transformation publishes nothing more
+TERMINAL_EVENTS = {'completed', 'failed'}
+
+# Share of a job done when each stage starts, for the progress field of stage events
+STAGE_PROGRESS = {
+    'read': 0.05,
+    'decode': 0.1,
+    'detect': 0.2,
+    'kernel': 0.3,
+    'encode': 0.8,
+    'upload': 0.85,
+    'db_update': 0.95,
+}
+
+# Events buffered per subscriber; a subscriber that falls further behind loses the oldest
+SUBSCRIBER_BUFFER = 64
+
+Event = Dict[str, Any]
+
+
+def make_event(transformation_id: str, event: str, **fields: Any) -> Event:
+    """Build an event; event is queued, processing, stage, completed or failed"""
+    return {'transformation_id': transformation_id, 'event': event, 'timestamp': time.time(), **fields}
+
+
+class Subscription:
+    """Events for one transformation, buffered until read"""
+
+    def __init__(self, broker: "EventBroker", transformation_id: str):
+        self.broker = broker
+        self.transformation_id = transformation_id
+        self._events: asyncio.Queue = asyncio.Queue(SUBSCRIBER_BUFFER)
+
+    def deliver(self, event: Event) -> None:
+        if self._events.full():
+            self._events.get_nowait()
+        self._events.put_nowait(event)
+
+    async def get(self, timeout: float) -> Optional[Event]:
+        """Wait for the next event, or None if none arrives within timeout"""
+        try:
+            return await asyncio.wait_for(self._events.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+    def close(self) -> None:
+        """Stop receiving events"""
+        self.broker._unsubscribe(self)
+
+
+class EventBackend(ABC):
+    """Transport for events and store for each transformation's latest event
+
+    Backends hand every published event, from any process they share, to
+    the deliver callback set by the broker.
+    """
+
+    deliver: Callable[[Event], None]
+
+    async def connect(self) -> None:
+        """Open the backend"""
+
+    async def close(self) -> None:
+        """Close the backend"""
+
+    @abstractmethod
+    async def publish(self, event: Event) -> None:
+        """Record an event as its transformation's latest and deliver it"""
+
+    @abstractmethod
+    async def latest(self, transformation_id: str) -> Optional[Event]:
+        """Get the latest event published for a transformation"""
+
+
+class MemoryEventBackend(EventBackend):
+    """In-process backend; subscribers only see events published by this worker"""
+
+    def __init__(self, max_entries: int, retention: float):
+        self.max_entries = max_entries
+        self.retention = retention
+        self._latest: "OrderedDict[str, Event]" = OrderedDict()
+
+    async def publish(self, event: Event) -> None:
+        transformation_id = event['transformation_id']
+        self._latest[transformation_id] = event
+        self._latest.move_to_end(transformation_id)
+        while len(self._latest) > self.max_entries:
+            self._latest.popitem(last=False)
+        self.deliver(event)
+
+    async def latest(self, transformation_id: str) -> Optional[Event]:
+        event = self._latest.get(transformation_id)
+        if event is not None and time.time() - event['timestamp'] > self.retention:
+            return None
+        return event
+
+
+class RedisEventBackend(EventBackend):
+    """Shared backend over Redis pub/sub, so any worker can stream any transformation
+
+    One pattern subscription per process receives every event and fans it
+    out to local subscribers. Latest events are kept as expiring keys.
+    """
+
+    def __init__(self, url: str, channel: str, retention: float):
+        self.url = url
+        self.channel = channel
+        self.retention = retention
+        self._redis = None
+        self._pubsub = None
+        self._listener: Optional[asyncio.Task] = None
+
+    async def connect(self) -> None:
+        import redis.asyncio as redis
+
+        self._redis = redis.from_url(self.url, decode_responses=True)
+        self._pubsub = self._redis.pubsub(ignore_subscribe_messages=True)
+        await self._pubsub.psubscribe(f"{self.channel}:*")
+        self._listener = asyncio.create_task(self._listen(), name="event-listener")
+
+    async def close(self) -> None:
+        if self._listener is not None:
+            self._listener.cancel()
+            await asyncio.gather(self._listener, return_exceptions=True)
+            self._listener = None
+        if self._pubsub is not None:
+            await self._pubsub.close()
+            self._pubsub = None
+        if self._redis is not None:
+            await self._redis.close()
+            self._redis = None
+
+    async def _listen(self) -> None:
+        while True:
+            try:
+                message = await self._pubsub.get_message(timeout=1.0)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error("Event listener failed", error=str(e))
+                await asyncio.sleep(1.0)
+                continue
+            if message is not None and message['type'] == 'pmessage':
+                self.deliver(json.loads(message['data']))
+
+    async def publish(self, event: Event) -> None:
+        data = json.dumps(event, default=str)
+        transformation_id = event['transformation_id']
+        async with self._redis.pipeline(transaction=False) as pipe:
+            pipe.set(f"{self.channel}:latest:{transformation_id}", data, ex=max(1, int(self.retention)))
+            pipe.publish(f"{self.channel}:{transformation_id}", data)
+            await pipe.execute()
+
+    async def latest(self, transformation_id: str) -> Optional[Event]:
+        data = await self._redis.get(f"{self.channel}:latest:{transformation_id}")
+        return json.loads(data) if data is not None else None
+
+
+class EventBroker:
+    """Publishes progress events and streams them to subscribers
+
+    publish() never blocks the caller: events go through one sender task,
+    which keeps each transformation's events in order on every backend.
+    """
+
+    def __init__(self, backend: EventBackend):
+        self.backend = backend
+        self.backend.deliver = self._deliver
+        self._subscriptions: Dict[str, Set[Subscription]] = {}
+        self._outbox: Optional[asyncio.Queue] = None
+        self._sender: Optional[asyncio.Task] = None
+        self._stats = {'published': 0, 'delivered': 0, 'publish_failures': 0}
+
+    async def connect(self) -> None:
+        """Open the backend and start sending events"""
+        await self.backend.connect()
+        self._outbox = asyncio.Queue()
+        self._sender = asyncio.create_task(self._send(), name="event-sender")
+        logger.info("Event broker connected", backend=type(self.backend).__name__)
+
+    async def close(self) -> None:
+        """Send events already published, then close the backend"""
+        if self._sender is not None:
+            await self._outbox.join()
+            self._sender.cancel()
+            await asyncio.gather(self._sender, return_exceptions=True)
+            self._sender = None
+        await self.backend.close()
+
+    def publish(self, transformation_id: str, event: str, **fields: Any) -> None:
+        """Queue an event for a transformation"""
+        if self._outbox is None:
+            return
+        self._outbox.put_nowait(make_event(transformation_id, event, **fields))
+
+    async def _send(self) -> None:
+        while True:
+            event = await self._outbox.get()
+            try:
+                await self.backend.publish(event)
+                self._stats['published'] += 1
+            except Exception as e:
+                self._stats['publish_failures'] += 1
+                logger.warning("Failed to publish event", event=event['event'], error=str(e))
+            finally:
+                self._outbox.task_done()
+
+    def _deliver(self, event: Event) -> None:
+        for subscription in self._subscriptions.get(event['transformation_id'], ()):
+            subscription.deliver(event)
+            self._stats['delivered'] += 1
+
+    def subscribe(self, transformation_id: str) -> Subscription:
+        """Start receiving a transformation's events; close the subscription when done"""
+        subscription = Subscription(self, transformation_id)
+        self._subscriptions.setdefault(transformation_id, set()).add(subscription)
+        return subscription
+
+    def _unsubscribe(self, subscription: Subscription) -> None:
+        subscriptions = self._subscriptions.get(subscription.transformation_id)
+        if subscriptions is not None:
+            subscriptions.discard(subscription)
+            if not subscriptions:
+                del self._subscriptions[subscription.transformation_id]
+
+    async def latest(self, transformation_id: str) -> Optional[Event]:
+        """Get the latest event published for a transformation"""
+        return await self.backend.latest(transformation_id)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get broker statistics"""
+        return {
+            'backend': type(self.backend).__name__,
+            'subscribers': sum(len(subscriptions) for subscriptions in self._subscriptions.values()),
+            'pending': self._outbox.qsize() if self._outbox is not None else 0,
+            **self._stats
+        }
+
+
+def create_event_broker() -> EventBroker:
+    """Create the event broker for the configured backend"""
+    backend_name = settings.EVENTS_BACKEND
+    if backend_name == 'memory':
+        backend = MemoryEventBackend(settings.EVENTS_MEMORY_MAX_ENTRIES, settings.EVENTS_RETENTION)
+    elif backend_name == 'redis':
+        backend = RedisEventBackend(settings.REDIS_URL, settings.EVENTS_CHANNEL, settings.EVENTS_RETENTION)
+    else:
+        raise ValidationError(f"Unknown event backend: {backend_name}")
+
+    return EventBroker(backend)
+
+
+# Broker and transformation that stage events of the running task belong to
+_progress: ContextVar[Optional[Tuple[EventBroker, str]]] = ContextVar('progress', default=None)
+
+
+@contextmanager
+def track_progress(broker: Optional[EventBroker], transformation_id: str) -> Iterator[None]:
+    """Publish stages started within the block as the transformation's stage events"""
+    if broker is None:
+        yield
+        return
+    token = _progress.set((broker, transformation_id))
+    try:
+        yield
+    finally:
+        _progress.reset(token)
+
+
+def report_stage(stage: str) -> None:
+    """Publish a stage event for the transformation being tracked, if any"""
+    progress = _progress.get()
+    if progress is not None:
+        broker, transformation_id = progress
+        broker.publish(transformation_id, 'stage', stage=stage, progress=STAGE_PROGRESS.get(stage))
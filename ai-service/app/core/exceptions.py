@@ -123,3 +123,14 @@ class ServiceUnavailableError(MorphFluxException):
             status_code=503,
             code="SERVICE_UNAVAILABLE"
         )
+
+
+class QueueFullError(MorphFluxException):
+    """Job queue admission limit reached"""
+    
+    def __init__(self, message: str = "Processing queue is full, retry later"):
+        super().__init__(
+            message=message,
+            status_code=503,
+            code="QUEUE_FULL"
+        )
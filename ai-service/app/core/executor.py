@@ -0,0 +1,321 @@
+"""
+CPU executor for MorphFlux AI Service
+Runs CPU-bound image kernels in a bounded process pool so they never block the event loop
+"""
+
+import asyncio
+import multiprocessing
+import uuid
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass
+from multiprocessing.shared_memory import SharedMemory
+from typing import Dict, Any, List, Optional, Tuple, Union
+import numpy as np
+from app.core.config import settings
+from app.core.exceptions import ProcessingError
+from app.core.logging import get_logger
+
+logger = get_logger(__name__)
+
+
+@dataclass(frozen=True)
+class SharedArray:
+    """Descriptor of an ndarray stored in a shared memory block"""
+    name: str
+    shape: Tuple[int, ...]
+    dtype: str
+
+
+def allocate_array(shape: Tuple[int, ...], dtype: np.dtype) -> Tuple[SharedMemory, SharedArray, np.ndarray]:
+    """Create a shared memory block for an array, returning it with a writable view"""
+    dtype = np.dtype(dtype)
+    shm = SharedMemory(create=True, size=max(int(np.prod(shape)) * dtype.itemsize, 1))
+    view = np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+    return shm, SharedArray(shm.name, tuple(shape), dtype.str), view
+
+
+def export_array(array: np.ndarray) -> Tuple[SharedMemory, SharedArray]:
+    """Copy an array into a new shared memory block"""
+    shm, descriptor, view = allocate_array(array.shape, array.dtype)
+    view[...] = array
+    del view
+    return shm, descriptor
+
+
+def import_array(descriptor: SharedArray) -> np.ndarray:
+    """Copy an array out of a shared memory block and release the block"""
+    shm = SharedMemory(name=descriptor.name)
+    try:
+        view = np.ndarray(descriptor.shape, dtype=descriptor.dtype, buffer=shm.buf)
+        array = view.copy()
+        del view
+        return array
+    finally:
+        shm.close()
+        shm.unlink()
+
+
+def release_array(descriptor: SharedArray) -> None:
+    """Release a shared memory block without reading it"""
+    try:
+        shm = SharedMemory(name=descriptor.name)
+    except FileNotFoundError:
+        return
+    shm.close()
+    shm.unlink()
+
+
+def _init_worker() -> None:
+    """Initialize a pool worker process"""
+    import cv2
+    from app.core.processing import get_face_cascade
+
+    # Parallelism comes from the pool; keep OpenCV from oversubscribing cores
+    cv2.setNumThreads(1)
+    get_face_cascade()
+
+
+def _run_kernel(
+    kernel: str,
+    sources: List[SharedArray],
+    parameters: List[Dict[str, Any]]
+) -> List[Union[SharedArray, Exception]]:
+    """Run a kernel over shared input images (executed in a worker process)
+
+    Items are processed in order within one call, so per-process state such
+    as the face cascade is reused across a batch. Kernels listed in
+    OUTPUT_CHANNELS write straight into the output block. A failing item
+    returns its exception instead of aborting the rest.
+    """
+    from app.core.processing import KERNELS, OUTPUT_CHANNELS
+
+    outputs: List[Union[SharedArray, Exception]] = []
+    for source, item_parameters in zip(sources, parameters):
+        shm = SharedMemory(name=source.name)
+        try:
+            image = np.ndarray(source.shape, dtype=source.dtype, buffer=shm.buf)
+            if kernel in OUTPUT_CHANNELS:
+                out_shm, descriptor, out = allocate_array(
+                    image.shape[:2] + (OUTPUT_CHANNELS[kernel],), image.dtype
+                )
+                try:
+                    KERNELS[kernel](image, item_parameters, out=out)
+                except BaseException:
+                    del out
+                    out_shm.close()
+                    out_shm.unlink()
+                    raise
+                del out
+            else:
+                result = np.ascontiguousarray(KERNELS[kernel](image, item_parameters))
+                out_shm, descriptor = export_array(result)
+                del result
+            out_shm.close()
+            del image
+            outputs.append(descriptor)
+        except Exception as e:
+            outputs.append(e)
+        finally:
+            shm.close()
+    return outputs
+
+
+def _discard_result(future: Future) -> None:
+    """Release the output of a job whose caller has gone away"""
+    if future.cancelled() or future.exception() is not None:
+        return
+    for output in future.result():
+        if isinstance(output, SharedArray):
+            release_array(output)
+
+
+class CPUExecutor:
+    """Bounded process pool for CPU-bound image kernels"""
+
+    def __init__(self, max_workers: Optional[int] = None, job_timeout: Optional[float] = None):
+        self.max_workers = max_workers or settings.MAX_CONCURRENT_JOBS
+        self.job_timeout = job_timeout or settings.JOB_TIMEOUT
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._jobs: Dict[str, Future] = {}
+        self._stats = {'completed': 0, 'failed': 0, 'timed_out': 0, 'cancelled': 0}
+
+    @property
+    def running(self) -> bool:
+        """Whether the pool has been started"""
+        return self._pool is not None
+
+    def _create_pool(self) -> ProcessPoolExecutor:
+        """Create the underlying process pool"""
+        context = multiprocessing.get_context(settings.EXECUTOR_START_METHOD)
+        return ProcessPoolExecutor(
+            max_workers=self.max_workers,
+            mp_context=context,
+            initializer=_init_worker
+        )
+
+    def start(self) -> None:
+        """Start the worker processes"""
+        if self._pool is not None:
+            return
+
+        self._pool = self._create_pool()
+        self._slots = asyncio.Semaphore(self.max_workers)
+        logger.info(
+            "CPU executor started",
+            max_workers=self.max_workers,
+            job_timeout=self.job_timeout,
+            start_method=settings.EXECUTOR_START_METHOD
+        )
+
+    def shutdown(self, wait: bool = True) -> None:
+        """Stop the worker processes, cancelling pending jobs"""
+        if self._pool is None:
+            return
+
+        for future in self._jobs.values():
+            future.cancel()
+        self._pool.shutdown(wait=wait, cancel_futures=True)
+        self._pool = None
+        self._jobs.clear()
+        logger.info("CPU executor stopped")
+
+    async def run(
+        self,
+        kernel: str,
+        image: np.ndarray,
+        parameters: Dict[str, Any],
+        job_id: Optional[str] = None,
+        timeout: Optional[float] = None
+    ) -> np.ndarray:
+        """Run a kernel on an image in the process pool"""
+        [output] = await self.run_batch(kernel, [image], [parameters], job_id, timeout)
+        if isinstance(output, Exception):
+            raise output
+        return output
+
+    async def run_batch(
+        self,
+        kernel: str,
+        images: List[np.ndarray],
+        parameters: List[Dict[str, Any]],
+        job_id: Optional[str] = None,
+        timeout: Optional[float] = None
+    ) -> List[Union[np.ndarray, Exception]]:
+        """Run a kernel over several images in a single worker call
+
+        Returns one result per image; per-image failures are returned as
+        exceptions. The timeout defaults to JOB_TIMEOUT per image.
+        """
+        if self._pool is None:
+            raise ProcessingError("CPU executor is not running")
+
+        job_id = job_id or str(uuid.uuid4())
+        timeout = timeout or self.job_timeout * len(images)
+        loop = asyncio.get_running_loop()
+
+        # Hold a slot until the worker is actually free, even if the caller gives up
+        await self._slots.acquire()
+        try:
+            exported = await loop.run_in_executor(
+                None, lambda: [export_array(image) for image in images]
+            )
+        except BaseException:
+            self._slots.release()
+            raise
+
+        shms = [shm for shm, _ in exported]
+        sources = [source for _, source in exported]
+        try:
+            future = self._submit(kernel, sources, parameters)
+        except BaseException:
+            self._slots.release()
+            self._unlink(shms)
+            raise
+
+        self._jobs[job_id] = future
+        future.add_done_callback(lambda _: self._release_slot(loop))
+
+        try:
+            outputs = await asyncio.wait_for(asyncio.wrap_future(future), timeout)
+            results = await loop.run_in_executor(
+                None,
+                lambda: [
+                    import_array(output) if isinstance(output, SharedArray) else output
+                    for output in outputs
+                ]
+            )
+            for result in results:
+                self._stats['failed' if isinstance(result, Exception) else 'completed'] += 1
+            return results
+        except asyncio.TimeoutError:
+            self._stats['timed_out'] += len(images)
+            future.add_done_callback(_discard_result)
+            logger.warning("CPU job timed out", job_id=job_id, kernel=kernel, timeout=timeout)
+            raise ProcessingError(f"Job exceeded timeout of {timeout}s")
+        except asyncio.CancelledError:
+            self._stats['cancelled'] += len(images)
+            future.cancel()
+            future.add_done_callback(_discard_result)
+            raise
+        except BrokenProcessPool:
+            self._stats['failed'] += len(images)
+            self._restart()
+            raise ProcessingError("CPU worker process terminated unexpectedly")
+        finally:
+            self._jobs.pop(job_id, None)
+            self._unlink(shms)
+
+    @staticmethod
+    def _unlink(shms: List[SharedMemory]) -> None:
+        """Release input shared memory blocks"""
+        for shm in shms:
+            shm.close()
+            shm.unlink()
+
+    def _release_slot(self, loop: asyncio.AbstractEventLoop) -> None:
+        """Free a worker slot from the pool's result thread"""
+        try:
+            loop.call_soon_threadsafe(self._slots.release)
+        except RuntimeError:
+            # Event loop already closed during shutdown
+            pass
+
+    def _submit(
+        self,
+        kernel: str,
+        sources: List[SharedArray],
+        parameters: List[Dict[str, Any]]
+    ) -> Future:
+        """Submit a job, replacing the pool once if a worker has died"""
+        try:
+            return self._pool.submit(_run_kernel, kernel, sources, parameters)
+        except BrokenProcessPool:
+            self._restart()
+            return self._pool.submit(_run_kernel, kernel, sources, parameters)
+
+    def _restart(self) -> None:
+        """Replace a broken process pool"""
+        if self._pool is None or not self._pool._broken:
+            return
+
+        logger.warning("CPU executor pool broken, restarting workers")
+        self._pool.shutdown(wait=False, cancel_futures=True)
+        self._pool = self._create_pool()
+
+    def cancel(self, job_id: str) -> bool:
+        """Cancel a job that has not started running yet"""
+        future = self._jobs.get(job_id)
+        if future is None:
+            return False
+        return future.cancel()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get executor statistics"""
+        return {
+            'running': self.running,
+            'max_workers': self.max_workers,
+            'in_flight': len(self._jobs),
+            **self._stats
+        }
@@ -0,0 +1,98 @@
+"""
+Face detection stage for MorphFlux AI Service
+Detects faces once per image content and shares the result between transformations
+"""
+
+import asyncio
+import hashlib
+from collections import OrderedDict
+from typing import Dict, Any, Optional
+import numpy as np
+from app.core.config import settings
+from app.core.executor import CPUExecutor
+from app.core.logging import get_logger
+
+logger = get_logger(__name__)
+
+
+def pixel_hash(image: np.ndarray) -> str:
+    """Content hash of decoded pixels, for images without their source bytes"""
+    digest = hashlib.sha256(repr((image.shape, image.dtype.str)).encode())
+    digest.update(memoryview(np.ascontiguousarray(image)).cast('B'))
+    return digest.hexdigest()
+
+
+class FaceDetectionStage:
+    """Face detection memoized by image content hash with LRU eviction"""
+
+    def __init__(
+        self,
+        executor: CPUExecutor,
+        max_entries: Optional[int] = None,
+        max_side: Optional[int] = None
+    ):
+        self.executor = executor
+        self.max_entries = max_entries or settings.FACE_CACHE_SIZE
+        self.max_side = settings.FACE_DETECTION_MAX_SIDE if max_side is None else max_side
+        self._detections: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._pending: Dict[str, asyncio.Task] = {}
+        self.hits = 0
+        self.misses = 0
+
+    async def detect(self, image: np.ndarray, content_hash: Optional[str] = None) -> np.ndarray:
+        """Get face boxes (N, 4: x, y, w, h) for an image
+
+        content_hash identifies the image, typically a hash of its encoded
+        bytes; when omitted the decoded pixels are hashed.
+        """
+        if content_hash is None:
+            content_hash = await asyncio.to_thread(pixel_hash, image)
+        key = f"{content_hash}:{self.max_side}"
+
+        faces = self._detections.get(key)
+        if faces is not None:
+            self._detections.move_to_end(key)
+            self.hits += 1
+            return faces
+
+        # Concurrent requests for the same image share one detection. It runs
+        # in its own task, so a cancelled caller does not cancel the others
+        task = self._pending.get(key)
+        if task is None:
+            self.misses += 1
+            task = asyncio.ensure_future(self._run_detection(key, image))
+            self._pending[key] = task
+            task.add_done_callback(lambda done: self._finish(key, done))
+        else:
+            self.hits += 1
+        return await asyncio.shield(task)
+
+    async def _run_detection(self, key: str, image: np.ndarray) -> np.ndarray:
+        """Detect faces in the CPU executor and memoize the result"""
+        faces = await self.executor.run('face_detection', image, {'max_side': self.max_side})
+
+        self._detections[key] = faces
+        if len(self._detections) > self.max_entries:
+            self._detections.popitem(last=False)
+
+        logger.debug("Faces detected", faces=len(faces), max_side=self.max_side)
+        return faces
+
+    def _finish(self, key: str, task: asyncio.Task) -> None:
+        """Drop a finished detection from the pending ones"""
+        if self._pending.get(key) is task:
+            del self._pending[key]
+        if not task.cancelled():
+            # Mark retrieved so a failure whose callers were all cancelled is not logged as unhandled
+            task.exception()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get detection cache statistics"""
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._detections),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0
+        }
@@ -0,0 +1,190 @@
+"""
+Prometheus metrics for MorphFlux AI Service
+Stage latency histograms are recorded inline; service state (queue, workers,
+DB pool, caches, rate limiter) is read from existing stats at scrape time
+"""
+
+import asyncio
+import time
+from contextlib import contextmanager
+from typing import Any, Iterator, Optional
+from prometheus_client import REGISTRY, Counter, Gauge, Histogram, start_http_server
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+from app.core.config import settings
+from app.core.events import report_stage
+from app.core.logging import get_logger
+
+logger = get_logger(__name__)
+
+# From 5ms decodes up to multi-minute full-resolution GrabCut runs
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+STAGE_LATENCY = Histogram(
+    'morphflux_stage_duration_seconds',
+    'Latency of one processing stage',
+    ['stage', 'transformation_type'],
+    buckets=LATENCY_BUCKETS
+)
+
+TRANSFORMATION_LATENCY = Histogram(
+    'morphflux_transformation_duration_seconds',
+    'End-to-end latency of a transformation job',
+    ['transformation_type'],
+    buckets=LATENCY_BUCKETS
+)
+
+TRANSFORMATIONS = Counter(
+    'morphflux_transformations_total',
+    'Finished transformation jobs',
+    ['transformation_type', 'status']
+)
+
+MODEL_BATCH_SIZE = Histogram(
+    'morphflux_model_batch_size',
+    'Images per batched forward pass',
+    ['model'],
+    buckets=(1, 2, 4, 8, 16, 32, 64)
+)
+
+QUEUE_DEPTH = Gauge(
+    'morphflux_job_queue_depth',
+    'Jobs waiting in the job queue, sampled periodically'
+)
+
+
+@contextmanager
+def stage_timer(stage: str, transformation_type: str) -> Iterator[None]:
+    """Record the duration of a processing stage (read, decode, detect, kernel, encode, upload, db_update)
+
+    Also publishes the stage as a progress event when the job is tracked.
+    """
+    report_stage(stage)
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        STAGE_LATENCY.labels(stage, transformation_type).observe(time.perf_counter() - start)
+
+
+class ServiceCollector:
+    """Exports the stats that service components already keep, read at scrape time"""
+
+    def __init__(self, state: Any):
+        self.state = state
+
+    def collect(self):
+        from app.core.database import get_pool_metrics
+        from app.core.status_cache import get_status_cache
+
+        worker_pool = getattr(self.state, 'worker_pool', None)
+        if worker_pool is not None:
+            stats = worker_pool.get_stats()
+            yield GaugeMetricFamily(
+                'morphflux_jobs_in_flight', 'Jobs being processed by the worker pool', value=stats['active']
+            )
+
+        model_manager = getattr(self.state, 'model_manager', None)
+        if model_manager is not None:
+            stats = model_manager.executor.get_stats()
+            yield GaugeMetricFamily(
+                'morphflux_executor_in_flight', 'Kernel calls running in the CPU executor',
+                value=stats['in_flight']
+            )
+
+            lookups = CounterMetricFamily(
+                'morphflux_cache_lookups', 'Cache lookups by cache and result', labels=['cache', 'result']
+            )
+            caches = {'face_detections': model_manager.face_detector}
+            if model_manager.result_cache is not None:
+                caches['results'] = model_manager.result_cache
+            if get_status_cache() is not None:
+                caches['transformation_status'] = get_status_cache()
+            for name, cache in caches.items():
+                cache_stats = cache.get_stats()
+                lookups.add_metric([name, 'hit'], cache_stats['hits'])
+                lookups.add_metric([name, 'miss'], cache_stats['misses'])
+            yield lookups
+
+        pool = get_pool_metrics()
+        if pool['status'] == 'active':
+            connections = GaugeMetricFamily(
+                'morphflux_db_pool_connections', 'Database pool connections by state', labels=['state']
+            )
+            connections.add_metric(['in_use'], pool['in_use'])
+            connections.add_metric(['idle'], pool['idle'])
+            connections.add_metric(['max'], pool['max_size'])
+            yield connections
+        yield CounterMetricFamily(
+            'morphflux_db_pool_acquisitions', 'Connections checked out of the pool',
+            value=pool['acquisitions']
+        )
+
+        event_broker = getattr(self.state, 'event_broker', None)
+        if event_broker is not None:
+            stats = event_broker.get_stats()
+            yield GaugeMetricFamily(
+                'morphflux_event_subscribers', 'Open progress event streams', value=stats['subscribers']
+            )
+            yield CounterMetricFamily(
+                'morphflux_events_published', 'Progress events published', value=stats['published']
+            )
+
+        rate_limiter = getattr(self.state, 'rate_limiter', None)
+        if rate_limiter is not None:
+            decisions = CounterMetricFamily(
+                'morphflux_rate_limit_decisions', 'Rate limiter decisions', labels=['decision']
+            )
+            decisions.add_metric(['allowed'], rate_limiter.allowed)
+            decisions.add_metric(['rejected'], rate_limiter.limited)
+            yield decisions
+
+
+class MetricsServer:
+    """Serves /metrics on METRICS_PORT from a background thread
+
+    When several processes of one deployment share METRICS_PORT, the first
+    to bind it exports and the others log a warning and run without an
+    exporter; serve.py gives each worker its own port instead.
+    """
+
+    def __init__(self, state: Any, port: Optional[int] = None, sample_interval: Optional[float] = None):
+        self.state = state
+        self.port = port or settings.METRICS_PORT
+        self.sample_interval = sample_interval or settings.METRICS_SAMPLE_INTERVAL
+        self._collector = ServiceCollector(state)
+        self._sampler: Optional[asyncio.Task] = None
+        self._server = None
+
+    async def start(self) -> None:
+        """Start the HTTP server thread and the queue depth sampler"""
+        try:
+            self._server, _ = start_http_server(self.port)
+        except OSError as e:
+            logger.warning("Metrics port unavailable, metrics not exported", port=self.port, error=str(e))
+            return
+        REGISTRY.register(self._collector)
+        self._sampler = asyncio.create_task(self._sample_queue_depth(), name="metrics-sampler")
+        logger.info("Metrics server started", port=self.port)
+
+    async def stop(self) -> None:
+        """Stop sampling, shut down the HTTP server and unregister the service collector"""
+        if self._server is None:
+            return
+        self._sampler.cancel()
+        await asyncio.gather(self._sampler, return_exceptions=True)
+        self._sampler = None
+        await asyncio.to_thread(self._server.shutdown)
+        self._server.server_close()
+        self._server = None
+        REGISTRY.unregister(self._collector)
+
+    async def _sample_queue_depth(self) -> None:
+        """Queue depth may need a backend round trip, so it is sampled on the event loop"""
+        while True:
+            job_queue = getattr(self.state, 'job_queue', None)
+            if job_queue is not None:
+                try:
+                    QUEUE_DEPTH.set(await job_queue.depth())
+                except Exception as e:
+                    logger.warning("Failed to sample queue depth", error=str(e))
+            await asyncio.sleep(self.sample_interval)
@@ -1,59 +1,73 @@
 """
 Middleware configuration for MorphFlux AI Service
+Implemented as pure ASGI callables: headers are added on http.response.start
+and response bodies, including streams, pass through untouched
 """
 
+import math
 import time
 import uuid
-from typing import Callable
-from fastapi import FastAPI, Request, Response
+from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.middleware.gzip import GZipMiddleware
-from starlette.middleware.base import BaseHTTPMiddleware
+from starlette.middleware.gzip import GZipResponder
+from fastapi.responses import JSONResponse
+from starlette.datastructures import URL, Headers
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
 from app.core.config import settings
+from app.core.exceptions import RateLimitError
 from app.core.logging import get_logger
+from app.core.ratelimit import RateLimiter, create_rate_limiter
 
 logger = get_logger(__name__)
 
 
-class RequestLoggingMiddleware(BaseHTTPMiddleware):
+class RequestLoggingMiddleware:
     """Middleware for request logging"""
     
-    async def dispatch(self, request: Request, call_next: Callable) -> Response:
-        # Generate request ID
+    def __init__(self, app: ASGIApp):
+        self.app = app
+    
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        
+        # Generate request ID, readable as request.state.request_id
         request_id = str(uuid.uuid4())
-        request.state.request_id = request_id
+        scope.setdefault("state", {})["request_id"] = request_id
         
         # Log request
-        start_time = time.time()
+        start_time = time.perf_counter()
+        headers = Headers(scope=scope)
+        client = scope.get("client")
         logger.info(
             "Request started",
             request_id=request_id,
-            method=request.method,
-            url=str(request.url),
-            client_ip=request.client.host if request.client else None,
-            user_agent=request.headers.get("user-agent")
+            method=scope["method"],
+            url=str(URL(scope=scope)),
+            client_ip=client[0] if client else None,
+            user_agent=headers.get("user-agent")
         )
         
+        status_code = None
+        
+        async def send_with_request_id(message: Message) -> None:
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                # Add request ID to response headers
+                message["headers"] = [
+                    *message.get("headers", []),
+                    (b"x-request-id", request_id.encode())
+                ]
+            await send(message)
+        
         # Process request
         try:
-            response = await call_next(request)
-            
-            # Log response
-            process_time = time.time() - start_time
-            logger.info(
-                "Request completed",
-                request_id=request_id,
-                status_code=response.status_code,
-                process_time=round(process_time, 3)
-            )
-            
-            # Add request ID to response headers
-            response.headers["X-Request-ID"] = request_id
-            
-            return response
-            
+            await self.app(scope, receive, send_with_request_id)
         except Exception as e:
-            process_time = time.time() - start_time
+            process_time = time.perf_counter() - start_time
             logger.error(
                 "Request failed",
                 request_id=request_id,
@@ -61,70 +75,127 @@ class RequestLoggingMiddleware(BaseHTTPMiddleware):
                 process_time=round(process_time, 3)
             )
             raise
+        
+        # Log response once the body has been sent
+        process_time = time.perf_counter() - start_time
+        logger.info(
+            "Request completed",
+            request_id=request_id,
+            status_code=status_code,
+            process_time=round(process_time, 3)
+        )
+
+
+# Security headers added to every response, pre-encoded once
+SECURITY_HEADERS = [
+    (b"x-content-type-options", b"nosniff"),
+    (b"x-frame-options", b"DENY"),
+    (b"x-xss-protection", b"1; mode=block"),
+    (b"referrer-policy", b"strict-origin-when-cross-origin"),
+    (b"permissions-policy", b"geolocation=(), microphone=(), camera=()"),
+]
 
 
-class SecurityHeadersMiddleware(BaseHTTPMiddleware):
+class EventStreamAwareGZipResponder(GZipResponder):
+    """Gzip responder that passes server-sent event streams through uncompressed"""
+    
+    async def send_with_gzip(self, message: Message) -> None:
+        await super().send_with_gzip(message)
+        if message["type"] == "http.response.start":
+            content_type = Headers(raw=message["headers"]).get("content-type", "")
+            if content_type.startswith("text/event-stream"):
+                # Treated like an already-encoded body: forwarded chunk by chunk
+                self.content_encoding_set = True
+
+
+class EventStreamAwareGZipMiddleware(GZipMiddleware):
+    """Gzip compression that leaves server-sent event streams alone
+    
+    The compressor holds small chunks until its buffer fills, which would
+    delay progress events indefinitely.
+    """
+    
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] == "http" and "gzip" in Headers(scope=scope).get("accept-encoding", ""):
+            responder = EventStreamAwareGZipResponder(
+                self.app, self.minimum_size, compresslevel=self.compresslevel
+            )
+            await responder(scope, receive, send)
+            return
+        await self.app(scope, receive, send)
+
+
+class SecurityHeadersMiddleware:
     """Middleware for security headers"""
     
-    async def dispatch(self, request: Request, call_next: Callable) -> Response:
-        response = await call_next(request)
+    def __init__(self, app: ASGIApp):
+        self.app = app
+    
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
         
-        # Add security headers
-        response.headers["X-Content-Type-Options"] = "nosniff"
-        response.headers["X-Frame-Options"] = "DENY"
-        response.headers["X-XSS-Protection"] = "1; mode=block"
-        response.headers["Referrer-Policy"] = "strict-origin-when-cross-origin"
-        response.headers["Permissions-Policy"] = "geolocation=(), microphone=(), camera=()"
+        async def send_with_security_headers(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                message["headers"] = [*message.get("headers", []), *SECURITY_HEADERS]
+            await send(message)
         
-        return response
+        await self.app(scope, receive, send_with_security_headers)
 
 
-class RateLimitMiddleware(BaseHTTPMiddleware):
-    """Simple rate limiting middleware"""
+class RateLimitMiddleware:
+    """Rate limiting middleware with constant per-request cost"""
     
-    def __init__(self, app, calls: int = 100, period: int = 60):
-        super().__init__(app)
-        self.calls = calls
-        self.period = period
-        self.clients = {}
+    def __init__(self, app: ASGIApp, limiter: RateLimiter):
+        self.app = app
+        self.limiter = limiter
+        self.api_key_header = settings.API_KEY_HEADER.lower().encode()
     
-    async def dispatch(self, request: Request, call_next: Callable) -> Response:
-        client_ip = request.client.host if request.client else "unknown"
-        current_time = time.time()
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        
+        client = scope.get("client")
+        client_ip = client[0] if client else "unknown"
+        api_key = next(
+            (value.decode("latin-1") for name, value in scope["headers"] if name == self.api_key_header),
+            None
+        )
+        result = await self.limiter.check(scope["path"], client_ip, api_key)
         
-        # Clean old entries
-        self.clients = {
-            ip: timestamps for ip, timestamps in self.clients.items()
-            if any(ts > current_time - self.period for ts in timestamps)
-        }
+        if not result.allowed:
+            logger.warning(
+                "Rate limit exceeded",
+                client_ip=client_ip,
+                path=scope["path"],
+                limit=result.limit
+            )
+            exc = RateLimitError()
+            response = JSONResponse(
+                status_code=exc.status_code,
+                content={"error": exc.message, "code": exc.code, "details": exc.details},
+                headers={
+                    "Retry-After": str(math.ceil(result.retry_after)),
+                    "X-RateLimit-Limit": str(result.limit),
+                    "X-RateLimit-Remaining": "0"
+                }
+            )
+            await response(scope, receive, send)
+            return
         
-        # Check rate limit
-        if client_ip in self.clients:
-            # Remove old timestamps
-            self.clients[client_ip] = [
-                ts for ts in self.clients[client_ip] 
-                if ts > current_time - self.period
-            ]
-            
-            if len(self.clients[client_ip]) >= self.calls:
-                logger.warning(
-                    "Rate limit exceeded",
-                    client_ip=client_ip,
-                    calls=len(self.clients[client_ip]),
-                    limit=self.calls
-                )
-                from fastapi import HTTPException
-                raise HTTPException(
-                    status_code=429,
-                    detail="Rate limit exceeded"
-                )
-        else:
-            self.clients[client_ip] = []
+        rate_limit_headers = [
+            (b"x-ratelimit-limit", str(result.limit).encode()),
+            (b"x-ratelimit-remaining", str(result.remaining).encode()),
+        ]
         
-        # Add current request
-        self.clients[client_ip].append(current_time)
+        async def send_with_rate_limit_headers(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                message["headers"] = [*message.get("headers", []), *rate_limit_headers]
+            await send(message)
         
-        return await call_next(request)
+        await self.app(scope, receive, send_with_rate_limit_headers)
 
 
 def add_middleware(app: FastAPI) -> None:
@@ -140,7 +211,7 @@ def add_middleware(app: FastAPI) -> None:
     )
     
     # Gzip compression
-    app.add_middleware(GZipMiddleware, minimum_size=1000)
+    app.add_middleware(EventStreamAwareGZipMiddleware, minimum_size=1000)
     
     # Security headers
     app.add_middleware(SecurityHeadersMiddleware)
@@ -149,5 +220,7 @@ def add_middleware(app: FastAPI) -> None:
     app.add_middleware(RequestLoggingMiddleware)
     
     # Rate limiting (only in production)
-    if not settings.DEBUG:
-        app.add_middleware(RateLimitMiddleware, calls=100, period=60)
+    if settings.RATE_LIMIT_ENABLED and not settings.DEBUG:
+        limiter = create_rate_limiter()
+        app.state.rate_limiter = limiter
+        app.add_middleware(RateLimitMiddleware, limiter=limiter)
@@ -4,137 +4,246 @@ Handles loading and management of AI models for image transformations
 """
 
 import os
+import math
+import time
 import asyncio
-from typing import Dict, Any, Optional, List
-import torch
+from contextlib import AsyncExitStack
+from typing import Dict, Any, Optional, List, Tuple
 import cv2
 import numpy as np
-from PIL import Image
 import structlog
 from app.core.config import settings
-from app.core.exceptions import ModelError
+from app.core.device import current_device
+from app.core.exceptions import ModelError, FileError, ValidationError
+from app.core.executor import CPUExecutor
+from app.core.batching import MicroBatcher, batch_policy
+from app.core.onnx_backend import load_onnx_model
+from app.core.cache import ResultCache, content_hash
+from app.core.processing import split_alpha, attach_alpha
+from app.core.faces import FaceDetectionStage
+from app.core.registry import ModelRegistry, ModelSpec, preloaded_models
+from app.core.metrics import STAGE_LATENCY, stage_timer
 
 logger = structlog.get_logger(__name__)
 
+# Suffix inserted into the input path to name each transformation's output
+OUTPUT_SUFFIXES = {
+    'background_removal': '_bg_removed',
+    'style_transfer': '_styled',
+    'age_progression': '_aged',
+    'face_enhancement': '_enhanced',
+}
+
+# Models each transformation depends on
+REQUIRED_MODELS = {
+    'background_removal': ['background_removal'],
+    'style_transfer': ['style_transfer'],
+    'age_progression': ['age_progression', 'face_detection'],
+    'face_enhancement': ['face_detection'],
+}
+
+# Transformations that operate on face ROIs from the face detection stage
+FACE_TRANSFORMATIONS = {'age_progression', 'face_enhancement'}
+
+# MODEL_BACKENDS values for the style transfer and age progression networks:
+# the built-in placeholder, or an exported network run by ONNX Runtime
+NETWORK_BACKENDS = ('placeholder', 'onnx')
+
+# Transformation type for chained steps run through process_pipeline
+PIPELINE_TYPE = 'pipeline'
+
+# Encoded output formats for in-memory processing: cv2.imencode extension and media type
+OUTPUT_FORMATS = {
+    'png': ('.png', 'image/png'),
+    'jpeg': ('.jpg', 'image/jpeg'),
+    'webp': ('.webp', 'image/webp'),
+}
+
 
 class ModelManager:
     """Manages AI models for image transformations"""
     
     def __init__(self):
-        self.device = self._get_device()
-        self.models = {}
-        self.model_status = {}
+        self.executor = CPUExecutor(
+            max_workers=settings.MAX_CONCURRENT_JOBS,
+            job_timeout=settings.JOB_TIMEOUT
+        )
+        self.result_cache = ResultCache() if settings.RESULT_CACHE_ENABLED else None
+        self.face_detector = FaceDetectionStage(self.executor)
+        self._batchers: Dict[str, MicroBatcher] = {}
+        
+        # Models load on first use, not at startup
+        self.registry = ModelRegistry(
+            memory_budget=settings.MODEL_MEMORY_BUDGET,
+            idle_timeout=settings.MODEL_IDLE_TIMEOUT
+        )
+        for spec in (
+            ModelSpec('background_removal', 'opencv', self._load_background_removal_model),
+            ModelSpec('style_transfer', self._backend('style_transfer'), self._load_style_transfer_model),
+            ModelSpec('face_detection', 'opencv_cascade', self._load_face_detection_model),
+            ModelSpec('age_progression', self._backend('age_progression'), self._load_age_progression_model),
+        ):
+            self.registry.register(spec)
         logger.info("ModelManager initialized", device=self.device)
     
-    def _get_device(self) -> str:
-        """Get the best available device"""
-        if settings.DEVICE == "auto":
-            if torch.cuda.is_available():
-                return "cuda"
-            elif hasattr(torch.backends, 'mps') and torch.backends.mps.is_available():
-                return "mps"
-            else:
-                return "cpu"
-        return settings.DEVICE
+    @property
+    def device(self) -> str:
+        """Compute device for torch-backed models; resolving it imports torch, so only they do"""
+        return current_device()
     
     async def load_models(self) -> None:
-        """Load all AI models"""
-        logger.info("Loading AI models...")
-        
-        # Load models in parallel
-        tasks = [
-            self._load_background_removal_model(),
-            self._load_style_transfer_model(),
-            self._load_face_detection_model(),
-            self._load_age_progression_model(),
-        ]
+        """Start the CPU executor and pre-warm MODEL_PREWARM; other models load on first use"""
+        # Start the CPU worker processes used by the transformations
+        self.executor.start()
         
-        results = await asyncio.gather(*tasks, return_exceptions=True)
+        if self.result_cache is not None:
+            await self.result_cache.load()
         
-        # Log results
-        for i, result in enumerate(results):
-            if isinstance(result, Exception):
-                logger.error(f"Failed to load model {i}", error=str(result))
-            else:
-                logger.info(f"Model {i} loaded successfully")
+        # Models loaded by a prefork parent (serve.py) are shared, not reloaded
+        for name, (model, size_bytes) in preloaded_models().items():
+            self.registry.adopt(name, model, size_bytes)
+        
+        self.registry.start()
+        if settings.MODEL_PREWARM:
+            logger.info("Pre-warming models", models=settings.MODEL_PREWARM)
+            await self.registry.prewarm(settings.MODEL_PREWARM)
+    
+    @staticmethod
+    def _backend(model_name: str) -> str:
+        """Get the inference backend configured for a network, in MODEL_BACKENDS"""
+        backend = settings.MODEL_BACKENDS.get(model_name, 'placeholder')
+        if backend not in NETWORK_BACKENDS:
+            raise ValidationError(f"Unknown backend for {model_name}: {backend}")
+        return backend
     
-    async def _load_background_removal_model(self) -> None:
+    async def _load_onnx_model(self, model_name: str) -> Tuple[Dict[str, Any], int]:
+        """Load a network's ONNX session, warmed up at its batching shape"""
+        return await asyncio.to_thread(load_onnx_model, model_name, batch_policy(model_name).resize_to)
+    
+    async def _load_background_removal_model(self) -> Tuple[Dict[str, Any], int]:
         """Load background removal model"""
-        try:
-            # For now, we'll use a simple OpenCV-based approach
-            # In production, you'd load a proper AI model like U²-Net
-            self.models['background_removal'] = {
-                'type': 'opencv',
-                'loaded': True,
-                'device': self.device
-            }
-            self.model_status['background_removal'] = 'loaded'
-            logger.info("Background removal model loaded")
-        except Exception as e:
-            self.model_status['background_removal'] = 'failed'
-            raise ModelError(f"Failed to load background removal model: {str(e)}")
+        # For now, we'll use a simple OpenCV-based approach
+        # In production, you'd load a proper AI model like U²-Net
+        return {'type': 'opencv', 'device': 'cpu'}, 0
     
-    async def _load_style_transfer_model(self) -> None:
+    async def _load_style_transfer_model(self) -> Tuple[Dict[str, Any], int]:
         """Load style transfer model"""
-        try:
-            # Placeholder for style transfer model
-            # In production, you'd load a model like AdaIN or Neural Style Transfer
-            self.models['style_transfer'] = {
-                'type': 'placeholder',
-                'loaded': True,
-                'device': self.device
-            }
-            self.model_status['style_transfer'] = 'loaded'
-            logger.info("Style transfer model loaded")
-        except Exception as e:
-            self.model_status['style_transfer'] = 'failed'
-            raise ModelError(f"Failed to load style transfer model: {str(e)}")
+        # Placeholder for style transfer model
+        # In production, you'd load a model like AdaIN or Neural Style Transfer
+        # and return it with 'forward': torch_forward(net, resolve_device()),
+        # so requests are micro-batched instead of running the OpenCV kernel
+        if self._backend('style_transfer') == 'onnx':
+            return await self._load_onnx_model('style_transfer')
+        return {'type': 'placeholder', 'device': 'cpu'}, 0
     
-    async def _load_face_detection_model(self) -> None:
-        """Load face detection model"""
-        try:
-            # Load OpenCV face detection
-            face_cascade_path = cv2.data.haarcascades + 'haarcascade_frontalface_default.xml'
-            face_cascade = cv2.CascadeClassifier(face_cascade_path)
-            
-            if face_cascade.empty():
-                raise ModelError("Failed to load face detection cascade")
-            
-            self.models['face_detection'] = {
-                'type': 'opencv_cascade',
-                'model': face_cascade,
-                'loaded': True,
-                'device': self.device
-            }
-            self.model_status['face_detection'] = 'loaded'
-            logger.info("Face detection model loaded")
-        except Exception as e:
-            self.model_status['face_detection'] = 'failed'
-            raise ModelError(f"Failed to load face detection model: {str(e)}")
+    async def _load_face_detection_model(self) -> Tuple[Dict[str, Any], int]:
+        """Account for the face detection cascade held by the executor workers
+        
+        Detection runs in the CPU executor, where each worker loads its own
+        cascade at startup (processing.get_face_cascade), so this process
+        holds nothing. The entry is a size-only placeholder that makes the
+        workers' copies count against the memory budget.
+        """
+        face_cascade_path = cv2.data.haarcascades + 'haarcascade_frontalface_default.xml'
+        if not os.path.exists(face_cascade_path):
+            raise ModelError("Failed to load face detection cascade")
+        
+        model = {'type': 'placeholder', 'device': 'cpu'}
+        return model, os.path.getsize(face_cascade_path) * self.executor.max_workers
     
-    async def _load_age_progression_model(self) -> None:
+    async def _load_age_progression_model(self) -> Tuple[Dict[str, Any], int]:
         """Load age progression model"""
-        try:
-            # Placeholder for age progression model
-            # In production, you'd load a model like CAAE or IPCGAN
-            self.models['age_progression'] = {
-                'type': 'placeholder',
-                'loaded': True,
-                'device': self.device
-            }
-            self.model_status['age_progression'] = 'loaded'
-            logger.info("Age progression model loaded")
-        except Exception as e:
-            self.model_status['age_progression'] = 'failed'
-            raise ModelError(f"Failed to load age progression model: {str(e)}")
+        # Placeholder for age progression model
+        # In production, you'd load a model like CAAE or IPCGAN, with a
+        # 'forward' as for style transfer; it then runs on batched face ROIs
+        if self._backend('age_progression') == 'onnx':
+            return await self._load_onnx_model('age_progression')
+        return {'type': 'placeholder', 'device': 'cpu'}, 0
+    
+    async def shutdown(self) -> None:
+        """Release models and stop the CPU executor"""
+        await self.registry.close()
+        await asyncio.to_thread(self.executor.shutdown)
+        logger.info("ModelManager shut down")
+    
+    def _batcher(self, transformation_type: str) -> Optional[MicroBatcher]:
+        """Get the micro-batcher for a transformation whose resident model has a batched forward"""
+        model_name = REQUIRED_MODELS[transformation_type][0]
+        model = self.registry.get(model_name)
+        forward = model.get('forward') if isinstance(model, dict) else None
+        if forward is None:
+            return None
+        
+        batcher = self._batchers.get(model_name)
+        if batcher is None or batcher.forward is not forward:
+            # A reloaded model gets a fresh batcher
+            batcher = MicroBatcher(model_name, forward, batch_policy(model_name, model.get('input_size')))
+            self._batchers[model_name] = batcher
+        return batcher
+    
+    async def _run_model(
+        self, 
+        transformation_type: str, 
+        image: np.ndarray, 
+        parameters: Dict[str, Any]
+    ) -> np.ndarray:
+        """Run one transformation on a decoded image whose models are resident
+        
+        Models with a batched forward (torch or ONNX networks) run through their
+        micro-batcher, face transformations on each face ROI; others run
+        their kernel in the CPU executor.
+        """
+        batcher = self._batcher(transformation_type)
+        if batcher is None:
+            return await self.executor.run(transformation_type, image, parameters)
+        if transformation_type not in FACE_TRANSFORMATIONS:
+            return await batcher.submit(image)
+        
+        faces = parameters['faces']
+        rois = await asyncio.gather(*(batcher.submit(image[y:y + h, x:x + w]) for x, y, w, h in faces))
+        output = image.copy()
+        for (x, y, w, h), roi in zip(faces, rois):
+            output[y:y + h, x:x + w] = roi
+        return output
+    
+    def get_batching_stats(self) -> Dict[str, Any]:
+        """Get micro-batching statistics per model"""
+        return {name: batcher.get_stats() for name, batcher in self._batchers.items()}
     
     def get_status(self) -> Dict[str, str]:
         """Get status of all models"""
-        return self.model_status.copy()
+        return self.registry.get_status()
     
     def is_model_loaded(self, model_name: str) -> bool:
         """Check if a model is loaded"""
-        return self.model_status.get(model_name) == 'loaded'
+        return self.registry.is_loaded(model_name)
+    
+    @staticmethod
+    def required_models(transformation_type: str, parameters: Optional[Dict[str, Any]] = None) -> List[str]:
+        """Get the models a transformation, or every step of a pipeline, needs"""
+        if transformation_type == PIPELINE_TYPE:
+            return [
+                model_name
+                for step in (parameters or {}).get('steps', [])
+                for model_name in REQUIRED_MODELS[step['transformation_type']]
+            ]
+        return REQUIRED_MODELS.get(transformation_type, [transformation_type])
+    
+    async def _with_faces(
+        self, 
+        transformation_type: str, 
+        image: np.ndarray, 
+        image_digest: Optional[str],
+        parameters: Dict[str, Any]
+    ) -> Dict[str, Any]:
+        """Add face ROIs from the shared detection stage to a face transformation's parameters"""
+        if transformation_type not in FACE_TRANSFORMATIONS:
+            return parameters
+        with stage_timer('detect', transformation_type):
+            faces = await self.face_detector.detect(image, image_digest)
+        if len(faces) == 0:
+            raise ModelError("No faces detected in image")
+        return {**parameters, 'faces': faces.tolist()}
     
     async def process_image(
         self, 
@@ -144,8 +253,11 @@ class ModelManager:
     ) -> str:
         """Process image with specified transformation"""
         
-        if not self.is_model_loaded(transformation_type):
-            raise ModelError(f"Model {transformation_type} is not loaded")
+        if transformation_type == PIPELINE_TYPE:
+            return await self.process_pipeline(image_path, parameters.get('steps') or [])
+        
+        if transformation_type not in REQUIRED_MODELS:
+            raise ModelError(f"Unknown transformation type: {transformation_type}")
         
         logger.info(
             "Processing image",
@@ -154,16 +266,37 @@ class ModelManager:
         )
         
         try:
-            if transformation_type == 'background_removal':
-                return await self._remove_background(image_path, parameters)
-            elif transformation_type == 'style_transfer':
-                return await self._apply_style_transfer(image_path, parameters)
-            elif transformation_type == 'age_progression':
-                return await self._apply_age_progression(image_path, parameters)
-            elif transformation_type == 'face_enhancement':
-                return await self._enhance_face(image_path, parameters)
-            else:
-                raise ModelError(f"Unknown transformation type: {transformation_type}")
+            # Read and hash the raw bytes once; the hash keys both the result
+            # cache and the face detection stage
+            with stage_timer('read', transformation_type):
+                image_bytes = await asyncio.to_thread(self._read_file, image_path)
+                image_digest = await asyncio.to_thread(content_hash, image_bytes)
+            
+            cache_key, cached_path = self._cache_lookup(image_digest, transformation_type, parameters)
+            if cached_path is not None:
+                output_path = self._output_path(image_path, transformation_type)
+                if await self._restore_cached(cached_path, output_path):
+                    return output_path
+            
+            with stage_timer('decode', transformation_type):
+                image = await self._decode_image(image_bytes)
+            del image_bytes
+            
+            async with self.registry.use(*self.required_models(transformation_type)):
+                parameters = await self._with_faces(transformation_type, image, image_digest, parameters)
+                
+                if transformation_type == 'background_removal':
+                    output_path = await self._remove_background(image_path, parameters, image)
+                elif transformation_type == 'style_transfer':
+                    output_path = await self._apply_style_transfer(image_path, parameters, image)
+                elif transformation_type == 'age_progression':
+                    output_path = await self._apply_age_progression(image_path, parameters, image)
+                else:
+                    output_path = await self._enhance_face(image_path, parameters, image)
+            
+            if cache_key is not None:
+                await self.result_cache.put(cache_key, output_path)
+            return output_path
                 
         except Exception as e:
             logger.error(
@@ -173,172 +306,469 @@ class ModelManager:
             )
             raise ModelError(f"Processing failed: {str(e)}")
     
-    async def _remove_background(self, image_path: str, parameters: Dict[str, Any]) -> str:
-        """Remove background from image"""
+    async def process_pipeline(self, image_path: str, steps: List[Dict[str, Any]]) -> str:
+        """Apply a chain of transformations, decoding once and encoding only the final result
+        
+        Each step has 'transformation_type' and optional 'parameters'. The
+        whole chain runs in one executor call, so the image stays in memory
+        between steps.
+        """
+        steps = self._validate_steps(steps)
+        step_types = [step['transformation_type'] for step in steps]
+        logger.info("Processing pipeline", steps=step_types, image_path=image_path)
+        
         try:
-            # Load image
-            image = cv2.imread(image_path)
-            if image is None:
-                raise ModelError("Failed to load image")
-            
-            # Simple background removal using GrabCut algorithm
-            height, width = image.shape[:2]
-            mask = np.zeros((height, width), np.uint8)
-            
-            # Define rectangle for foreground (center 80% of image)
-            margin = 0.1
-            rect = (
-                int(width * margin),
-                int(height * margin),
-                int(width * (1 - 2 * margin)),
-                int(height * (1 - 2 * margin))
-            )
-            
-            # Initialize background and foreground models
-            bgd_model = np.zeros((1, 65), np.float64)
-            fgd_model = np.zeros((1, 65), np.float64)
-            
-            # Apply GrabCut
-            cv2.grabCut(image, mask, rect, bgd_model, fgd_model, 5, cv2.GC_INIT_WITH_RECT)
+            with stage_timer('read', PIPELINE_TYPE):
+                image_bytes = await asyncio.to_thread(self._read_file, image_path)
+                image_digest = await asyncio.to_thread(content_hash, image_bytes)
+            
+            cache_key, cached_path = self._cache_lookup(image_digest, PIPELINE_TYPE, {'steps': steps})
+            if cached_path is not None:
+                # The cached file's extension records whether the result had alpha
+                root, _ = os.path.splitext(image_path)
+                output_path = f"{root}_pipeline{os.path.splitext(cached_path)[1]}"
+                if await self._restore_cached(cached_path, output_path):
+                    return output_path
+            
+            with stage_timer('decode', PIPELINE_TYPE):
+                image = await self._decode_image(image_bytes)
+            del image_bytes
+            result = await self._apply(PIPELINE_TYPE, image, image_digest, {'steps': steps})
+            
+            output_path = self._pipeline_output_path(image_path, result)
+            with stage_timer('encode', PIPELINE_TYPE):
+                await self._write_image(output_path, result)
+            
+            if cache_key is not None:
+                await self.result_cache.put(cache_key, output_path)
+            logger.info("Pipeline completed", steps=step_types, output_path=output_path)
+            return output_path
             
-            # Create final mask
-            mask2 = np.where((mask == 2) | (mask == 0), 0, 1).astype('uint8')
+        except Exception as e:
+            logger.error("Pipeline processing failed", steps=step_types, error=str(e))
+            raise ModelError(f"Pipeline failed: {str(e)}")
+    
+    async def process_bytes(
+        self, 
+        image_bytes: bytes, 
+        transformation_type: str, 
+        parameters: Dict[str, Any],
+        output_format: Optional[str] = None
+    ) -> Tuple[bytes, str]:
+        """Process an encoded image entirely in memory
+        
+        Returns the encoded result and its media type. output_format is a key
+        of OUTPUT_FORMATS; by default results with alpha are PNG and others
+        JPEG. Neither the input nor the output touches the filesystem.
+        """
+        if transformation_type == PIPELINE_TYPE:
+            parameters = {'steps': self._validate_steps(parameters.get('steps') or [])}
+        elif transformation_type not in REQUIRED_MODELS:
+            raise ModelError(f"Unknown transformation type: {transformation_type}")
+        
+        if output_format is not None and output_format not in OUTPUT_FORMATS:
+            raise ModelError(f"Unsupported output format: {output_format}")
+        
+        # Hash and decode straight from the request buffer
+        view = memoryview(image_bytes)
+        try:
+            with stage_timer('decode', transformation_type):
+                image = await self._decode_image(view)
+        except ModelError:
+            raise FileError("Invalid or unsupported image data")
+        
+        try:
+            image_digest = await asyncio.to_thread(content_hash, view)
+            result = await self._apply(transformation_type, image, image_digest, parameters)
             
-            # Apply mask to create transparent background
-            result = image.copy()
-            result = cv2.cvtColor(result, cv2.COLOR_BGR2BGRA)
-            result[:, :, 3] = mask2 * 255
+            has_alpha = result.ndim == 3 and result.shape[2] == 4
+            output_format = output_format or ('png' if has_alpha else 'jpeg')
+            extension, media_type = OUTPUT_FORMATS[output_format]
+            if has_alpha and output_format == 'jpeg':
+                result = await asyncio.to_thread(cv2.cvtColor, result, cv2.COLOR_BGRA2BGR)
             
-            # Save result
-            output_path = image_path.replace('.', '_bg_removed.')
-            cv2.imwrite(output_path, result)
+            with stage_timer('encode', transformation_type):
+                encoded = await self._encode_image(result, extension)
+            return encoded, media_type
             
+        except Exception as e:
+            logger.error(
+                "In-memory image processing failed",
+                transformation_type=transformation_type,
+                error=str(e)
+            )
+            raise ModelError(f"Processing failed: {str(e)}")
+    
+    def _validate_steps(self, steps: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Check pipeline steps and normalize them to type and parameters"""
+        if not steps:
+            raise ModelError("Pipeline has no steps")
+        for step in steps:
+            transformation_type = step.get('transformation_type')
+            if transformation_type not in OUTPUT_SUFFIXES:
+                raise ModelError(f"Unknown transformation type: {transformation_type}")
+        
+        return [
+            {'transformation_type': step['transformation_type'], 'parameters': step.get('parameters') or {}}
+            for step in steps
+        ]
+    
+    async def _apply(
+        self, 
+        transformation_type: str, 
+        image: np.ndarray, 
+        image_digest: Optional[str],
+        parameters: Dict[str, Any]
+    ) -> np.ndarray:
+        """Run a transformation or pipeline on a decoded image"""
+        async with self.registry.use(*self.required_models(transformation_type, parameters)):
+            return await self._apply_loaded(transformation_type, image, image_digest, parameters)
+    
+    async def _apply_loaded(
+        self, 
+        transformation_type: str, 
+        image: np.ndarray, 
+        image_digest: Optional[str],
+        parameters: Dict[str, Any]
+    ) -> np.ndarray:
+        """Run a transformation or pipeline whose models are already resident"""
+        if transformation_type != PIPELINE_TYPE:
+            parameters = await self._with_faces(transformation_type, image, image_digest, parameters)
+            with stage_timer('kernel', transformation_type):
+                return await self._run_model(transformation_type, image, parameters)
+        
+        # Every kernel preserves geometry, so faces detected on the input
+        # are valid for all face steps in the chain
+        steps = [
+            {
+                'transformation_type': step['transformation_type'],
+                'parameters': await self._with_faces(
+                    step['transformation_type'], image, image_digest, step['parameters']
+                )
+            }
+            for step in parameters['steps']
+        ]
+        if any(self._batcher(step['transformation_type']) for step in steps):
+            # Batched models run in this process, so the chain runs step by
+            # step, carrying alpha past the steps as run_pipeline does
+            alpha = None
+            with stage_timer('kernel', PIPELINE_TYPE):
+                for step in steps:
+                    result = await self._run_model(step['transformation_type'], image, step['parameters'])
+                    image, alpha = await asyncio.to_thread(split_alpha, result, alpha)
+                return await asyncio.to_thread(attach_alpha, image, alpha)
+        
+        with stage_timer('kernel', PIPELINE_TYPE):
+            return await self.executor.run(
+                PIPELINE_TYPE,
+                image,
+                {'steps': steps},
+                timeout=self.executor.job_timeout * len(steps)
+            )
+    
+    def _cache_lookup(
+        self, 
+        image_digest: str, 
+        transformation_type: str, 
+        parameters: Dict[str, Any]
+    ) -> Tuple[Optional[str], Optional[str]]:
+        """Get the result cache key and any cached output path for a request"""
+        if self.result_cache is None:
+            return None, None
+        
+        cache_key = ResultCache.make_key(image_digest, transformation_type, parameters)
+        cached_path = self.result_cache.get(cache_key)
+        if cached_path is not None:
+            logger.info(
+                "Result cache hit",
+                transformation_type=transformation_type,
+                output_path=cached_path
+            )
+        return cache_key, cached_path
+    
+    async def _restore_cached(self, cached_path: str, output_path: str) -> bool:
+        """Copy a cached result to the output path a miss would write; False if it was evicted meanwhile"""
+        try:
+            await asyncio.to_thread(ResultCache.copy_out, cached_path, output_path)
+        except FileNotFoundError:
+            return False
+        return True
+    
+    @staticmethod
+    def _read_file(path: str) -> bytes:
+        """Read a file's raw bytes"""
+        with open(path, 'rb') as f:
+            return f.read()
+    
+    async def _encode_image(self, image: np.ndarray, extension: str) -> bytes:
+        """Encode an image to bytes without blocking the event loop"""
+        ok, buffer = await asyncio.to_thread(cv2.imencode, extension, image)
+        if not ok:
+            raise ModelError(f"Failed to encode image as {extension}")
+        return buffer.tobytes()
+    
+    async def _decode_image(self, image_bytes: bytes) -> np.ndarray:
+        """Decode encoded image bytes without blocking the event loop"""
+        image = await asyncio.to_thread(
+            cv2.imdecode, np.frombuffer(image_bytes, np.uint8), cv2.IMREAD_COLOR
+        )
+        if image is None:
+            raise ModelError("Failed to load image")
+        return image
+    
+    async def _read_image(self, image_path: str) -> np.ndarray:
+        """Read an image from disk without blocking the event loop"""
+        image = await asyncio.to_thread(cv2.imread, image_path)
+        if image is None:
+            raise ModelError("Failed to load image")
+        return image
+    
+    async def _load_image(self, image_path: str) -> Tuple[np.ndarray, str]:
+        """Read and decode an image, returning it with the content hash of its bytes"""
+        image_bytes = await asyncio.to_thread(self._read_file, image_path)
+        image_digest = await asyncio.to_thread(content_hash, image_bytes)
+        return await self._decode_image(image_bytes), image_digest
+    
+    async def _write_image(self, output_path: str, image: np.ndarray) -> None:
+        """Write an image to disk without blocking the event loop"""
+        if not await asyncio.to_thread(cv2.imwrite, output_path, image):
+            raise ModelError(f"Failed to write image: {output_path}")
+    
+    def _output_path(self, image_path: str, transformation_type: str) -> str:
+        """Derive the output path for a transformation"""
+        return image_path.replace('.', f'{OUTPUT_SUFFIXES[transformation_type]}.')
+    
+    def _pipeline_output_path(self, image_path: str, result: np.ndarray) -> str:
+        """Derive the output path for a pipeline, using PNG when the result has alpha"""
+        root, extension = os.path.splitext(image_path)
+        if result.ndim == 3 and result.shape[2] == 4:
+            extension = '.png'
+        return f"{root}_pipeline{extension}"
+    
+    async def _run_kernel(
+        self, 
+        transformation_type: str, 
+        image_path: str, 
+        parameters: Dict[str, Any],
+        image: Optional[np.ndarray] = None
+    ) -> str:
+        """Run a transformation kernel in the CPU executor and save the result"""
+        if image is None:
+            with stage_timer('decode', transformation_type):
+                image = await self._read_image(image_path)
+        with stage_timer('kernel', transformation_type):
+            result = await self._run_model(transformation_type, image, parameters)
+        
+        output_path = self._output_path(image_path, transformation_type)
+        with stage_timer('encode', transformation_type):
+            await self._write_image(output_path, result)
+        return output_path
+    
+    async def _remove_background(
+        self, 
+        image_path: str, 
+        parameters: Dict[str, Any],
+        image: Optional[np.ndarray] = None
+    ) -> str:
+        """Remove background from image"""
+        try:
+            output_path = await self._run_kernel(
+                'background_removal', image_path, parameters, image
+            )
             logger.info("Background removal completed", output_path=output_path)
             return output_path
             
         except Exception as e:
             raise ModelError(f"Background removal failed: {str(e)}")
     
-    async def _apply_style_transfer(self, image_path: str, parameters: Dict[str, Any]) -> str:
+    async def _apply_style_transfer(
+        self, 
+        image_path: str, 
+        parameters: Dict[str, Any],
+        image: Optional[np.ndarray] = None
+    ) -> str:
         """Apply style transfer to image"""
         try:
-            # For now, implement a simple color adjustment
-            # In production, you'd use a proper neural style transfer model
-            
-            image = cv2.imread(image_path)
-            if image is None:
-                raise ModelError("Failed to load image")
-            
-            # Simple style effect - increase saturation and contrast
-            hsv = cv2.cvtColor(image, cv2.COLOR_BGR2HSV)
-            hsv[:, :, 1] = hsv[:, :, 1] * 1.5  # Increase saturation
-            hsv[:, :, 1] = np.clip(hsv[:, :, 1], 0, 255)
-            
-            result = cv2.cvtColor(hsv, cv2.COLOR_HSV2BGR)
-            
-            # Increase contrast
-            result = cv2.convertScaleAbs(result, alpha=1.2, beta=10)
-            
-            # Save result
-            output_path = image_path.replace('.', '_styled.')
-            cv2.imwrite(output_path, result)
-            
+            output_path = await self._run_kernel(
+                'style_transfer', image_path, parameters, image
+            )
             logger.info("Style transfer completed", output_path=output_path)
             return output_path
             
         except Exception as e:
             raise ModelError(f"Style transfer failed: {str(e)}")
     
-    async def _apply_age_progression(self, image_path: str, parameters: Dict[str, Any]) -> str:
+    async def _apply_age_progression(
+        self, 
+        image_path: str, 
+        parameters: Dict[str, Any],
+        image: Optional[np.ndarray] = None
+    ) -> str:
         """Apply age progression to image"""
         try:
-            # For now, implement a simple aging effect
-            # In production, you'd use a proper age progression model
-            
-            image = cv2.imread(image_path)
-            if image is None:
-                raise ModelError("Failed to load image")
-            
-            # Detect faces
-            face_cascade = self.models['face_detection']['model']
-            gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
-            faces = face_cascade.detectMultiScale(gray, 1.1, 4)
-            
-            if len(faces) == 0:
-                raise ModelError("No faces detected in image")
-            
-            result = image.copy()
-            
-            # Apply aging effect to detected faces
-            for (x, y, w, h) in faces:
-                # Add wrinkles effect (simple noise)
-                face_roi = result[y:y+h, x:x+w]
-                noise = np.random.normal(0, 10, face_roi.shape).astype(np.uint8)
-                face_roi = cv2.add(face_roi, noise)
-                
-                # Darken the face slightly
-                face_roi = cv2.convertScaleAbs(face_roi, alpha=0.9, beta=-5)
-                
-                result[y:y+h, x:x+w] = face_roi
-            
-            # Save result
-            output_path = image_path.replace('.', '_aged.')
-            cv2.imwrite(output_path, result)
-            
+            output_path = await self._run_kernel(
+                'age_progression', image_path, parameters, image
+            )
             logger.info("Age progression completed", output_path=output_path)
             return output_path
             
         except Exception as e:
             raise ModelError(f"Age progression failed: {str(e)}")
     
-    async def _enhance_face(self, image_path: str, parameters: Dict[str, Any]) -> str:
+    async def _enhance_face(
+        self, 
+        image_path: str, 
+        parameters: Dict[str, Any],
+        image: Optional[np.ndarray] = None
+    ) -> str:
         """Enhance face in image"""
         try:
-            image = cv2.imread(image_path)
-            if image is None:
-                raise ModelError("Failed to load image")
-            
-            # Detect faces
-            face_cascade = self.models['face_detection']['model']
-            gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
-            faces = face_cascade.detectMultiScale(gray, 1.1, 4)
-            
-            if len(faces) == 0:
-                raise ModelError("No faces detected in image")
-            
-            result = image.copy()
-            
-            # Enhance each detected face
-            for (x, y, w, h) in faces:
-                # Apply bilateral filter for skin smoothing
-                face_roi = result[y:y+h, x:x+w]
-                face_roi = cv2.bilateralFilter(face_roi, 9, 75, 75)
-                
-                # Increase brightness slightly
-                face_roi = cv2.convertScaleAbs(face_roi, alpha=1.1, beta=5)
-                
-                result[y:y+h, x:x+w] = face_roi
-            
-            # Save result
-            output_path = image_path.replace('.', '_enhanced.')
-            cv2.imwrite(output_path, result)
-            
+            output_path = await self._run_kernel(
+                'face_enhancement', image_path, parameters, image
+            )
             logger.info("Face enhancement completed", output_path=output_path)
             return output_path
             
         except Exception as e:
             raise ModelError(f"Face enhancement failed: {str(e)}")
     
+    async def process_batch(self, items: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Process many images, returning one result per item
+        
+        Each item has 'image_path', 'transformation_type' and 'parameters'.
+        Each result has 'output_path' on success or 'error' on failure, plus
+        'processing_time_ms'.
+        """
+        # Keep every model the batch needs resident until it finishes; items
+        # whose models fail to load fail on their own
+        load_errors: Dict[str, str] = {}
+        async with AsyncExitStack() as models:
+            for transformation_type in dict.fromkeys(item['transformation_type'] for item in items):
+                if transformation_type not in REQUIRED_MODELS:
+                    continue
+                try:
+                    await models.enter_async_context(
+                        self.registry.use(*self.required_models(transformation_type))
+                    )
+                except ModelError as e:
+                    load_errors[transformation_type] = str(e)
+            
+            return await self._process_batch(items, load_errors)
+    
+    async def _process_batch(self, items: List[Dict[str, Any]], load_errors: Dict[str, str]) -> List[Dict[str, Any]]:
+        """Process a batch whose models are resident, except those in load_errors"""
+        loop = asyncio.get_running_loop()
+        start_time = loop.time()
+        results: List[Optional[Dict[str, Any]]] = [None] * len(items)
+        
+        logger.info("Processing batch", size=len(items))
+        
+        # Decode all images concurrently
+        async def load(item: Dict[str, Any]) -> Tuple[np.ndarray, str]:
+            with stage_timer('decode', item['transformation_type']):
+                return await self._load_image(item['image_path'])
+        
+        loaded = await asyncio.gather(*(load(item) for item in items), return_exceptions=True)
+        images = [None if isinstance(entry, Exception) else entry[0] for entry in loaded]
+        parameters = [item.get('parameters') or {} for item in items]
+        
+        async def prepare(index: int) -> None:
+            transformation_type = items[index]['transformation_type']
+            if isinstance(loaded[index], Exception):
+                results[index] = {'error': str(loaded[index])}
+            elif transformation_type not in OUTPUT_SUFFIXES:
+                results[index] = {'error': f"Unknown transformation type: {transformation_type}"}
+            elif transformation_type in load_errors:
+                results[index] = {'error': load_errors[transformation_type]}
+            else:
+                try:
+                    parameters[index] = await self._with_faces(
+                        transformation_type, images[index], loaded[index][1], parameters[index]
+                    )
+                except Exception as e:
+                    results[index] = {'error': str(e)}
+        
+        # Validate and run shared face detection for every item
+        await asyncio.gather(*(prepare(index) for index in range(len(items))))
+        
+        # Group by transformation type
+        groups: Dict[str, List[int]] = {}
+        for index, item in enumerate(items):
+            if results[index] is None:
+                groups.setdefault(item['transformation_type'], []).append(index)
+        
+        async def process_chunk(transformation_type: str, indices: List[int]) -> None:
+            chunk_start = time.perf_counter()
+            try:
+                if self._batcher(transformation_type) is not None:
+                    outputs = await asyncio.gather(
+                        *(self._run_model(transformation_type, images[i], parameters[i]) for i in indices),
+                        return_exceptions=True
+                    )
+                else:
+                    outputs = await self.executor.run_batch(
+                        transformation_type,
+                        [images[i] for i in indices],
+                        [parameters[i] for i in indices]
+                    )
+            except Exception as e:
+                outputs = [e] * len(indices)
+            
+            # A chunk runs its images back to back; record the per-image share
+            kernel_seconds = (time.perf_counter() - chunk_start) / len(indices)
+            for _ in indices:
+                STAGE_LATENCY.labels('kernel', transformation_type).observe(kernel_seconds)
+            
+            async def save(index: int, output) -> None:
+                if isinstance(output, Exception):
+                    results[index] = {'error': str(output)}
+                    return
+                output_path = self._output_path(items[index]['image_path'], transformation_type)
+                try:
+                    with stage_timer('encode', transformation_type):
+                        await self._write_image(output_path, output)
+                    results[index] = {'output_path': output_path}
+                except Exception as e:
+                    results[index] = {'error': str(e)}
+            
+            await asyncio.gather(*(save(i, output) for i, output in zip(indices, outputs)))
+            
+            processing_time_ms = int((loop.time() - start_time) * 1000)
+            for i in indices:
+                results[i]['processing_time_ms'] = processing_time_ms
+        
+        # Split each group into one chunk per worker; a chunk runs in a single
+        # worker call so per-process model state is reused across it
+        chunks = []
+        for transformation_type, indices in groups.items():
+            chunk_size = math.ceil(len(indices) / self.executor.max_workers)
+            for offset in range(0, len(indices), chunk_size):
+                chunks.append(process_chunk(transformation_type, indices[offset:offset + chunk_size]))
+        await asyncio.gather(*chunks)
+        
+        processing_time_ms = int((loop.time() - start_time) * 1000)
+        for result in results:
+            result.setdefault('processing_time_ms', processing_time_ms)
+        
+        logger.info(
+            "Batch processing completed",
+            size=len(items),
+            failed=sum(1 for result in results if 'error' in result),
+            processing_time_ms=processing_time_ms
+        )
+        return results
+    
     def get_model_info(self, model_name: str) -> Dict[str, Any]:
         """Get information about a specific model"""
-        if model_name not in self.models:
+        spec = self.registry.spec(model_name)
+        if spec is None:
             raise ModelError(f"Model {model_name} not found")
         
-        model = self.models[model_name]
+        model = self.registry.get(model_name)
         return {
             'name': model_name,
-            'type': model.get('type', 'unknown'),
-            'loaded': model.get('loaded', False),
-            'device': model.get('device', 'unknown'),
-            'status': self.model_status.get(model_name, 'unknown')
+            'type': spec.kind,
+            'loaded': model is not None,
+            'device': model['device'] if model is not None else self.device,
+            'status': self.registry.status(model_name)
         }
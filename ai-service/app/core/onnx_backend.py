@@ -0,0 +1,142 @@
+"""
+ONNX Runtime backend for MorphFlux AI Service
+Loads image-to-image networks exported to ONNX as reusable CPU inference sessions
+"""
+
+import os
+import time
+from typing import Dict, Any, Optional, Tuple
+import numpy as np
+from app.core.batching import Forward
+from app.core.config import settings
+from app.core.exceptions import ModelError
+from app.core.logging import get_logger
+
+logger = get_logger(__name__)
+
+# ONNX_GRAPH_OPTIMIZATION values and their onnxruntime.GraphOptimizationLevel names
+GRAPH_OPTIMIZATION_LEVELS = {
+    'disabled': 'ORT_DISABLE_ALL',
+    'basic': 'ORT_ENABLE_BASIC',
+    'extended': 'ORT_ENABLE_EXTENDED',
+    'all': 'ORT_ENABLE_ALL',
+}
+
+# Side of the warm-up image when the network's input size is dynamic
+WARMUP_SIZE = 256
+
+
+def model_path(model_name: str) -> str:
+    """Path of a model's ONNX file: MODEL_CACHE_DIR/<model_name>.onnx"""
+    return os.path.join(settings.MODEL_CACHE_DIR, f"{model_name}.onnx")
+
+
+def thread_counts() -> Tuple[int, int]:
+    """Intra- and inter-op threads for each session
+
+    By default a session gets an equal share of the cores with the other
+    MAX_CONCURRENT_JOBS kernels that may run beside it, so concurrent
+    inference does not oversubscribe the CPU.
+    """
+    intra_op = settings.ONNX_INTRA_OP_THREADS
+    if intra_op <= 0:
+        intra_op = max(1, (os.cpu_count() or 1) // max(1, settings.MAX_CONCURRENT_JOBS))
+    return intra_op, max(1, settings.ONNX_INTER_OP_THREADS)
+
+
+def session_options(ort: Any) -> Any:
+    """Build SessionOptions from the ONNX_* settings"""
+    level = GRAPH_OPTIMIZATION_LEVELS.get(settings.ONNX_GRAPH_OPTIMIZATION)
+    if level is None:
+        raise ModelError(f"Unknown ONNX graph optimization level: {settings.ONNX_GRAPH_OPTIMIZATION}")
+
+    intra_op, inter_op = thread_counts()
+    options = ort.SessionOptions()
+    options.graph_optimization_level = getattr(ort.GraphOptimizationLevel, level)
+    options.intra_op_num_threads = intra_op
+    options.inter_op_num_threads = inter_op
+    # Independent graph branches only run concurrently in parallel mode
+    options.execution_mode = ort.ExecutionMode.ORT_PARALLEL if inter_op > 1 else ort.ExecutionMode.ORT_SEQUENTIAL
+    return options
+
+
+def load_session(path: str) -> Any:
+    """Create a CPU inference session for an ONNX file; blocking, so run it in a thread"""
+    try:
+        import onnxruntime as ort
+    except ImportError:
+        raise ModelError("onnxruntime is not installed")
+    if not os.path.exists(path):
+        raise ModelError(f"ONNX model not found: {path}")
+
+    return ort.InferenceSession(path, sess_options=session_options(ort), providers=['CPUExecutionProvider'])
+
+
+def onnx_forward(session: Any) -> Forward:
+    """Wrap a session whose network takes and returns RGB NCHW in [0, 1] as a Forward
+
+    The session is reused for every batch; run() is safe to call from
+    several threads at once.
+    """
+    input_name = session.get_inputs()[0].name
+    output_name = session.get_outputs()[0].name
+
+    def forward(batch: np.ndarray) -> np.ndarray:
+        # uint8 BGR NHWC -> float RGB NCHW
+        inputs = np.ascontiguousarray(batch[..., ::-1].transpose(0, 3, 1, 2), dtype=np.float32)
+        inputs *= 1 / 255
+        outputs = session.run([output_name], {input_name: inputs})[0]
+        outputs = np.clip(outputs, 0, 1) * 255
+        return np.rint(outputs).astype(np.uint8)[:, ::-1].transpose(0, 2, 3, 1).copy()
+
+    return forward
+
+
+def static_dims(session: Any) -> Tuple[Optional[int], Optional[int]]:
+    """The network's input height and width, each None when dynamic"""
+    shape = session.get_inputs()[0].shape
+    return tuple(dim if isinstance(dim, int) and dim > 0 else None for dim in shape[2:4])
+
+
+def input_size(session: Any) -> Optional[Tuple[int, int]]:
+    """The network's fixed input [height, width], or None unless both are static"""
+    dims = static_dims(session)
+    return dims if None not in dims else None
+
+
+def warm_up(session: Any, forward: Forward, size: Optional[Tuple[int, int]] = None) -> float:
+    """Run one inference so the first request does not pay for kernel setup; returns milliseconds"""
+    static = static_dims(session)
+    height, width = size or (WARMUP_SIZE, WARMUP_SIZE)
+    height, width = static[0] or height, static[1] or width
+
+    start = time.perf_counter()
+    forward(np.zeros((1, height, width, 3), dtype=np.uint8))
+    return (time.perf_counter() - start) * 1000
+
+
+def load_onnx_model(model_name: str, warmup_size: Optional[Tuple[int, int]] = None) -> Tuple[Dict[str, Any], int]:
+    """Load a model's ONNX file as a warmed-up session; blocking, so run it in a thread"""
+    path = model_path(model_name)
+    session = load_session(path)
+    forward = onnx_forward(session)
+    warmup_ms = warm_up(session, forward, warmup_size)
+
+    intra_op, inter_op = thread_counts()
+    logger.info(
+        "ONNX session created",
+        model=model_name,
+        path=path,
+        intra_op_threads=intra_op,
+        inter_op_threads=inter_op,
+        graph_optimization=settings.ONNX_GRAPH_OPTIMIZATION,
+        warmup_ms=round(warmup_ms, 1)
+    )
+    model = {
+        'type': 'onnx',
+        'session': session,
+        'forward': forward,
+        'input_size': input_size(session),
+        'device': 'cpu'
+    }
+    return model, os.path.getsize(path)
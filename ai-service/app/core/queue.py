@@ -0,0 +1,588 @@
+"""
+Job queue for MorphFlux AI Service
+Priority queue with an admission limit and pluggable storage backends
+"""
+
+import asyncio
+import heapq
+import itertools
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from abc import ABC, abstractmethod
+from dataclasses import dataclass, field, asdict
+from typing import Dict, Any, Optional, List, Tuple
+from app.core.config import settings
+from app.core.exceptions import QueueFullError, ValidationError
+from app.core.logging import get_logger
+
+logger = get_logger(__name__)
+
+# Job priorities are bounded so the Redis backend's float scores keep FIFO order within a priority
+MIN_PRIORITY = -1000
+MAX_PRIORITY = 1000
+
+
+@dataclass
+class Job:
+    """A unit of queued work. Higher priority jobs are dequeued first."""
+    job_id: str
+    payload: Dict[str, Any]
+    priority: int = 0
+    enqueued_at: float = field(default_factory=time.time)
+    attempts: int = 0
+
+    def to_json(self) -> str:
+        """Serialize the job for a persistent backend"""
+        return json.dumps(asdict(self))
+
+    @classmethod
+    def from_json(cls, data: str) -> "Job":
+        """Deserialize a job from a persistent backend"""
+        return cls(**json.loads(data))
+
+
+def make_owner() -> str:
+    """Identify this process as the holder of the jobs it takes"""
+    return f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+
+class QueueBackend(ABC):
+    """Storage backend for the job queue
+
+    Persistent backends lease each job they hand out to this process for
+    lease_timeout seconds. The holder renews leases while it works; a job
+    whose lease expires, because its holder died, is requeued by any
+    process, or dead-lettered once it has been taken max_attempts times.
+    """
+
+    lease_timeout: float = 60.0
+    max_attempts: int = 3
+
+    async def connect(self) -> None:
+        """Open the backend"""
+
+    async def close(self) -> None:
+        """Close the backend"""
+
+    async def renew(self, jobs: List[Job]) -> None:
+        """Extend the leases of jobs this process is still working on"""
+
+    async def recover(self) -> List[Job]:
+        """Requeue jobs whose lease expired, returning those dead-lettered instead"""
+        return []
+
+    @abstractmethod
+    async def push(self, job: Job, max_size: int) -> bool:
+        """Add a job unless max_size jobs are already waiting, checked atomically; False when full"""
+
+    @abstractmethod
+    async def pop(self, timeout: float) -> Optional[Job]:
+        """Take the highest priority job, waiting up to timeout seconds"""
+
+    @abstractmethod
+    async def ack(self, job: Job) -> None:
+        """Mark a job taken with pop() as finished"""
+
+    @abstractmethod
+    async def size(self) -> int:
+        """Number of jobs waiting to be processed"""
+
+
+class MemoryQueueBackend(QueueBackend):
+    """In-process backend; jobs do not survive a restart"""
+
+    def __init__(self):
+        self._heap: List[Tuple[int, int, Job]] = []
+        self._counter = itertools.count()
+        self._items = asyncio.Semaphore(0)
+
+    async def push(self, job: Job, max_size: int) -> bool:
+        if len(self._heap) >= max_size:
+            return False
+        heapq.heappush(self._heap, (-job.priority, next(self._counter), job))
+        self._items.release()
+        return True
+
+    async def pop(self, timeout: float) -> Optional[Job]:
+        try:
+            await asyncio.wait_for(self._items.acquire(), timeout)
+        except asyncio.TimeoutError:
+            return None
+        _, _, job = heapq.heappop(self._heap)
+        job.attempts += 1
+        return job
+
+    async def ack(self, job: Job) -> None:
+        pass
+
+    async def size(self) -> int:
+        return len(self._heap)
+
+
+class SQLiteQueueBackend(QueueBackend):
+    """Single-host persistent backend stored in a SQLite file"""
+
+    POLL_INTERVAL = 0.5
+
+    def __init__(self, path: str, lease_timeout: float = 60.0, max_attempts: int = 3):
+        self.path = path
+        self.lease_timeout = lease_timeout
+        self.max_attempts = max_attempts
+        self.owner = make_owner()
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+        self._pushed = asyncio.Event()
+
+    def _connect_sync(self) -> None:
+        self._conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS jobs (
+                seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                job_id TEXT NOT NULL UNIQUE,
+                priority INTEGER NOT NULL,
+                state TEXT NOT NULL,
+                data TEXT NOT NULL,
+                owner TEXT,
+                lease_expires REAL
+            )
+        """)
+        # Queue files created before leases existed
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(jobs)")}
+        for column, kind in (('owner', 'TEXT'), ('lease_expires', 'REAL')):
+            if column not in columns:
+                self._conn.execute(f"ALTER TABLE jobs ADD COLUMN {column} {kind}")
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS jobs_queued ON jobs (state, priority DESC, seq)"
+        )
+
+    def _push_sync(self, job: Job, max_size: int) -> bool:
+        with self._lock:
+            # Count and insert in one write transaction, so concurrent submitters cannot overfill
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                depth = self._conn.execute(
+                    "SELECT COUNT(*) FROM jobs WHERE state = 'queued'"
+                ).fetchone()[0]
+                if depth >= max_size:
+                    self._conn.execute("COMMIT")
+                    return False
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO jobs (job_id, priority, state, data) VALUES (?, ?, 'queued', ?)",
+                    (job.job_id, job.priority, job.to_json())
+                )
+                self._conn.execute("COMMIT")
+                return True
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def _pop_sync(self) -> Optional[Job]:
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute(
+                    "SELECT seq, data FROM jobs WHERE state = 'queued' "
+                    "ORDER BY priority DESC, seq LIMIT 1"
+                ).fetchone()
+                if row is None:
+                    self._conn.execute("COMMIT")
+                    return None
+
+                job = Job.from_json(row[1])
+                job.attempts += 1
+                self._conn.execute(
+                    "UPDATE jobs SET state = 'running', data = ?, owner = ?, lease_expires = ? WHERE seq = ?",
+                    (job.to_json(), self.owner, time.time() + self.lease_timeout, row[0])
+                )
+                self._conn.execute("COMMIT")
+                return job
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def _ack_sync(self, job: Job) -> None:
+        with self._lock:
+            # A job whose lease expired may already be queued or running elsewhere
+            self._conn.execute(
+                "DELETE FROM jobs WHERE job_id = ? AND state = 'running' AND owner = ?",
+                (job.job_id, self.owner)
+            )
+
+    def _renew_sync(self, job_ids: List[str]) -> None:
+        with self._lock:
+            self._conn.executemany(
+                "UPDATE jobs SET lease_expires = ? WHERE job_id = ? AND state = 'running' AND owner = ?",
+                [(time.time() + self.lease_timeout, job_id, self.owner) for job_id in job_ids]
+            )
+
+    def _recover_sync(self) -> Tuple[int, List[Job]]:
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                rows = self._conn.execute(
+                    "SELECT seq, data FROM jobs WHERE state = 'running' AND lease_expires < ?",
+                    (time.time(),)
+                ).fetchall()
+                requeued, dead = 0, []
+                for seq, data in rows:
+                    job = Job.from_json(data)
+                    if job.attempts >= self.max_attempts:
+                        state = 'dead'
+                        dead.append(job)
+                    else:
+                        state = 'queued'
+                        requeued += 1
+                    self._conn.execute(
+                        "UPDATE jobs SET state = ?, owner = NULL, lease_expires = NULL WHERE seq = ?",
+                        (state, seq)
+                    )
+                self._conn.execute("COMMIT")
+                return requeued, dead
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def _size_sync(self) -> int:
+        with self._lock:
+            return self._conn.execute(
+                "SELECT COUNT(*) FROM jobs WHERE state = 'queued'"
+            ).fetchone()[0]
+
+    async def connect(self) -> None:
+        await asyncio.to_thread(self._connect_sync)
+
+    async def close(self) -> None:
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    async def push(self, job: Job, max_size: int) -> bool:
+        if not await asyncio.to_thread(self._push_sync, job, max_size):
+            return False
+        self._pushed.set()
+        return True
+
+    async def pop(self, timeout: float) -> Optional[Job]:
+        deadline = time.monotonic() + timeout
+        while True:
+            self._pushed.clear()
+            job = await asyncio.to_thread(self._pop_sync)
+            remaining = deadline - time.monotonic()
+            if job is not None or remaining <= 0:
+                return job
+            # Wake on a local push, or poll for jobs pushed by other processes
+            try:
+                await asyncio.wait_for(
+                    self._pushed.wait(), min(remaining, self.POLL_INTERVAL)
+                )
+            except asyncio.TimeoutError:
+                pass
+
+    async def ack(self, job: Job) -> None:
+        await asyncio.to_thread(self._ack_sync, job)
+
+    async def renew(self, jobs: List[Job]) -> None:
+        if jobs:
+            await asyncio.to_thread(self._renew_sync, [job.job_id for job in jobs])
+
+    async def recover(self) -> List[Job]:
+        requeued, dead = await asyncio.to_thread(self._recover_sync)
+        if requeued:
+            logger.info("Requeued jobs with expired leases", count=requeued, backend="sqlite")
+            self._pushed.set()
+        return dead
+
+    async def size(self) -> int:
+        return await asyncio.to_thread(self._size_sync)
+
+
+class RedisQueueBackend(QueueBackend):
+    """Shared persistent backend stored in Redis
+
+    Admitting, taking, renewing, finishing and recovering a job each run as
+    one Lua script, so a crash never leaves a job in neither the queue nor
+    the running set, and concurrent submitters cannot overfill the queue.
+    """
+
+    # Score = -priority * PRIORITY_SCALE + sequence, so priority dominates FIFO
+    # order. With |priority| <= MAX_PRIORITY every score stays below 2^53,
+    # where doubles still hold consecutive sequence numbers apart; scripts
+    # format scores with 17 digits, as Lua's default keeps only 14.
+    PRIORITY_SCALE = 10 ** 12
+    POLL_INTERVAL = 0.2
+
+    # KEYS: queued, jobs, seq
+    # ARGV: max size, job_id, data, priority, priority scale
+    PUSH_SCRIPT = """
+        if redis.call('ZCARD', KEYS[1]) >= tonumber(ARGV[1]) then return 0 end
+        local seq = redis.call('INCR', KEYS[3])
+        redis.call('HSET', KEYS[2], ARGV[2], ARGV[3])
+        local score = -tonumber(ARGV[4]) * tonumber(ARGV[5]) + seq
+        redis.call('ZADD', KEYS[1], string.format('%.17g', score), ARGV[2])
+        return 1
+    """
+
+    # KEYS: queued, jobs, running, leases, owners, attempts
+    # ARGV: lease expiry, owner
+    POP_SCRIPT = """
+        local popped = redis.call('ZPOPMIN', KEYS[1])
+        if #popped == 0 then return nil end
+        local job_id = popped[1]
+        local data = redis.call('HGET', KEYS[2], job_id)
+        if not data then return nil end
+        redis.call('HDEL', KEYS[2], job_id)
+        redis.call('HSET', KEYS[3], job_id, data)
+        redis.call('ZADD', KEYS[4], ARGV[1], job_id)
+        redis.call('HSET', KEYS[5], job_id, ARGV[2])
+        local attempts = redis.call('HINCRBY', KEYS[6], job_id, 1)
+        return {data, attempts}
+    """
+
+    # KEYS: running, leases, owners, attempts
+    # ARGV: owner, job_id
+    ACK_SCRIPT = """
+        if redis.call('HGET', KEYS[3], ARGV[2]) ~= ARGV[1] then return 0 end
+        redis.call('HDEL', KEYS[1], ARGV[2])
+        redis.call('ZREM', KEYS[2], ARGV[2])
+        redis.call('HDEL', KEYS[3], ARGV[2])
+        redis.call('HDEL', KEYS[4], ARGV[2])
+        return 1
+    """
+
+    # KEYS: leases, owners
+    # ARGV: lease expiry, owner, job_id...
+    RENEW_SCRIPT = """
+        for i = 3, #ARGV do
+            if redis.call('HGET', KEYS[2], ARGV[i]) == ARGV[2] then
+                redis.call('ZADD', KEYS[1], 'XX', ARGV[1], ARGV[i])
+            end
+        end
+        return 0
+    """
+
+    # KEYS: leases, owners, running, attempts, jobs, queued, dead, seq
+    # ARGV: now, max attempts, priority scale
+    RECOVER_SCRIPT = """
+        local requeued, dead = 0, {}
+        for _, job_id in ipairs(redis.call('ZRANGEBYSCORE', KEYS[1], '-inf', ARGV[1])) do
+            redis.call('ZREM', KEYS[1], job_id)
+            redis.call('HDEL', KEYS[2], job_id)
+            local data = redis.call('HGET', KEYS[3], job_id)
+            if data then
+                redis.call('HDEL', KEYS[3], job_id)
+                local attempts = tonumber(redis.call('HGET', KEYS[4], job_id) or '0')
+                if attempts >= tonumber(ARGV[2]) then
+                    redis.call('HDEL', KEYS[4], job_id)
+                    redis.call('HSET', KEYS[7], job_id, data)
+                    table.insert(dead, data)
+                    table.insert(dead, attempts)
+                else
+                    local seq = redis.call('INCR', KEYS[8])
+                    local priority = cjson.decode(data)['priority']
+                    redis.call('HSET', KEYS[5], job_id, data)
+                    local score = -priority * tonumber(ARGV[3]) + seq
+                    redis.call('ZADD', KEYS[6], string.format('%.17g', score), job_id)
+                    requeued = requeued + 1
+                end
+            end
+        end
+        return {requeued, dead}
+    """
+
+    def __init__(self, url: str, name: str, lease_timeout: float = 60.0, max_attempts: int = 3):
+        self.url = url
+        self.name = name
+        self.lease_timeout = lease_timeout
+        self.max_attempts = max_attempts
+        self.owner = make_owner()
+        self._redis = None
+        self._pushed = asyncio.Event()
+        self._queued_key = f"{name}:queued"
+        self._jobs_key = f"{name}:jobs"
+        self._running_key = f"{name}:running"
+        self._leases_key = f"{name}:leases"
+        self._owners_key = f"{name}:owners"
+        self._attempts_key = f"{name}:attempts"
+        self._dead_key = f"{name}:dead"
+        self._seq_key = f"{name}:seq"
+
+    async def connect(self) -> None:
+        import redis.asyncio as redis
+
+        self._redis = redis.from_url(self.url, decode_responses=True)
+        self._push = self._redis.register_script(self.PUSH_SCRIPT)
+        self._pop = self._redis.register_script(self.POP_SCRIPT)
+        self._ack = self._redis.register_script(self.ACK_SCRIPT)
+        self._renew = self._redis.register_script(self.RENEW_SCRIPT)
+        self._recover = self._redis.register_script(self.RECOVER_SCRIPT)
+
+    async def close(self) -> None:
+        if self._redis is not None:
+            await self._redis.aclose()
+            self._redis = None
+
+    async def push(self, job: Job, max_size: int) -> bool:
+        admitted = await self._push(
+            keys=[self._queued_key, self._jobs_key, self._seq_key],
+            args=[max_size, job.job_id, job.to_json(), job.priority, self.PRIORITY_SCALE]
+        )
+        if not admitted:
+            return False
+        self._pushed.set()
+        return True
+
+    async def _take(self) -> Optional[Job]:
+        taken = await self._pop(
+            keys=[
+                self._queued_key, self._jobs_key, self._running_key,
+                self._leases_key, self._owners_key, self._attempts_key
+            ],
+            args=[time.time() + self.lease_timeout, self.owner]
+        )
+        if taken is None:
+            return None
+        data, attempts = taken
+        job = Job.from_json(data)
+        job.attempts = int(attempts)
+        return job
+
+    async def pop(self, timeout: float) -> Optional[Job]:
+        deadline = time.monotonic() + timeout
+        while True:
+            self._pushed.clear()
+            job = await self._take()
+            remaining = deadline - time.monotonic()
+            if job is not None or remaining <= 0:
+                return job
+            # Wake on a local push, or poll for jobs pushed by other processes
+            try:
+                await asyncio.wait_for(self._pushed.wait(), min(remaining, self.POLL_INTERVAL))
+            except asyncio.TimeoutError:
+                pass
+
+    async def ack(self, job: Job) -> None:
+        await self._ack(
+            keys=[self._running_key, self._leases_key, self._owners_key, self._attempts_key],
+            args=[self.owner, job.job_id]
+        )
+
+    async def renew(self, jobs: List[Job]) -> None:
+        if jobs:
+            await self._renew(
+                keys=[self._leases_key, self._owners_key],
+                args=[time.time() + self.lease_timeout, self.owner, *(job.job_id for job in jobs)]
+            )
+
+    async def recover(self) -> List[Job]:
+        requeued, dead = await self._recover(
+            keys=[
+                self._leases_key, self._owners_key, self._running_key, self._attempts_key,
+                self._jobs_key, self._queued_key, self._dead_key, self._seq_key
+            ],
+            args=[time.time(), self.max_attempts, self.PRIORITY_SCALE]
+        )
+        if requeued:
+            logger.info("Requeued jobs with expired leases", count=requeued, backend="redis")
+            self._pushed.set()
+
+        jobs = []
+        for data, attempts in zip(dead[::2], dead[1::2]):
+            job = Job.from_json(data)
+            job.attempts = int(attempts)
+            jobs.append(job)
+        return jobs
+
+    async def size(self) -> int:
+        return await self._redis.zcard(self._queued_key)
+
+
+class JobQueue:
+    """Priority job queue with an admission limit"""
+
+    def __init__(self, backend: QueueBackend, max_size: Optional[int] = None):
+        self.backend = backend
+        self.max_size = max_size or settings.JOB_QUEUE_MAX_SIZE
+        self._stats = {'submitted': 0, 'rejected': 0, 'completed': 0, 'dead_lettered': 0}
+
+    async def connect(self) -> None:
+        """Open the backend"""
+        await self.backend.connect()
+        logger.info(
+            "Job queue connected",
+            backend=type(self.backend).__name__,
+            max_size=self.max_size
+        )
+
+    async def close(self) -> None:
+        """Close the backend"""
+        await self.backend.close()
+
+    async def submit(self, job: Job) -> None:
+        """Admit a job to the queue, rejecting it when the queue is full"""
+        if not MIN_PRIORITY <= job.priority <= MAX_PRIORITY:
+            raise ValidationError(f"Priority must be between {MIN_PRIORITY} and {MAX_PRIORITY}")
+
+        if not await self.backend.push(job, self.max_size):
+            self._stats['rejected'] += 1
+            logger.warning("Job rejected, queue full", job_id=job.job_id, max_size=self.max_size)
+            raise QueueFullError()
+        self._stats['submitted'] += 1
+
+    async def get(self, timeout: float = 1.0) -> Optional[Job]:
+        """Take the next job, or None if none arrived within timeout"""
+        return await self.backend.pop(timeout)
+
+    async def ack(self, job: Job) -> None:
+        """Mark a job as finished"""
+        await self.backend.ack(job)
+        self._stats['completed'] += 1
+
+    async def renew(self, jobs: List[Job]) -> None:
+        """Extend the leases of jobs still being processed"""
+        await self.backend.renew(jobs)
+
+    async def recover(self) -> List[Job]:
+        """Requeue jobs abandoned by a dead process, returning those that ran out of attempts"""
+        dead = await self.backend.recover()
+        for job in dead:
+            self._stats['dead_lettered'] += 1
+            logger.error("Job dead-lettered", job_id=job.job_id, attempts=job.attempts)
+        return dead
+
+    async def depth(self) -> int:
+        """Number of jobs waiting to be processed"""
+        return await self.backend.size()
+
+    async def get_stats(self) -> Dict[str, Any]:
+        """Get queue statistics"""
+        return {
+            'backend': type(self.backend).__name__,
+            'depth': await self.depth(),
+            'max_size': self.max_size,
+            **self._stats
+        }
+
+
+def create_job_queue() -> JobQueue:
+    """Create the job queue for the configured backend"""
+    backend_name = settings.JOB_QUEUE_BACKEND
+    if backend_name == 'memory':
+        backend = MemoryQueueBackend()
+    elif backend_name == 'sqlite':
+        backend = SQLiteQueueBackend(
+            settings.JOB_QUEUE_SQLITE_PATH, settings.JOB_LEASE_TIMEOUT, settings.JOB_MAX_ATTEMPTS
+        )
+    elif backend_name == 'redis':
+        backend = RedisQueueBackend(
+            settings.REDIS_URL, settings.JOB_QUEUE_NAME, settings.JOB_LEASE_TIMEOUT, settings.JOB_MAX_ATTEMPTS
+        )
+    else:
+        raise ValidationError(f"Unknown job queue backend: {backend_name}")
+
+    return JobQueue(backend, settings.JOB_QUEUE_MAX_SIZE)
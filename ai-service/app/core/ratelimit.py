@@ -0,0 +1,248 @@
+"""
+Rate limiting for MorphFlux AI Service
+GCRA (generic cell rate algorithm) limiter with in-memory and Redis backends
+"""
+
+import hashlib
+import time
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from typing import Dict, Any, Optional, Tuple
+from app.core.config import settings
+from app.core.exceptions import ValidationError
+from app.core.logging import get_logger
+
+logger = get_logger(__name__)
+
+
+@dataclass(frozen=True)
+class RateLimit:
+    """Allow `calls` requests per `period` seconds, all of which may arrive as a burst"""
+    calls: int
+    period: float
+
+    @property
+    def emission_interval(self) -> float:
+        """Steady-state spacing between requests"""
+        return self.period / self.calls
+
+
+@dataclass
+class RateLimitResult:
+    """Outcome of a rate limit check"""
+    allowed: bool
+    limit: int
+    remaining: int
+    retry_after: float = 0.0
+
+
+def gcra(tat: float, now: float, limit: RateLimit) -> Tuple[bool, float, float]:
+    """One GCRA step from a key's theoretical arrival time (TAT)
+
+    Returns (allowed, new_tat, slack) where slack is the time before the
+    request would be admitted if denied, or the spare burst time if allowed.
+    """
+    new_tat = max(tat, now) + limit.emission_interval
+    allow_at = new_tat - limit.period
+    if now < allow_at:
+        return False, tat, allow_at - now
+    return True, new_tat, now - allow_at
+
+
+class RateLimitBackend(ABC):
+    """Storage for per-key theoretical arrival times"""
+
+    @abstractmethod
+    async def check(self, key: str, limit: RateLimit) -> Tuple[bool, float]:
+        """Count one request against a key, returning (allowed, slack)"""
+
+    async def close(self) -> None:
+        """Release backend resources"""
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get backend statistics"""
+        return {}
+
+
+class MemoryRateLimitBackend(RateLimitBackend):
+    """Per-process store; each uvicorn worker enforces limits independently"""
+
+    def __init__(self, sweep_interval: float = 60.0):
+        self.sweep_interval = sweep_interval
+        self._tats: Dict[str, float] = {}
+        self._next_sweep = time.monotonic() + sweep_interval
+
+    async def check(self, key: str, limit: RateLimit) -> Tuple[bool, float]:
+        now = time.monotonic()
+        if now >= self._next_sweep:
+            self._sweep(now)
+
+        allowed, tat, slack = gcra(self._tats.get(key, now), now, limit)
+        if allowed:
+            self._tats[key] = tat
+        return allowed, slack
+
+    def _sweep(self, now: float) -> None:
+        """Drop keys whose bucket has fully refilled; they behave like unseen keys"""
+        self._tats = {key: tat for key, tat in self._tats.items() if tat > now}
+        self._next_sweep = now + self.sweep_interval
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {'tracked_keys': len(self._tats)}
+
+
+# Atomic GCRA step using the Redis server clock, so all workers share one timeline.
+# Floats are returned as strings because Lua numbers are truncated to integers.
+GCRA_SCRIPT = """
+local emission_interval = tonumber(ARGV[1])
+local period = tonumber(ARGV[2])
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+local tat = tonumber(redis.call('GET', KEYS[1]) or now)
+if tat < now then
+    tat = now
+end
+local new_tat = tat + emission_interval
+local allow_at = new_tat - period
+if now < allow_at then
+    return {0, tostring(allow_at - now)}
+end
+redis.call('SET', KEYS[1], tostring(new_tat), 'PX', math.ceil((new_tat - now) * 1000))
+return {1, tostring(now - allow_at)}
+"""
+
+
+class RedisRateLimitBackend(RateLimitBackend):
+    """Shared store so limits hold across uvicorn workers and hosts
+
+    Keys expire once their bucket has refilled, so no sweeping is needed.
+    Requests are allowed if Redis is unreachable.
+    """
+
+    def __init__(self, url: str, prefix: str = "morphflux:ratelimit"):
+        import redis.asyncio as redis
+
+        self.prefix = prefix
+        self._redis = redis.from_url(url, decode_responses=True)
+        self._script = self._redis.register_script(GCRA_SCRIPT)
+        self.errors = 0
+
+    async def check(self, key: str, limit: RateLimit) -> Tuple[bool, float]:
+        try:
+            allowed, slack = await self._script(
+                keys=[f"{self.prefix}:{key}"],
+                args=[limit.emission_interval, limit.period]
+            )
+        except Exception as e:
+            self.errors += 1
+            logger.warning("Rate limit backend unavailable, allowing request", error=str(e))
+            return True, limit.period
+        return bool(int(allowed)), float(slack)
+
+    async def close(self) -> None:
+        await self._redis.close()
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {'errors': self.errors}
+
+
+class RateLimiter:
+    """Resolves a request to a bucket and limit, and checks it against the backend
+
+    Clients are identified by a configured API key, falling back to the
+    client IP. Requests under a configured route prefix use that route's
+    limit in a bucket of their own; all other requests share the client's
+    default bucket.
+    """
+
+    def __init__(
+        self,
+        backend: RateLimitBackend,
+        default_limit: RateLimit,
+        route_limits: Optional[Dict[str, RateLimit]] = None,
+        api_key_limits: Optional[Dict[str, RateLimit]] = None
+    ):
+        self.backend = backend
+        self.default_limit = default_limit
+        # Longest prefix first so the most specific route wins
+        self.route_limits = dict(sorted(
+            (route_limits or {}).items(), key=lambda item: len(item[0]), reverse=True
+        ))
+        self.api_key_limits = {
+            self._hash_key(api_key): limit for api_key, limit in (api_key_limits or {}).items()
+        }
+        self.allowed = 0
+        self.limited = 0
+
+    @staticmethod
+    def _hash_key(api_key: str) -> str:
+        """Identify API keys by digest so raw keys are never stored or logged"""
+        return hashlib.sha256(api_key.encode()).hexdigest()[:16]
+
+    def resolve(self, path: str, client_ip: str, api_key: Optional[str]) -> Tuple[str, RateLimit]:
+        """Get the bucket key and limit for a request"""
+        identity, limit = f"ip:{client_ip}", self.default_limit
+        if api_key:
+            key_hash = self._hash_key(api_key)
+            if key_hash in self.api_key_limits:
+                identity, limit = f"key:{key_hash}", self.api_key_limits[key_hash]
+
+        for prefix, route_limit in self.route_limits.items():
+            if path.startswith(prefix):
+                return f"{identity}:{prefix}", route_limit
+        return identity, limit
+
+    async def check(self, path: str, client_ip: str, api_key: Optional[str] = None) -> RateLimitResult:
+        """Count a request and decide whether it is allowed"""
+        key, limit = self.resolve(path, client_ip, api_key)
+        allowed, slack = await self.backend.check(key, limit)
+
+        if allowed:
+            self.allowed += 1
+            # Epsilon absorbs float error in the backend's slack arithmetic
+            remaining = min(limit.calls - 1, int(slack / limit.emission_interval + 1e-6))
+            return RateLimitResult(True, limit.calls, remaining)
+
+        self.limited += 1
+        return RateLimitResult(False, limit.calls, 0, retry_after=slack)
+
+    async def close(self) -> None:
+        """Close the backend"""
+        await self.backend.close()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get limiter statistics"""
+        return {
+            'backend': type(self.backend).__name__,
+            'default_limit': f"{self.default_limit.calls}/{self.default_limit.period}s",
+            'routes': {
+                prefix: f"{limit.calls}/{limit.period}s" for prefix, limit in self.route_limits.items()
+            },
+            'api_keys': len(self.api_key_limits),
+            'allowed': self.allowed,
+            'limited': self.limited,
+            **self.backend.get_stats()
+        }
+
+
+def create_rate_limiter() -> RateLimiter:
+    """Create the rate limiter for the configured backend and limits"""
+    backend_name = settings.RATE_LIMIT_BACKEND
+    if backend_name == 'memory':
+        backend = MemoryRateLimitBackend()
+    elif backend_name == 'redis':
+        backend = RedisRateLimitBackend(settings.REDIS_URL)
+    else:
+        raise ValidationError(f"Unknown rate limit backend: {backend_name}")
+
+    period = settings.RATE_LIMIT_PERIOD
+    return RateLimiter(
+        backend,
+        RateLimit(settings.RATE_LIMIT_CALLS, period),
+        route_limits={
+            prefix: RateLimit(calls, period) for prefix, calls in settings.RATE_LIMIT_ROUTES.items()
+        },
+        api_key_limits={
+            api_key: RateLimit(calls, period) for api_key, calls in settings.RATE_LIMIT_API_KEYS.items()
+        }
+    )
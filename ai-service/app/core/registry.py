@@ -0,0 +1,283 @@
+"""
+Model registry for MorphFlux AI Service
+Loads models on first use and unloads them under a memory budget or when idle
+"""
+
+import asyncio
+import time
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from typing import Dict, Any, Optional, List, Tuple, Callable, Awaitable, AsyncIterator, Iterable
+from app.core.exceptions import ModelError
+from app.core.logging import get_logger
+
+logger = get_logger(__name__)
+
+# Models loaded by the serve.py parent before it forks workers; every worker's registry adopts them
+_preloaded: Dict[str, Tuple[Any, int]] = {}
+
+
+def set_preloaded_models(models: Dict[str, Tuple[Any, int]]) -> None:
+    """Record models, with their sizes in bytes, for registries created after a fork to adopt"""
+    _preloaded.clear()
+    _preloaded.update(models)
+
+
+def preloaded_models() -> Dict[str, Tuple[Any, int]]:
+    """Get the models preloaded by a prefork parent, if any"""
+    return dict(_preloaded)
+
+
+@dataclass
+class ModelSpec:
+    """How to load a model
+
+    loader returns the model and its resident size in bytes, which counts
+    against the registry's memory budget. unloader, if set, releases
+    resources the model holds beyond Python references (e.g. GPU memory).
+    """
+    name: str
+    kind: str
+    loader: Callable[[], Awaitable[Tuple[Any, int]]]
+    unloader: Optional[Callable[[Any], None]] = None
+
+
+@dataclass
+class LoadedModel:
+    """A resident model and its usage bookkeeping"""
+    model: Any
+    size_bytes: int
+    last_used: float
+    in_use: int = 0
+
+
+class ModelRegistry:
+    """Lazily loaded models with LRU and idle eviction
+
+    Each model loads under its own lock, so concurrent first requests share
+    one load. Models are pinned while requests use them and only unpinned
+    models are evicted. The memory budget is soft: when pinned models leave
+    no room, a load proceeds over budget rather than failing the request.
+    Prewarmed models are exempt from idle eviction but not from the budget.
+    """
+
+    def __init__(self, memory_budget: int, idle_timeout: float):
+        self.memory_budget = memory_budget
+        self.idle_timeout = idle_timeout
+        self._specs: Dict[str, ModelSpec] = {}
+        self._loaded: "OrderedDict[str, LoadedModel]" = OrderedDict()
+        self._locks: Dict[str, asyncio.Lock] = {}
+        self._failed: Dict[str, str] = {}
+        self._sizes: Dict[str, int] = {}
+        self._resident: set = set()
+        self._shared: set = set()
+        self._sweeper: Optional[asyncio.Task] = None
+        self._stats = {'loads': 0, 'load_failures': 0, 'evictions': 0, 'idle_evictions': 0}
+
+    def register(self, spec: ModelSpec) -> None:
+        """Add a model that can be loaded on demand"""
+        self._specs[spec.name] = spec
+        self._locks[spec.name] = asyncio.Lock()
+
+    @property
+    def used_bytes(self) -> int:
+        return sum(entry.size_bytes for entry in self._loaded.values())
+
+    def status(self, name: str) -> str:
+        """Get a model's status: loaded, loading, failed, unloaded or unknown"""
+        if name not in self._specs:
+            return 'unknown'
+        if name in self._loaded:
+            return 'loaded'
+        if self._locks[name].locked():
+            return 'loading'
+        if name in self._failed:
+            return 'failed'
+        return 'unloaded'
+
+    def spec(self, name: str) -> Optional[ModelSpec]:
+        """Get a registered model's spec"""
+        return self._specs.get(name)
+
+    def is_loaded(self, name: str) -> bool:
+        return name in self._loaded
+
+    def get(self, name: str) -> Optional[Any]:
+        """Get a resident model without loading it"""
+        entry = self._loaded.get(name)
+        return entry.model if entry is not None else None
+
+    async def _acquire(self, name: str) -> Any:
+        """Load a model if needed and pin it"""
+        if name not in self._specs:
+            raise ModelError(f"Unknown model: {name}")
+
+        entry = self._loaded.get(name)
+        if entry is None:
+            async with self._locks[name]:
+                entry = self._loaded.get(name)
+                if entry is None:
+                    entry = await self._load(self._specs[name])
+
+        entry.in_use += 1
+        entry.last_used = time.monotonic()
+        self._loaded.move_to_end(name)
+        return entry.model
+
+    def _release(self, name: str) -> None:
+        entry = self._loaded.get(name)
+        if entry is not None:
+            entry.in_use -= 1
+            entry.last_used = time.monotonic()
+
+    async def _load(self, spec: ModelSpec) -> LoadedModel:
+        # Reloads free room first, using the size measured on the last load
+        self._make_room(self._sizes.get(spec.name, 0), warn=False)
+        start = time.perf_counter()
+        try:
+            model, size_bytes = await spec.loader()
+        except Exception as e:
+            self._failed[spec.name] = str(e)
+            self._stats['load_failures'] += 1
+            logger.error("Failed to load model", model=spec.name, error=str(e))
+            raise ModelError(f"Failed to load {spec.name} model: {str(e)}")
+
+        self._make_room(size_bytes)
+        self._sizes[spec.name] = size_bytes
+        entry = LoadedModel(model, size_bytes, time.monotonic())
+        self._loaded[spec.name] = entry
+        self._failed.pop(spec.name, None)
+        self._stats['loads'] += 1
+        logger.info(
+            "Model loaded",
+            model=spec.name,
+            size_bytes=size_bytes,
+            load_ms=round((time.perf_counter() - start) * 1000, 1),
+            used_bytes=self.used_bytes
+        )
+        return entry
+
+    def _make_room(self, size_bytes: int, warn: bool = True) -> None:
+        """Evict least recently used idle models until size_bytes fits the budget"""
+        for name in list(self._loaded):
+            if self.used_bytes + size_bytes <= self.memory_budget:
+                return
+            # Dropping a shared model frees nothing; its pages belong to the parent
+            if self._loaded[name].in_use == 0 and name not in self._shared:
+                self._unload(name)
+                self._stats['evictions'] += 1
+
+        if warn and self.used_bytes + size_bytes > self.memory_budget:
+            logger.warning(
+                "Model memory budget exceeded",
+                used_bytes=self.used_bytes,
+                requested_bytes=size_bytes,
+                budget_bytes=self.memory_budget
+            )
+
+    def _unload(self, name: str) -> None:
+        entry = self._loaded.pop(name)
+        spec = self._specs[name]
+        if spec.unloader is not None:
+            try:
+                spec.unloader(entry.model)
+            except Exception as e:
+                logger.warning("Failed to release model resources", model=name, error=str(e))
+        logger.info("Model unloaded", model=name, size_bytes=entry.size_bytes)
+
+    @asynccontextmanager
+    async def use(self, *names: str) -> AsyncIterator[Dict[str, Any]]:
+        """Load models as needed and keep them resident while the block runs"""
+        acquired: Dict[str, Any] = {}
+        try:
+            for name in dict.fromkeys(names):
+                acquired[name] = await self._acquire(name)
+            yield acquired
+        finally:
+            for name in acquired:
+                self._release(name)
+
+    async def prewarm(self, names: Iterable[str]) -> None:
+        """Load models ahead of the first request and keep them through idle sweeps"""
+        names = list(names)
+        self._resident.update(names)
+        results = await asyncio.gather(
+            *(self._acquire(name) for name in names), return_exceptions=True
+        )
+        for name, result in zip(names, results):
+            if isinstance(result, Exception):
+                logger.error("Failed to prewarm model", model=name, error=str(result))
+            else:
+                self._release(name)
+
+    def adopt(self, name: str, model: Any, size_bytes: int) -> None:
+        """Add a model loaded by another process and shared with this one; it stays resident"""
+        if name not in self._specs:
+            raise ModelError(f"Unknown model: {name}")
+        self._loaded[name] = LoadedModel(model, size_bytes, time.monotonic())
+        self._sizes[name] = size_bytes
+        self._resident.add(name)
+        self._shared.add(name)
+
+    def loaded_models(self) -> Dict[str, Tuple[Any, int]]:
+        """Get every resident model with its size in bytes"""
+        return {name: (entry.model, entry.size_bytes) for name, entry in self._loaded.items()}
+
+    def evict_idle(self) -> List[str]:
+        """Unload unpinned models unused for longer than the idle timeout"""
+        if self.idle_timeout <= 0:
+            return []
+        cutoff = time.monotonic() - self.idle_timeout
+        evicted = [
+            name for name, entry in self._loaded.items()
+            if entry.in_use == 0 and entry.last_used < cutoff and name not in self._resident
+        ]
+        for name in evicted:
+            self._unload(name)
+            self._stats['idle_evictions'] += 1
+        return evicted
+
+    async def _sweep(self) -> None:
+        interval = min(60.0, max(1.0, self.idle_timeout / 4))
+        while True:
+            await asyncio.sleep(interval)
+            self.evict_idle()
+
+    def start(self) -> None:
+        """Start the idle eviction sweep"""
+        if self.idle_timeout > 0 and self._sweeper is None:
+            self._sweeper = asyncio.create_task(self._sweep(), name="model-idle-sweep")
+
+    async def close(self) -> None:
+        """Stop sweeping and unload every model"""
+        if self._sweeper is not None:
+            self._sweeper.cancel()
+            await asyncio.gather(self._sweeper, return_exceptions=True)
+            self._sweeper = None
+        for name in list(self._loaded):
+            self._unload(name)
+
+    def get_status(self) -> Dict[str, str]:
+        """Get the status of every registered model"""
+        return {name: self.status(name) for name in self._specs}
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get registry statistics"""
+        now = time.monotonic()
+        return {
+            'memory_budget_bytes': self.memory_budget,
+            'used_bytes': self.used_bytes,
+            'idle_timeout': self.idle_timeout,
+            'loaded': {
+                name: {
+                    'size_bytes': entry.size_bytes,
+                    'in_use': entry.in_use,
+                    'idle_seconds': round(now - entry.last_used, 1),
+                    'resident': name in self._resident,
+                    'shared': name in self._shared
+                }
+                for name, entry in self._loaded.items()
+            },
+            **self._stats
+        }
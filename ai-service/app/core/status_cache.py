@@ -0,0 +1,251 @@
+"""
+Transformation status cache for MorphFlux AI Service
+Read-through cache of transformation rows, invalidated whenever a status is written
+"""
+
+import asyncio
+import json
+import time
+from collections import OrderedDict
+from typing import Dict, Any, Optional, Callable, Awaitable, Iterable, Tuple
+from app.core.config import settings
+from app.core.exceptions import ValidationError
+from app.core.logging import get_logger
+
+logger = get_logger(__name__)
+
+# Statuses that only change if the transformation is submitted again
+TERMINAL_STATUSES = {'completed', 'failed'}
+
+Row = Dict[str, Any]
+Fetch = Callable[[str], Awaitable[Optional[Row]]]
+
+
+def _encode_value(value: Any) -> str:
+    # ISO timestamps, as FastAPI renders the uncached row
+    return value.isoformat() if hasattr(value, 'isoformat') else str(value)
+
+
+class StatusCache:
+    """In-process LRU of transformation rows with an optional shared Redis tier
+
+    Every status write invalidates the row in both tiers. A read that
+    overlaps an invalidation is returned but not cached. Non-terminal rows
+    expire after ttl and terminal rows after terminal_ttl in the Redis
+    tier. Local entries never outlive ttl, because other workers'
+    invalidations, such as a resubmit's, only reach Redis or their own
+    process.
+    """
+
+    def __init__(
+        self,
+        ttl: float,
+        terminal_ttl: float,
+        max_entries: int,
+        redis_url: Optional[str] = None,
+        prefix: str = "morphflux:status"
+    ):
+        self.ttl = ttl
+        self.terminal_ttl = terminal_ttl
+        self.max_entries = max_entries
+        self.redis_url = redis_url
+        self.prefix = prefix
+        self._redis = None
+        self._entries: "OrderedDict[str, Tuple[Row, float]]" = OrderedDict()
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self._generation = 0
+        self._invalidated: "OrderedDict[str, int]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    async def connect(self) -> None:
+        """Connect the Redis tier, if configured"""
+        if self.redis_url:
+            import redis.asyncio as redis
+
+            self._redis = redis.from_url(self.redis_url, decode_responses=True)
+
+    async def close(self) -> None:
+        """Close the Redis tier"""
+        if self._redis is not None:
+            await self._redis.close()
+            self._redis = None
+
+    def _ttl(self, row: Row, local: bool) -> float:
+        if row.get('status') not in TERMINAL_STATUSES or local:
+            return self.ttl
+        return self.terminal_ttl
+
+    def _get_local(self, transformation_id: str) -> Optional[Row]:
+        entry = self._entries.get(transformation_id)
+        if entry is None:
+            return None
+        row, expires_at = entry
+        if time.monotonic() >= expires_at:
+            del self._entries[transformation_id]
+            return None
+        self._entries.move_to_end(transformation_id)
+        return row
+
+    def _put_local(self, transformation_id: str, row: Row) -> None:
+        self._entries[transformation_id] = (row, time.monotonic() + self._ttl(row, local=True))
+        self._entries.move_to_end(transformation_id)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    async def get(self, transformation_id: str, fetch: Fetch) -> Optional[Row]:
+        """Get a transformation row from the cache, or fetch it once for all concurrent readers"""
+        row = self._get_local(transformation_id)
+        if row is None and self._redis is not None:
+            row = await self._get_shared(transformation_id)
+            if row is not None:
+                self._put_local(transformation_id, row)
+        if row is not None:
+            self.hits += 1
+            return row
+
+        self.misses += 1
+        load = self._inflight.get(transformation_id)
+        if load is None:
+            load = asyncio.ensure_future(self._load(transformation_id, fetch))
+            self._inflight[transformation_id] = load
+            load.add_done_callback(lambda _: self._forget_load(transformation_id, load))
+        return await asyncio.shield(load)
+
+    def _forget_load(self, transformation_id: str, load: asyncio.Future) -> None:
+        if self._inflight.get(transformation_id) is load:
+            del self._inflight[transformation_id]
+
+    async def _load(self, transformation_id: str, fetch: Fetch) -> Optional[Row]:
+        generation = self._generation
+        version = await self._shared_version(transformation_id) if self._redis is not None else None
+
+        row = await fetch(transformation_id)
+        if row is None or self._invalidated.get(transformation_id, -1) >= generation:
+            return row
+
+        self._put_local(transformation_id, row)
+        if self._redis is not None:
+            try:
+                await self._put_shared(transformation_id, row, version)
+            except Exception as e:
+                logger.warning("Failed to cache transformation status", error=str(e))
+        return row
+
+    async def invalidate(self, transformation_ids: Iterable[str]) -> None:
+        """Drop rows whose status was written or is about to change"""
+        transformation_ids = [str(transformation_id) for transformation_id in transformation_ids]
+        for transformation_id in transformation_ids:
+            self._entries.pop(transformation_id, None)
+            self._inflight.pop(transformation_id, None)
+            self._invalidated[transformation_id] = self._generation
+            self._invalidated.move_to_end(transformation_id)
+            self.invalidations += 1
+        self._generation += 1
+        while len(self._invalidated) > self.max_entries:
+            self._invalidated.popitem(last=False)
+
+        if self._redis is not None and transformation_ids:
+            async with self._redis.pipeline(transaction=False) as pipe:
+                for transformation_id in transformation_ids:
+                    version_key = f"{self.prefix}:version:{transformation_id}"
+                    pipe.incr(version_key)
+                    pipe.expire(version_key, max(1, int(self.terminal_ttl)))
+                    pipe.delete(f"{self.prefix}:{transformation_id}")
+                await pipe.execute()
+
+    async def _get_shared(self, transformation_id: str) -> Optional[Row]:
+        try:
+            data = await self._redis.get(f"{self.prefix}:{transformation_id}")
+        except Exception as e:
+            logger.warning("Failed to read cached transformation status", error=str(e))
+            return None
+        return json.loads(data) if data is not None else None
+
+    async def _shared_version(self, transformation_id: str) -> Optional[str]:
+        try:
+            return await self._redis.get(f"{self.prefix}:version:{transformation_id}")
+        except Exception:
+            return None
+
+    async def _put_shared(self, transformation_id: str, row: Row, version: Optional[str]) -> None:
+        """Store a row unless another worker invalidated it since version was read"""
+        from redis.exceptions import WatchError
+
+        version_key = f"{self.prefix}:version:{transformation_id}"
+        data = json.dumps(row, default=_encode_value)
+        async with self._redis.pipeline(transaction=True) as pipe:
+            try:
+                await pipe.watch(version_key)
+                if await pipe.get(version_key) != version:
+                    return
+                pipe.multi()
+                pipe.set(f"{self.prefix}:{transformation_id}", data, ex=max(1, int(self._ttl(row, local=False))))
+                await pipe.execute()
+            except WatchError:
+                pass
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get cache statistics"""
+        lookups = self.hits + self.misses
+        return {
+            'backend': 'redis' if self.redis_url else 'memory',
+            'entries': len(self._entries),
+            'max_entries': self.max_entries,
+            'hits': self.hits,
+            'misses': self.misses,
+            'invalidations': self.invalidations,
+            'hit_rate': round(self.hits / lookups, 3) if lookups else 0.0
+        }
+
+
+# Application-lifetime status cache, created in main.lifespan
+_status_cache: Optional[StatusCache] = None
+
+
+async def init_status_cache() -> Optional[StatusCache]:
+    """Create the status cache for the configured backend"""
+    global _status_cache
+    if not settings.STATUS_CACHE_ENABLED or _status_cache is not None:
+        return _status_cache
+
+    backend_name = settings.STATUS_CACHE_BACKEND
+    if backend_name not in ('memory', 'redis'):
+        raise ValidationError(f"Unknown status cache backend: {backend_name}")
+
+    cache = StatusCache(
+        ttl=settings.STATUS_CACHE_TTL,
+        terminal_ttl=settings.STATUS_CACHE_TERMINAL_TTL,
+        max_entries=settings.STATUS_CACHE_MAX_ENTRIES,
+        redis_url=settings.REDIS_URL if backend_name == 'redis' else None,
+        prefix=settings.STATUS_CACHE_PREFIX
+    )
+    await cache.connect()
+    _status_cache = cache
+    logger.info("Status cache created", backend=backend_name, ttl=settings.STATUS_CACHE_TTL)
+    return cache
+
+
+async def close_status_cache() -> None:
+    """Close the status cache"""
+    global _status_cache
+    if _status_cache is not None:
+        await _status_cache.close()
+        _status_cache = None
+
+
+def get_status_cache() -> Optional[StatusCache]:
+    """Get the status cache, if enabled"""
+    return _status_cache
+
+
+async def invalidate_transformations(transformation_ids: Iterable[str]) -> None:
+    """Invalidate cached rows, e.g. after writing their status"""
+    if _status_cache is None:
+        return
+    try:
+        await _status_cache.invalidate(transformation_ids)
+    except Exception as e:
+        # Local entries are already gone; shared ones expire after their TTL
+        logger.warning("Failed to invalidate cached transformation status", error=str(e))
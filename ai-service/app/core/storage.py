@@ -0,0 +1,223 @@
+"""
+Object storage for MorphFlux AI Service
+Asynchronous uploads to S3-compatible storage through one shared, pooled client
+"""
+
+import asyncio
+import mimetypes
+import random
+from contextlib import AsyncExitStack
+from typing import Dict, Any, Optional, List
+from app.core.config import settings
+from app.core.exceptions import ProcessingError
+from app.core.logging import get_logger
+
+logger = get_logger(__name__)
+
+# S3 rejects multipart parts smaller than this, except the last one
+MIN_PART_SIZE = 5 * 1024 * 1024
+
+
+# Error codes S3 and S3-compatible stores use for throttling and timeouts
+RETRYABLE_ERROR_CODES = {
+    'Throttling', 'ThrottlingException', 'RequestLimitExceeded', 'SlowDown',
+    'RequestTimeout', 'RequestTimeoutException'
+}
+
+
+def is_retryable(error: Exception) -> bool:
+    """Whether a failed request may succeed on retry: connection errors, timeouts, throttling and 5xx"""
+    from botocore.exceptions import ClientError, ConnectionError as BotoConnectionError, HTTPClientError
+
+    if isinstance(error, ClientError):
+        status = error.response.get('ResponseMetadata', {}).get('HTTPStatusCode')
+        code = error.response.get('Error', {}).get('Code')
+        return code in RETRYABLE_ERROR_CODES or (status is not None and (status >= 500 or status in (408, 429)))
+    return isinstance(error, (BotoConnectionError, HTTPClientError, ConnectionError, asyncio.TimeoutError))
+
+
+def guess_mime_type(path: str) -> str:
+    """Guess an image's media type from its file extension"""
+    return mimetypes.guess_type(path)[0] or "application/octet-stream"
+
+
+class S3Uploader:
+    """Uploads objects with single PUTs, or concurrent multipart uploads when large"""
+
+    def __init__(
+        self,
+        bucket: Optional[str] = None,
+        endpoint_url: Optional[str] = None,
+        multipart_threshold: Optional[int] = None,
+        part_size: Optional[int] = None,
+        max_concurrency: Optional[int] = None,
+        max_attempts: Optional[int] = None
+    ):
+        self.bucket = bucket or settings.AWS_S3_BUCKET
+        self.endpoint_url = endpoint_url or settings.AWS_S3_ENDPOINT_URL
+        self.multipart_threshold = multipart_threshold or settings.S3_MULTIPART_THRESHOLD
+        self.part_size = max(MIN_PART_SIZE, part_size or settings.S3_MULTIPART_PART_SIZE)
+        self.max_concurrency = max_concurrency or settings.S3_MAX_CONCURRENCY
+        self.max_attempts = max_attempts or settings.S3_MAX_ATTEMPTS
+        self._client = None
+        self._exit_stack: Optional[AsyncExitStack] = None
+        self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        self._stats = {'uploads': 0, 'multipart_uploads': 0, 'bytes': 0, 'retries': 0, 'failures': 0}
+
+    async def start(self) -> None:
+        """Create the shared client and its connection pool"""
+        if self._client is not None:
+            return
+
+        from aiobotocore.config import AioConfig
+        from aiobotocore.session import get_session
+
+        self._exit_stack = AsyncExitStack()
+        self._client = await self._exit_stack.enter_async_context(
+            get_session().create_client(
+                's3',
+                region_name=settings.AWS_REGION,
+                endpoint_url=self.endpoint_url,
+                aws_access_key_id=settings.AWS_ACCESS_KEY_ID,
+                aws_secret_access_key=settings.AWS_SECRET_ACCESS_KEY,
+                # Retries are handled here, with backoff across whole operations
+                config=AioConfig(
+                    max_pool_connections=self.max_concurrency,
+                    retries={'max_attempts': 1, 'mode': 'standard'}
+                )
+            )
+        )
+        logger.info(
+            "S3 uploader started",
+            bucket=self.bucket,
+            endpoint_url=self.endpoint_url,
+            max_concurrency=self.max_concurrency
+        )
+
+    async def close(self) -> None:
+        """Close the shared client"""
+        if self._exit_stack is not None:
+            await self._exit_stack.aclose()
+            self._exit_stack = None
+            self._client = None
+            logger.info("S3 uploader closed")
+
+    async def _with_retry(self, operation: str, call, *args, **kwargs) -> Dict[str, Any]:
+        """Run a client call, retrying failures with exponential backoff and jitter"""
+        for attempt in range(1, self.max_attempts + 1):
+            try:
+                return await call(*args, **kwargs)
+            except Exception as e:
+                if attempt == self.max_attempts or not is_retryable(e):
+                    raise
+                delay = min(10.0, 0.2 * 2 ** (attempt - 1)) * (0.5 + random.random())
+                self._stats['retries'] += 1
+                logger.warning(
+                    "S3 request failed, retrying",
+                    operation=operation,
+                    attempt=attempt,
+                    delay=round(delay, 3),
+                    error=str(e)
+                )
+                await asyncio.sleep(delay)
+
+    async def upload_bytes(self, data: bytes, key: str, content_type: str) -> int:
+        """Upload an in-memory object and return its size"""
+        if self._client is None:
+            raise ProcessingError("S3 uploader is not started")
+
+        try:
+            if len(data) < self.multipart_threshold:
+                async with self._semaphore:
+                    await self._with_retry(
+                        'put_object',
+                        self._client.put_object,
+                        Bucket=self.bucket,
+                        Key=key,
+                        Body=data,
+                        ContentType=content_type
+                    )
+            else:
+                await self._upload_multipart(memoryview(data), key, content_type)
+        except Exception as e:
+            self._stats['failures'] += 1
+            logger.error("S3 upload failed", key=key, error=str(e))
+            raise ProcessingError(f"Upload failed: {str(e)}")
+
+        self._stats['uploads'] += 1
+        self._stats['bytes'] += len(data)
+        return len(data)
+
+    async def upload_file(self, path: str, key: str, content_type: Optional[str] = None) -> int:
+        """Upload a local file and return its size"""
+        data = await asyncio.to_thread(self._read_file, path)
+        return await self.upload_bytes(data, key, content_type or guess_mime_type(path))
+
+    @staticmethod
+    def _read_file(path: str) -> bytes:
+        with open(path, 'rb') as f:
+            return f.read()
+
+    async def _upload_multipart(self, data: memoryview, key: str, content_type: str) -> None:
+        """Upload parts concurrently, aborting the upload if any part fails"""
+        created = await self._with_retry(
+            'create_multipart_upload',
+            self._client.create_multipart_upload,
+            Bucket=self.bucket,
+            Key=key,
+            ContentType=content_type
+        )
+        upload_id = created['UploadId']
+
+        async def upload_part(number: int, offset: int) -> Dict[str, Any]:
+            async with self._semaphore:
+                response = await self._with_retry(
+                    'upload_part',
+                    self._client.upload_part,
+                    Bucket=self.bucket,
+                    Key=key,
+                    UploadId=upload_id,
+                    PartNumber=number,
+                    Body=bytes(data[offset:offset + self.part_size])
+                )
+            return {'PartNumber': number, 'ETag': response['ETag']}
+
+        try:
+            parts: List[Dict[str, Any]] = await asyncio.gather(*(
+                upload_part(number, offset)
+                for number, offset in enumerate(range(0, len(data), self.part_size), start=1)
+            ))
+            await self._with_retry(
+                'complete_multipart_upload',
+                self._client.complete_multipart_upload,
+                Bucket=self.bucket,
+                Key=key,
+                UploadId=upload_id,
+                MultipartUpload={'Parts': parts}
+            )
+        except BaseException:
+            try:
+                await self._client.abort_multipart_upload(
+                    Bucket=self.bucket, Key=key, UploadId=upload_id
+                )
+            except Exception as e:
+                logger.warning("Failed to abort multipart upload", key=key, error=str(e))
+            raise
+
+        self._stats['multipart_uploads'] += 1
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get upload statistics"""
+        return {
+            'bucket': self.bucket,
+            'endpoint_url': self.endpoint_url,
+            'started': self._client is not None,
+            **self._stats
+        }
+
+
+def create_uploader() -> Optional[S3Uploader]:
+    """Create the output uploader, or None when uploads are disabled"""
+    if not settings.S3_UPLOAD_ENABLED:
+        return None
+    return S3Uploader()
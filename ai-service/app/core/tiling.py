@@ -0,0 +1,79 @@
+"""
+Tiled execution for MorphFlux AI Service
+Runs pixel-local kernels tile by tile so their working memory stays within a fixed budget
+"""
+
+import math
+from dataclasses import dataclass
+from typing import Dict, Any, Callable, Iterator, Optional, Tuple
+import numpy as np
+from app.core.config import settings
+
+# Smallest tile side; thinner tiles spend more time on halos and call overhead than on pixels
+MIN_TILE_SIDE = 64
+
+
+@dataclass(frozen=True)
+class TileOp:
+    """An operation that can run on each tile of an image independently
+
+    fn maps an input tile to an output tile of the same height and width.
+    halo is the neighbourhood radius fn reads around each output pixel, 0
+    for pixel-local operations. working_bytes estimates fn's temporary
+    memory per pixel and sizes the tiles against the budget. With
+    writes_out, fn also takes an out keyword and writes the tile there.
+    """
+    fn: Callable[..., np.ndarray]
+    halo: int = 0
+    working_bytes: int = 32
+    writes_out: bool = False
+
+
+def tile_grid(height: int, width: int, halo: int, max_pixels: int) -> Iterator[Tuple[int, int, int, int]]:
+    """Split an image into (y0, y1, x0, x1) tiles whose area plus halo is at most max_pixels
+
+    Full-width strips keep rows contiguous; images too wide for strips of
+    MIN_TILE_SIDE rows are split into square tiles instead.
+    """
+    strip = max_pixels // (width + 2 * halo) - 2 * halo
+    if strip >= min(height, MIN_TILE_SIDE):
+        tile_height, tile_width = min(strip, height), width
+    else:
+        tile_height = tile_width = max(MIN_TILE_SIDE, math.isqrt(max_pixels) - 2 * halo)
+
+    for y in range(0, height, tile_height):
+        for x in range(0, width, tile_width):
+            yield y, min(y + tile_height, height), x, min(x + tile_width, width)
+
+
+def run_tiled(
+    op: TileOp,
+    image: np.ndarray,
+    parameters: Dict[str, Any],
+    out: Optional[np.ndarray] = None,
+    budget: Optional[int] = None
+) -> np.ndarray:
+    """Apply op to an image tile by tile, writing into out
+
+    Each tile is read with op.halo extra pixels on every side that lies
+    inside the image and only its core is written, so neighbourhood filters
+    see the same pixels, and image-edge borders, as on the whole image.
+    out must not overlap image when op.halo is non-zero.
+    """
+    budget = budget or settings.TILE_MEMORY_BUDGET
+    height, width = image.shape[:2]
+    max_pixels = max(1, budget // op.working_bytes)
+
+    for y0, y1, x0, x1 in tile_grid(height, width, op.halo, max_pixels):
+        if op.writes_out and op.halo == 0 and out is not None:
+            op.fn(image[y0:y1, x0:x1], parameters, out=out[y0:y1, x0:x1])
+            continue
+
+        top, left = max(0, y0 - op.halo), max(0, x0 - op.halo)
+        tile = image[top:min(height, y1 + op.halo), left:min(width, x1 + op.halo)]
+        result = op.fn(tile, parameters)
+        if out is None:
+            out = np.empty((height, width) + result.shape[2:], result.dtype)
+        out[y0:y1, x0:x1] = result[y0 - top:y1 - top, x0 - left:x1 - left]
+
+    return out if out is not None else image.copy()
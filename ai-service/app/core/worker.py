@@ -0,0 +1,127 @@
+"""
+Worker pool for MorphFlux AI Service
+Drains the job queue with a fixed number of concurrent worker loops
+"""
+
+import asyncio
+from typing import Awaitable, Callable, Dict, Any, List, Optional
+from app.core.config import settings
+from app.core.logging import get_logger
+from app.core.queue import Job, JobQueue
+
+logger = get_logger(__name__)
+
+JobHandler = Callable[[Job], Awaitable[None]]
+
+
+class WorkerPool:
+    """Fixed-size pool of coroutines that process queued jobs
+
+    A maintenance task renews the leases of running jobs and requeues jobs
+    whose holder died; jobs that ran out of attempts go to dead_letter.
+    """
+
+    def __init__(
+        self,
+        queue: JobQueue,
+        handler: JobHandler,
+        concurrency: Optional[int] = None,
+        dead_letter: Optional[JobHandler] = None
+    ):
+        self.queue = queue
+        self.handler = handler
+        self.dead_letter = dead_letter
+        self.concurrency = concurrency or settings.MAX_CONCURRENT_JOBS
+        self._tasks: List[asyncio.Task] = []
+        self._maintenance: Optional[asyncio.Task] = None
+        self._running = False
+        self._jobs: Dict[str, Job] = {}
+
+    async def start(self) -> None:
+        """Start the worker loops"""
+        if self._running:
+            return
+
+        self._running = True
+        self._tasks = [
+            asyncio.create_task(self._run(index), name=f"job-worker-{index}")
+            for index in range(self.concurrency)
+        ]
+        self._maintenance = asyncio.create_task(self._maintain(), name="job-maintenance")
+        logger.info("Worker pool started", concurrency=self.concurrency)
+
+    async def stop(self, timeout: float = 10.0) -> None:
+        """Stop taking new jobs and wait for running jobs to finish"""
+        if not self._running:
+            return
+
+        self._running = False
+        done, pending = await asyncio.wait(self._tasks, timeout=timeout)
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+        self._tasks = []
+        self._maintenance.cancel()
+        await asyncio.gather(self._maintenance, return_exceptions=True)
+        self._maintenance = None
+        logger.info("Worker pool stopped", cancelled=len(pending))
+
+    async def _run(self, index: int) -> None:
+        """Worker loop: take a job, handle it, acknowledge it"""
+        while self._running:
+            try:
+                job = await self.queue.get(timeout=1.0)
+            except Exception as e:
+                logger.error("Failed to take job from queue", worker=index, error=str(e))
+                await asyncio.sleep(1.0)
+                continue
+
+            if job is None:
+                continue
+
+            # A job interrupted by shutdown is left unacknowledged so that
+            # persistent backends requeue it once its lease expires
+            self._jobs[job.job_id] = job
+            try:
+                await self.handler(job)
+            except asyncio.CancelledError:
+                if not self._running:
+                    raise
+                logger.error("Job handler was cancelled", worker=index, job_id=job.job_id)
+            except Exception as e:
+                logger.error("Job handler failed", worker=index, job_id=job.job_id, error=str(e))
+            finally:
+                self._jobs.pop(job.job_id, None)
+
+            try:
+                await self.queue.ack(job)
+            except Exception as e:
+                # The job is requeued when its lease expires
+                logger.error("Failed to acknowledge job", worker=index, job_id=job.job_id, error=str(e))
+
+    async def _maintain(self) -> None:
+        """Renew running jobs' leases and recover abandoned jobs, a few times per lease"""
+        interval = max(0.1, self.queue.backend.lease_timeout / 3)
+        while True:
+            try:
+                await self.queue.renew(list(self._jobs.values()))
+                dead = await self.queue.recover()
+            except Exception as e:
+                logger.error("Job queue maintenance failed", error=str(e))
+                dead = []
+            for job in dead:
+                if self.dead_letter is None:
+                    continue
+                try:
+                    await self.dead_letter(job)
+                except Exception as e:
+                    logger.error("Dead-letter handler failed", job_id=job.job_id, error=str(e))
+            await asyncio.sleep(interval)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get worker pool statistics"""
+        return {
+            'running': self._running,
+            'concurrency': self.concurrency,
+            'active': len(self._jobs)
+        }
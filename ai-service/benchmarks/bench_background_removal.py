@@ -0,0 +1,85 @@
+"""
+Background removal latency by image size and quality preset
+
+The default run (balanced and fast up to 4 MP) takes a few minutes. The
+full preset runs GrabCut at full resolution, which takes minutes per image
+from a few megapixels and hours in total at 24 MP, so large sizes and full
+are opt-in. Mask agreement is relative to the first preset measured, in
+the order full, balanced, fast.
+
+Usage:
+    python -m benchmarks.bench_background_removal [--sizes 0.3 1 2 4] [--qualities balanced fast]
+        [--repeat 3] [--json out.json]
+    python -m benchmarks.bench_background_removal --sizes 0.3 1 4 12 24 --qualities full balanced fast
+"""
+
+import argparse
+import json
+import statistics
+import time
+from typing import Dict, Any, List
+
+from app.core.processing import BACKGROUND_REMOVAL_PRESETS, remove_background
+from benchmarks.synthetic import make_foreground_image
+
+DEFAULT_SIZES = [0.3, 1, 2, 4]
+DEFAULT_QUALITIES = ['balanced', 'fast']
+
+
+def run(sizes: List[float], qualities: List[str], repeat: int) -> List[Dict[str, Any]]:
+    """Time remove_background for each size and quality"""
+    # Measure the most exact preset first, as the agreement reference
+    qualities = [quality for quality in BACKGROUND_REMOVAL_PRESETS if quality in qualities]
+    rows = []
+    for megapixels in sizes:
+        image = make_foreground_image(megapixels)
+        reference = None
+        for quality in qualities:
+            timings = []
+            for _ in range(repeat):
+                start = time.perf_counter()
+                result = remove_background(image, {'quality': quality})
+                timings.append(time.perf_counter() - start)
+
+            # Mask agreement with the first (highest quality) preset measured
+            alpha = result[:, :, 3] > 0
+            if reference is None:
+                reference = alpha
+            agreement = float((alpha == reference).mean())
+
+            rows.append({
+                'megapixels': megapixels,
+                'width': image.shape[1],
+                'height': image.shape[0],
+                'quality': quality,
+                'median_s': round(statistics.median(timings), 4),
+                'min_s': round(min(timings), 4),
+                'mask_agreement': round(agreement, 4),
+            })
+            print(
+                f"{megapixels:>6.1f} MP  {quality:<9} "
+                f"median {rows[-1]['median_s']:>8.3f}s  "
+                f"agreement {rows[-1]['mask_agreement']:.4f}",
+                flush=True
+            )
+    return rows
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=float, nargs='+', default=DEFAULT_SIZES, help='Megapixels')
+    parser.add_argument(
+        '--qualities', nargs='+', default=DEFAULT_QUALITIES, choices=list(BACKGROUND_REMOVAL_PRESETS)
+    )
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--json', help='Write results to this file')
+    args = parser.parse_args()
+
+    rows = run(args.sizes, args.qualities, args.repeat)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(rows, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
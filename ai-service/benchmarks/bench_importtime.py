@@ -0,0 +1,140 @@
+"""
+Import-time profile of the service's startup modules
+
+For each target module, imports it in fresh interpreters to time a cold
+import (median of --repeat runs), then once more under -X importtime to
+attribute that time. Reports the slowest imports it pulls in and which
+heavy ML packages (torch and friends) are loaded as a side effect; none
+should be, since torch-backed models import them when they load.
+
+Usage:
+    python -m benchmarks.bench_importtime [--modules app.core.config app.core.models main]
+        [--repeat 5] [--top 15] [--json out.json]
+"""
+
+import argparse
+import json
+import re
+import statistics
+import subprocess
+import sys
+from typing import Dict, Any, List
+
+DEFAULT_MODULES = ['app.core.config', 'app.core.processing', 'app.core.models', 'main']
+
+# Packages that should only be imported when a model that needs them loads
+HEAVY_PACKAGES = (
+    'torch', 'torchvision', 'transformers', 'diffusers', 'accelerate',
+    'onnxruntime', 'insightface', 'rembg', 'skimage', 'face_recognition',
+)
+
+IMPORTTIME_LINE = re.compile(r'^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)')
+
+
+def time_cold_import(module: str) -> float:
+    """Seconds to import a module in a fresh interpreter, excluding interpreter startup"""
+    code = (
+        "import time; start = time.perf_counter(); "
+        f"import {module}; print(time.perf_counter() - start)"
+    )
+    result = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(f"Importing {module} failed:\n{result.stderr.strip()}")
+    return float(result.stdout.strip().splitlines()[-1])
+
+
+def profile_import(module: str) -> List[Dict[str, Any]]:
+    """Per-module self and cumulative import times from -X importtime, in microseconds"""
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+        capture_output=True, text=True
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"Importing {module} failed:\n{result.stderr.strip()}")
+
+    entries = []
+    for line in result.stderr.splitlines():
+        match = IMPORTTIME_LINE.match(line)
+        if match:
+            self_us, cumulative_us, indent, name = match.groups()
+            entries.append({
+                'module': name,
+                'self_us': int(self_us),
+                'cumulative_us': int(cumulative_us),
+                'depth': len(indent) // 2,
+            })
+    return entries
+
+
+def report(module: str, repeat: int, top: int) -> Dict[str, Any]:
+    """Cold import time, slowest transitive imports and heavy packages for one module"""
+    timings = [time_cold_import(module) for _ in range(repeat)]
+    entries = profile_import(module)
+
+    # Modules first imported by the target, i.e. excluding interpreter startup
+    target = next(entry for entry in reversed(entries) if entry['module'] == module)
+    start = entries.index(target)
+    while start > 0 and entries[start - 1]['depth'] > target['depth']:
+        start -= 1
+    imported = entries[start:entries.index(target) + 1]
+
+    heavy = sorted({
+        entry['module'].split('.')[0] for entry in imported
+        if entry['module'].split('.')[0] in HEAVY_PACKAGES
+    })
+    slowest = sorted(
+        (entry for entry in imported if entry['module'] != module),
+        key=lambda entry: entry['cumulative_us'],
+        reverse=True
+    )[:top]
+
+    return {
+        'module': module,
+        'median_s': round(statistics.median(timings), 4),
+        'min_s': round(min(timings), 4),
+        'importtime_cumulative_s': round(target['cumulative_us'] / 1e6, 4),
+        'modules_imported': len(imported),
+        'heavy_packages': heavy,
+        'slowest': [
+            {
+                'module': entry['module'],
+                'cumulative_ms': round(entry['cumulative_us'] / 1000, 1),
+                'self_ms': round(entry['self_us'] / 1000, 1),
+            }
+            for entry in slowest
+        ],
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--modules', nargs='+', default=DEFAULT_MODULES)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--top', type=int, default=15, help='Slowest imports to list per module')
+    parser.add_argument('--json', help='Write results to this file')
+    args = parser.parse_args()
+
+    reports = []
+    for module in args.modules:
+        try:
+            result = report(module, args.repeat, args.top)
+        except RuntimeError as e:
+            print(f"{module}: {e}", file=sys.stderr)
+            continue
+        reports.append(result)
+
+        print(
+            f"{module:<22} median {result['median_s'] * 1000:>8.1f} ms  "
+            f"{result['modules_imported']:>4} modules  "
+            f"heavy: {', '.join(result['heavy_packages']) or 'none'}"
+        )
+        for entry in result['slowest']:
+            print(f"    {entry['cumulative_ms']:>8.1f} ms  {entry['module']}")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(reports, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,389 @@
+"""
+HTTP load test of the /process -> /status flow
+
+Starts one main:app worker on the SQLite stand-in for DatabaseManager, or
+targets a running service with --url and seeds its Postgres database with
+--database-url. At each concurrency level, closed-loop virtual users
+repeatedly seed a pending transformation, submit it to /process and poll
+/status until it completes. Each level reports end-to-end latency
+percentiles, submit and status request latencies, error rates and
+throughput. The knee is the lowest concurrency whose throughput is within
+--knee-tolerance of the peak; past it, added load mostly queues and shows
+up as latency.
+
+Usage:
+    python -m benchmarks.bench_load [--concurrency 1 2 4 8 16 32] [--duration 30]
+        [--type style_transfer] [--megapixels 1] [--json out.json]
+    python -m benchmarks.bench_load --url http://localhost:8001 --database-url postgresql://...
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+from collections import Counter
+from typing import Dict, Any, List, Optional
+
+import cv2
+import httpx
+import numpy as np
+
+from benchmarks.synthetic import make_portrait_image
+
+API_PREFIX = "/api/v1/transformations"
+DEFAULT_CONCURRENCY = [1, 2, 4, 8, 16, 32]
+
+# Service settings for the spawned worker: no external services, and every
+# request does the full amount of work
+SERVER_ENV = {
+    'S3_UPLOAD_ENABLED': 'false',
+    'RATE_LIMIT_ENABLED': 'false',
+    'RESULT_CACHE_ENABLED': 'false',
+    'ENABLE_METRICS': 'false',
+    'LOG_LEVEL': 'WARNING',
+}
+
+
+class SQLiteSeeder:
+    """Seeds pending transformations into the stand-in database"""
+
+    def __init__(self, path: str):
+        from benchmarks.sqlite_db import SQLiteDatabase
+
+        self.db = SQLiteDatabase(path)
+
+    async def connect(self) -> None:
+        await asyncio.to_thread(self.db.connect)
+
+    async def create(self, transformation_id: str, transformation_type: str, parameters: Dict[str, Any]) -> None:
+        await self.db.create_transformation(transformation_id, transformation_type, parameters)
+
+    async def close(self) -> None:
+        await asyncio.to_thread(self.db.close)
+
+
+class PostgresSeeder:
+    """Seeds pending transformations into the service's Postgres database"""
+
+    def __init__(self, url: str):
+        self.url = url
+        self.pool = None
+
+    async def connect(self) -> None:
+        import asyncpg
+
+        self.pool = await asyncpg.create_pool(self.url, min_size=1, max_size=10)
+
+    async def create(self, transformation_id: str, transformation_type: str, parameters: Dict[str, Any]) -> None:
+        await self.pool.execute(
+            "INSERT INTO transformations (id, type, status, parameters) VALUES ($1, $2, 'pending', $3)",
+            transformation_id, transformation_type, json.dumps(parameters)
+        )
+
+    async def close(self) -> None:
+        await self.pool.close()
+
+
+class LevelStats:
+    """Measurements for one concurrency level"""
+
+    def __init__(self):
+        self.end_to_end: List[float] = []
+        self.submit: List[float] = []
+        self.status: List[float] = []
+        self.errors: Counter = Counter()
+
+    def summary(self, concurrency: int, elapsed: float) -> Dict[str, Any]:
+        completed = len(self.end_to_end)
+        attempts = completed + sum(self.errors.values())
+        return {
+            'concurrency': concurrency,
+            'completed': completed,
+            'errors': dict(self.errors),
+            'error_rate': round(sum(self.errors.values()) / attempts, 4) if attempts else 0.0,
+            'throughput_per_s': round(completed / elapsed, 3),
+            'end_to_end_s': percentiles(self.end_to_end),
+            'submit_ms': {k: round(v * 1000, 2) for k, v in percentiles(self.submit).items()},
+            'status_ms': {k: round(v * 1000, 2) for k, v in percentiles(self.status).items()},
+            'status_polls': len(self.status),
+        }
+
+
+def percentiles(values: List[float]) -> Dict[str, float]:
+    """p50/p90/p95/p99/max of a sample, in its own unit"""
+    if not values:
+        return {}
+    p50, p90, p95, p99 = np.percentile(values, [50, 90, 95, 99])
+    return {
+        'p50': round(float(p50), 4),
+        'p90': round(float(p90), 4),
+        'p95': round(float(p95), 4),
+        'p99': round(float(p99), 4),
+        'max': round(max(values), 4),
+    }
+
+
+async def virtual_user(
+    client: httpx.AsyncClient,
+    seeder,
+    image_path: str,
+    transformation_type: str,
+    deadline: float,
+    poll_interval: float,
+    timeout: float,
+    stats: LevelStats
+) -> None:
+    """Submit transformations one at a time until the deadline, polling each to completion"""
+    while time.monotonic() < deadline:
+        transformation_id = str(uuid.uuid4())
+        await seeder.create(transformation_id, transformation_type, {})
+
+        start = time.perf_counter()
+        try:
+            response = await client.post(f"{API_PREFIX}/process", json={
+                'transformation_id': transformation_id,
+                'input_image_path': image_path,
+                'transformation_type': transformation_type,
+                'parameters': {}
+            })
+        except httpx.HTTPError as e:
+            stats.errors[f"submit_{type(e).__name__}"] += 1
+            continue
+        stats.submit.append(time.perf_counter() - start)
+
+        if response.status_code != 200:
+            stats.errors[f"submit_http_{response.status_code}"] += 1
+            # Back off as a client would on 503 or 429
+            await asyncio.sleep(poll_interval)
+            continue
+
+        while True:
+            await asyncio.sleep(poll_interval)
+            if time.perf_counter() - start > timeout:
+                stats.errors['timeout'] += 1
+                break
+
+            poll_start = time.perf_counter()
+            try:
+                response = await client.get(f"{API_PREFIX}/{transformation_id}/status")
+            except httpx.HTTPError as e:
+                stats.errors[f"status_{type(e).__name__}"] += 1
+                continue
+            stats.status.append(time.perf_counter() - poll_start)
+
+            if response.status_code != 200:
+                stats.errors[f"status_http_{response.status_code}"] += 1
+                continue
+
+            status = response.json()['status']
+            if status == 'completed':
+                stats.end_to_end.append(time.perf_counter() - start)
+                break
+            if status == 'failed':
+                stats.errors['failed'] += 1
+                break
+
+
+async def run_level(
+    url: str,
+    seeder,
+    image_paths: List[str],
+    transformation_type: str,
+    concurrency: int,
+    duration: float,
+    poll_interval: float,
+    timeout: float
+) -> Dict[str, Any]:
+    """Run closed-loop virtual users at one concurrency level"""
+    stats = LevelStats()
+    limits = httpx.Limits(max_connections=concurrency * 2, max_keepalive_connections=concurrency * 2)
+    async with httpx.AsyncClient(base_url=url, limits=limits, timeout=timeout) as client:
+        start = time.monotonic()
+        await asyncio.gather(*(
+            virtual_user(
+                client, seeder, image_paths[i % len(image_paths)], transformation_type,
+                start + duration, poll_interval, timeout, stats
+            )
+            for i in range(concurrency)
+        ))
+        elapsed = time.monotonic() - start
+    return stats.summary(concurrency, elapsed)
+
+
+def find_knee(levels: List[Dict[str, Any]], tolerance: float) -> Optional[Dict[str, Any]]:
+    """Lowest concurrency level whose throughput is within tolerance of the peak"""
+    if not levels:
+        return None
+    peak = max(level['throughput_per_s'] for level in levels)
+    return next(
+        level for level in sorted(levels, key=lambda level: level['concurrency'])
+        if level['throughput_per_s'] >= peak * (1 - tolerance)
+    )
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def start_server(port: int, db_path: str, workdir: str) -> subprocess.Popen:
+    """Spawn one main:app worker on the SQLite stand-in"""
+    env = {
+        **os.environ,
+        **SERVER_ENV,
+        'OUTPUT_DIR': os.path.join(workdir, 'outputs'),
+    }
+    return subprocess.Popen(
+        [sys.executable, '-m', 'benchmarks.bench_load', '--serve', '--port', str(port), '--sqlite', db_path],
+        env=env
+    )
+
+
+async def wait_for_server(url: str, process: subprocess.Popen, timeout: float = 120.0) -> None:
+    """Wait until the service answers, which is after models load"""
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient(base_url=url) as client:
+        while time.monotonic() < deadline:
+            if process.poll() is not None:
+                raise RuntimeError(f"Service exited with code {process.returncode}")
+            try:
+                if (await client.get("/")).status_code == 200:
+                    return
+            except httpx.HTTPError:
+                pass
+            await asyncio.sleep(0.5)
+    raise RuntimeError("Service did not start in time")
+
+
+def serve(port: int, sqlite_path: str) -> None:
+    """Run one main:app worker with DatabaseManager backed by SQLite"""
+    import uvicorn
+    from benchmarks.sqlite_db import install
+
+    install(sqlite_path)
+    # Imported after install() so main binds the stand-in's lifespan hooks
+    import main
+
+    uvicorn.run(main.app, host='127.0.0.1', port=port, workers=1, log_level='warning', access_log=False)
+
+
+def write_inputs(directory: str, megapixels: float, count: int) -> List[str]:
+    """One copy of the input image per virtual user, so concurrent outputs never share a path"""
+    image, _ = make_portrait_image(megapixels)
+    first = os.path.join(directory, 'input_0.jpg')
+    cv2.imwrite(first, image, [cv2.IMWRITE_JPEG_QUALITY, 95])
+    paths = [first]
+    for i in range(1, count):
+        paths.append(os.path.join(directory, f'input_{i}.jpg'))
+        shutil.copyfile(first, paths[-1])
+    return paths
+
+
+async def run(args: argparse.Namespace) -> Dict[str, Any]:
+    """Run every concurrency level and locate the knee"""
+    workdir = tempfile.mkdtemp(prefix='morphflux-load-')
+    process = None
+    try:
+        if args.url:
+            url = args.url
+            seeder = PostgresSeeder(args.database_url) if args.database_url else SQLiteSeeder(args.sqlite)
+        else:
+            db_path = os.path.join(workdir, 'service.db')
+            url = f"http://127.0.0.1:{free_port()}"
+            process = start_server(int(url.rsplit(':', 1)[1]), db_path, workdir)
+            await wait_for_server(url, process)
+            seeder = SQLiteSeeder(db_path)
+        await seeder.connect()
+
+        if args.image:
+            image_paths = [args.image]
+        else:
+            image_paths = write_inputs(workdir, args.megapixels, max(args.concurrency))
+
+        levels = []
+        for concurrency in args.concurrency:
+            level = await run_level(
+                url, seeder, image_paths, args.type, concurrency,
+                args.duration, args.poll_interval, args.timeout
+            )
+            levels.append(level)
+            end_to_end = level['end_to_end_s']
+            print(
+                f"c={concurrency:<4} {level['throughput_per_s']:>8.2f}/s  "
+                f"e2e p50 {end_to_end.get('p50', 0):>7.3f}s  p95 {end_to_end.get('p95', 0):>7.3f}s  "
+                f"p99 {end_to_end.get('p99', 0):>7.3f}s  "
+                f"status p95 {level['status_ms'].get('p95', 0):>7.1f}ms  "
+                f"errors {level['error_rate']:.2%}",
+                flush=True
+            )
+        await seeder.close()
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    knee = find_knee(levels, args.knee_tolerance)
+    if knee is not None:
+        print(
+            f"\nKnee at concurrency {knee['concurrency']}: {knee['throughput_per_s']:.2f}/s "
+            f"(peak {max(level['throughput_per_s'] for level in levels):.2f}/s)"
+        )
+
+    return {
+        'config': {
+            'url': args.url or 'spawned',
+            'transformation_type': args.type,
+            'megapixels': None if args.image else args.megapixels,
+            'duration_s': args.duration,
+            'poll_interval_s': args.poll_interval,
+        },
+        'levels': levels,
+        'knee_concurrency': knee['concurrency'] if knee else None,
+        'peak_throughput_per_s': max((level['throughput_per_s'] for level in levels), default=0.0),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--concurrency', type=int, nargs='+', default=DEFAULT_CONCURRENCY)
+    parser.add_argument('--duration', type=float, default=30.0, help='Seconds per concurrency level')
+    parser.add_argument('--type', default='style_transfer', help='Transformation type to submit')
+    parser.add_argument('--megapixels', type=float, default=1.0, help='Size of the synthetic input')
+    parser.add_argument('--image', help='Input image path readable by the service, instead of a synthetic one')
+    parser.add_argument('--poll-interval', type=float, default=0.1, help='Seconds between status polls')
+    parser.add_argument('--timeout', type=float, default=300.0, help='Seconds before a transformation counts as timed out')
+    parser.add_argument('--knee-tolerance', type=float, default=0.1, help='Fraction below peak throughput that counts as saturated')
+    parser.add_argument('--url', help='Target a running service instead of spawning one')
+    parser.add_argument('--database-url', help='Postgres DSN to seed transformations into, with --url')
+    parser.add_argument('--sqlite', help='SQLite stand-in database (with --url, or for --serve)')
+    parser.add_argument('--json', help='Write results to this file')
+    parser.add_argument('--serve', action='store_true', help=argparse.SUPPRESS)
+    parser.add_argument('--port', type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        serve(args.port, args.sqlite)
+        return
+
+    if args.url and not (args.database_url or args.sqlite):
+        parser.error("--url needs --database-url or --sqlite to seed transformations")
+
+    logging.getLogger('httpx').setLevel(logging.WARNING)
+    report = asyncio.run(run(args))
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,169 @@
+"""
+Per-request overhead of the HTTP middleware stack
+
+Drives the ASGI app in-process (no server or sockets) with a trivial
+endpoint, so the difference between configurations is middleware cost.
+Also compares no-op BaseHTTPMiddleware layers with no-op pure ASGI layers.
+
+Usage:
+    python -m benchmarks.bench_middleware [--requests 5000] [--repeat 5] [--json out.json]
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import statistics
+import time
+from typing import Dict, Any, List, Callable
+
+from fastapi import FastAPI
+from starlette.middleware.base import BaseHTTPMiddleware
+
+from app.core.config import settings
+from app.core.logging import setup_logging
+from app.core.middleware import add_middleware
+
+NOOP_LAYERS = 3
+
+
+class NoopBaseHTTPMiddleware(BaseHTTPMiddleware):
+    """BaseHTTPMiddleware layer that only forwards the request"""
+
+    async def dispatch(self, request, call_next):
+        return await call_next(request)
+
+
+class NoopASGIMiddleware:
+    """Pure ASGI layer that only forwards the request"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        await self.app(scope, receive, send)
+
+
+def make_app(configure: Callable[[FastAPI], None]) -> FastAPI:
+    """Build an app with one trivial endpoint and the given middleware"""
+    app = FastAPI()
+
+    @app.get("/ping")
+    async def ping():
+        return {"ok": True}
+
+    configure(app)
+    return app
+
+
+def service_stack(app: FastAPI) -> None:
+    add_middleware(app)
+
+
+def noop_layers(middleware_class) -> Callable[[FastAPI], None]:
+    def configure(app: FastAPI) -> None:
+        for _ in range(NOOP_LAYERS):
+            app.add_middleware(middleware_class)
+    return configure
+
+
+CONFIGURATIONS = {
+    'bare': lambda app: None,
+    'service_stack': service_stack,
+    f'{NOOP_LAYERS}x_base_http_noop': noop_layers(NoopBaseHTTPMiddleware),
+    f'{NOOP_LAYERS}x_asgi_noop': noop_layers(NoopASGIMiddleware),
+}
+
+
+async def drive(app: FastAPI, requests: int) -> float:
+    """Send requests straight to the ASGI app, returning seconds per request"""
+    scope = {
+        'type': 'http',
+        'asgi': {'version': '3.0'},
+        'http_version': '1.1',
+        'method': 'GET',
+        'scheme': 'http',
+        'path': '/ping',
+        'raw_path': b'/ping',
+        'root_path': '',
+        'query_string': b'',
+        'headers': [(b'host', b'bench'), (b'user-agent', b'bench'), (b'accept-encoding', b'gzip')],
+        'client': ('127.0.0.1', 12345),
+        'server': ('bench', 80),
+    }
+
+    async def send(message):
+        if message['type'] == 'http.response.start' and message['status'] != 200:
+            raise RuntimeError(f"Unexpected status {message['status']}")
+
+    async def request() -> None:
+        received = False
+
+        async def receive():
+            nonlocal received
+            if not received:
+                received = True
+                return {'type': 'http.request', 'body': b'', 'more_body': False}
+            # Like a live connection, wait for a disconnect that never comes
+            await asyncio.Future()
+
+        await app(dict(scope), receive, send)
+
+    # Warm up routing and middleware stack construction
+    for _ in range(100):
+        await request()
+
+    start = time.perf_counter()
+    for _ in range(requests):
+        await request()
+    return (time.perf_counter() - start) / requests
+
+
+def run(requests: int, repeat: int) -> List[Dict[str, Any]]:
+    """Measure per-request time for each middleware configuration"""
+    rows = []
+    bare_us = None
+    for name, configure in CONFIGURATIONS.items():
+        timings = [
+            asyncio.run(drive(make_app(configure), requests)) * 1e6
+            for _ in range(repeat)
+        ]
+        median_us = statistics.median(timings)
+        if bare_us is None:
+            bare_us = median_us
+
+        rows.append({
+            'configuration': name,
+            'median_us': round(median_us, 1),
+            'min_us': round(min(timings), 1),
+            'overhead_us': round(median_us - bare_us, 1),
+        })
+        print(
+            f"{name:<22} median {rows[-1]['median_us']:>8.1f} us/request  "
+            f"overhead {rows[-1]['overhead_us']:>8.1f} us",
+            flush=True
+        )
+    return rows
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--requests', type=int, default=5000)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--json', help='Write results to this file')
+    args = parser.parse_args()
+
+    # Measure middleware work rather than log output, and never rate limit the driver
+    setup_logging()
+    logging.getLogger().setLevel(logging.WARNING)
+    settings.DEBUG = False
+    settings.RATE_LIMIT_CALLS = 10 ** 9
+
+    rows = run(args.requests, args.repeat)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(rows, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,201 @@
+"""
+Batched CPU inference: the torch path vs the ONNX Runtime backend
+
+Builds a fast style transfer style network (strided convolutions, residual
+blocks, upsampling) with random weights, exports it to ONNX and runs the
+same uint8 batches through torch_forward and onnx_forward, the callables
+the micro-batcher uses. Both get the same number of threads (--threads,
+by default ONNX_INTRA_OP_THREADS or CPU cores / MAX_CONCURRENT_JOBS).
+
+For each batch size it reports median latency per batch, images per second
+and the largest pixel difference from the torch output, for torch and for
+ONNX Runtime with graph optimizations disabled and fully enabled. It also
+reports session creation time and the first inference with and without the
+warm-up run done at load time. Needs torch, onnx and onnxruntime.
+
+Usage:
+    python -m benchmarks.bench_onnx [--batch-sizes 1 4 8] [--size 256] [--repeat 10]
+        [--threads N] [--json out.json]
+"""
+
+import argparse
+import json
+import os
+import statistics
+import tempfile
+import time
+import warnings
+from typing import Dict, Any, Callable, List
+
+import numpy as np
+
+from app.core.batching import torch_forward
+from app.core.config import settings
+from app.core.onnx_backend import load_session, onnx_forward, thread_counts, warm_up
+
+DEFAULT_BATCH_SIZES = [1, 4, 8]
+ONNX_VARIANTS = ('disabled', 'all')
+
+
+def build_network() -> Any:
+    """Image-to-image network taking and returning RGB NCHW in [0, 1]"""
+    import torch
+    from torch import nn
+
+    def conv(in_channels: int, out_channels: int, kernel: int, stride: int = 1) -> nn.Module:
+        return nn.Sequential(
+            nn.Conv2d(in_channels, out_channels, kernel, stride, padding=kernel // 2, padding_mode='reflect'),
+            nn.InstanceNorm2d(out_channels, affine=True),
+            nn.ReLU(inplace=True)
+        )
+
+    class Residual(nn.Module):
+        def __init__(self, channels: int):
+            super().__init__()
+            self.body = nn.Sequential(conv(channels, channels, 3), conv(channels, channels, 3))
+
+        def forward(self, x):
+            return x + self.body(x)
+
+    torch.manual_seed(0)
+    network = nn.Sequential(
+        conv(3, 16, 9),
+        conv(16, 32, 3, 2),
+        conv(32, 64, 3, 2),
+        *(Residual(64) for _ in range(3)),
+        nn.Upsample(scale_factor=2, mode='nearest'),
+        conv(64, 32, 3),
+        nn.Upsample(scale_factor=2, mode='nearest'),
+        conv(32, 16, 3),
+        nn.Conv2d(16, 3, 9, padding=4, padding_mode='reflect'),
+        nn.Sigmoid()
+    )
+    return network.eval()
+
+
+def export(network: Any, path: str, size: int) -> None:
+    """Export with dynamic batch, height and width, as a real model would be"""
+    import torch
+
+    sample = torch.rand(1, 3, size, size)
+    with warnings.catch_warnings():
+        # The exporter warns about details that do not affect this network
+        warnings.simplefilter('ignore')
+        torch.onnx.export(
+            network,
+            (sample,),
+            path,
+            input_names=['input'],
+            output_names=['output'],
+            dynamic_axes={name: {0: 'batch', 2: 'height', 3: 'width'} for name in ('input', 'output')},
+            opset_version=17,
+            dynamo=False
+        )
+
+
+def time_forward(forward: Callable[[np.ndarray], np.ndarray], batch: np.ndarray, repeat: int) -> List[float]:
+    forward(batch)
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        forward(batch)
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+def measure_startup(path: str, size: int) -> Dict[str, float]:
+    """Session creation time and first-inference latency, cold and after warm_up"""
+    batch = np.random.default_rng(1).integers(0, 256, (1, size, size, 3), dtype=np.uint8)
+
+    start = time.perf_counter()
+    session = load_session(path)
+    load_ms = (time.perf_counter() - start) * 1000
+    forward = onnx_forward(session)
+    start = time.perf_counter()
+    forward(batch)
+    cold_ms = (time.perf_counter() - start) * 1000
+
+    session = load_session(path)
+    forward = onnx_forward(session)
+    warmup_ms = warm_up(session, forward, (size, size))
+    start = time.perf_counter()
+    forward(batch)
+    warm_ms = (time.perf_counter() - start) * 1000
+
+    return {
+        'session_load_ms': round(load_ms, 1),
+        'warmup_ms': round(warmup_ms, 1),
+        'first_request_cold_ms': round(cold_ms, 1),
+        'first_request_warm_ms': round(warm_ms, 1),
+    }
+
+
+def run(batch_sizes: List[int], size: int, repeat: int, threads: int) -> Dict[str, Any]:
+    import torch
+
+    torch.set_num_threads(threads)
+    settings.ONNX_INTRA_OP_THREADS = threads
+    network = build_network()
+
+    with tempfile.TemporaryDirectory(prefix='morphflux-onnx-') as workdir:
+        path = os.path.join(workdir, 'network.onnx')
+        export(network, path, size)
+
+        forwards = {'torch': torch_forward(network, 'cpu')}
+        for level in ONNX_VARIANTS:
+            settings.ONNX_GRAPH_OPTIMIZATION = level
+            forwards[f'onnx_{level}'] = onnx_forward(load_session(path))
+        settings.ONNX_GRAPH_OPTIMIZATION = 'all'
+        startup = measure_startup(path, size)
+
+        rows = []
+        rng = np.random.default_rng(0)
+        for batch_size in batch_sizes:
+            batch = rng.integers(0, 256, (batch_size, size, size, 3), dtype=np.uint8)
+            reference = forwards['torch'](batch).astype(np.int16)
+            for name, forward in forwards.items():
+                median_s = statistics.median(time_forward(forward, batch, repeat))
+                difference = int(np.abs(forward(batch).astype(np.int16) - reference).max())
+                rows.append({
+                    'backend': name,
+                    'batch_size': batch_size,
+                    'median_ms': round(median_s * 1000, 2),
+                    'images_per_s': round(batch_size / median_s, 1),
+                    'max_pixel_difference': difference,
+                })
+                print(
+                    f"batch {batch_size:>3}  {name:<14} median {rows[-1]['median_ms']:>9.2f} ms  "
+                    f"{rows[-1]['images_per_s']:>8.1f} img/s  max diff {difference}",
+                    flush=True
+                )
+
+    print(
+        f"ONNX session load {startup['session_load_ms']:.1f} ms, warm-up {startup['warmup_ms']:.1f} ms; "
+        f"first request {startup['first_request_cold_ms']:.1f} ms cold, "
+        f"{startup['first_request_warm_ms']:.1f} ms after warm-up",
+        flush=True
+    )
+    return {'rows': rows, 'startup': startup}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--batch-sizes', type=int, nargs='+', default=DEFAULT_BATCH_SIZES)
+    parser.add_argument('--size', type=int, default=256, help='Image side in pixels')
+    parser.add_argument('--repeat', type=int, default=10)
+    parser.add_argument('--threads', type=int, default=thread_counts()[0], help='Threads for torch and ONNX Runtime')
+    parser.add_argument('--json', help='Write results to this file')
+    args = parser.parse_args()
+
+    results = run(args.batch_sizes, args.size, args.repeat, args.threads)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(
+                {'config': {'size': args.size, 'threads': args.threads, 'cpu_count': os.cpu_count()}, **results},
+                f,
+                indent=2
+            )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,263 @@
+"""
+Memory per worker: independent workers vs the serve.py pre-fork launcher
+
+Runs --workers service processes on the SQLite stand-in in two modes:
+independent, one fresh interpreter per worker that loads its own models
+(as uvicorn --workers or several main.py processes do), and prefork,
+serve.py loading the models once and forking the workers. A synthetic
+model of --weights-mb random float32 weights, returned by the
+style_transfer loader, stands in for real weights and is prewarmed.
+
+After --requests in-memory style transfers per worker, each process's RSS,
+PSS and USS (private pages) are read from /proc/<pid>/smaps_rollup. PSS
+divides shared pages between the processes mapping them, so summed PSS is
+a mode's real footprint; USS is what one more worker costs. CPU executor
+processes are reported separately. Linux only.
+
+Usage:
+    python -m benchmarks.bench_prefork [--workers 4] [--weights-mb 256] [--requests 4]
+        [--executor-workers 1] [--json out.json]
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict, Any, List
+
+import cv2
+import httpx
+import numpy as np
+
+from benchmarks.bench_load import SERVER_ENV, free_port
+from benchmarks.synthetic import make_portrait_image
+
+MODES = ('independent', 'prefork')
+SMAPS_FIELDS = ('Rss', 'Pss', 'Private_Clean', 'Private_Dirty')
+
+
+def install_synthetic_weights(megabytes: int) -> None:
+    """Make the style_transfer loader return megabytes of random weights"""
+    from app.core.models import ModelManager
+
+    async def load_weights(self):
+        weights = np.random.default_rng(0).random(megabytes * 2 ** 20 // 4, dtype=np.float32)
+        return {'type': 'synthetic', 'weights': weights, 'device': 'cpu'}, weights.nbytes
+
+    ModelManager._load_style_transfer_model = load_weights
+
+
+def serve(mode: str, port: int, sqlite_path: str, weights_mb: int, workers: int) -> None:
+    """Run one independent worker, or the pre-fork launcher with its workers"""
+    import uvicorn
+    from benchmarks.sqlite_db import install
+
+    install(sqlite_path)
+    install_synthetic_weights(weights_mb)
+    if mode == 'prefork':
+        import serve as prefork
+
+        prefork.serve(workers, '127.0.0.1', port)
+    else:
+        import main
+
+        uvicorn.run(main.app, host='127.0.0.1', port=port, workers=1, log_level='warning', access_log=False)
+
+
+def start(mode: str, port: int, args: argparse.Namespace, workdir: str, workers: int) -> subprocess.Popen:
+    env = {
+        **os.environ,
+        **SERVER_ENV,
+        'OUTPUT_DIR': os.path.join(workdir, 'outputs'),
+        'MODEL_PREWARM': '["style_transfer", "face_detection"]',
+        'MODEL_IDLE_TIMEOUT': '0',
+        'MAX_CONCURRENT_JOBS': str(args.executor_workers),
+    }
+    return subprocess.Popen(
+        [
+            sys.executable, '-m', 'benchmarks.bench_prefork', '--serve', mode, '--port', str(port),
+            '--sqlite', os.path.join(workdir, f'service-{port}.db'),
+            '--weights-mb', str(args.weights_mb), '--workers', str(workers)
+        ],
+        env=env
+    )
+
+
+def children_by_parent() -> Dict[int, List[int]]:
+    """Map each pid to its child pids, from /proc"""
+    children: Dict[int, List[int]] = {}
+    for entry in os.listdir('/proc'):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f'/proc/{entry}/stat') as f:
+                stat = f.read()
+        except OSError:
+            continue
+        # Fields after the parenthesized command: state, ppid, ...
+        ppid = int(stat.rsplit(')', 1)[1].split()[1])
+        children.setdefault(ppid, []).append(int(entry))
+    return children
+
+
+def descendants(pid: int, children: Dict[int, List[int]]) -> List[int]:
+    found = []
+    for child in children.get(pid, []):
+        found.append(child)
+        found.extend(descendants(child, children))
+    return found
+
+
+def memory(pid: int) -> Dict[str, float]:
+    """RSS, PSS and USS of a process in MB"""
+    values = {}
+    with open(f'/proc/{pid}/smaps_rollup') as f:
+        for line in f:
+            name, _, rest = line.partition(':')
+            if name in SMAPS_FIELDS:
+                values[name] = int(rest.split()[0]) / 1024
+    return {
+        'rss_mb': round(values['Rss'], 1),
+        'pss_mb': round(values['Pss'], 1),
+        'uss_mb': round(values['Private_Clean'] + values['Private_Dirty'], 1),
+    }
+
+
+async def wait_ready(urls: List[str], processes: List[subprocess.Popen], timeout: float = 180.0) -> None:
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient() as client:
+        for url in urls:
+            while True:
+                if any(process.poll() is not None for process in processes):
+                    raise RuntimeError("Service exited during startup")
+                if time.monotonic() > deadline:
+                    raise RuntimeError("Service did not start in time")
+                try:
+                    if (await client.get(url + '/')).status_code == 200:
+                        break
+                except httpx.HTTPError:
+                    pass
+                await asyncio.sleep(0.5)
+
+
+async def send_requests(urls: List[str], image: bytes, count: int) -> None:
+    """Run count in-memory style transfers against each URL, or count per worker behind one URL"""
+    async with httpx.AsyncClient(timeout=120) as client:
+        async def transform(url: str) -> None:
+            response = await client.post(
+                url + '/api/v1/transformations/process/upload',
+                files={'file': ('input.jpg', image, 'image/jpeg')},
+                data={'transformation_type': 'style_transfer'}
+            )
+            response.raise_for_status()
+
+        await asyncio.gather(*(transform(url) for url in urls for _ in range(count)))
+
+
+def summarize(workers: List[Dict[str, float]], others: List[Dict[str, float]], executors: List[Dict[str, float]]) -> Dict[str, Any]:
+    def mean(rows: List[Dict[str, float]], key: str) -> float:
+        return round(sum(row[key] for row in rows) / len(rows), 1) if rows else 0.0
+
+    return {
+        'workers': len(workers),
+        'worker_rss_mb': mean(workers, 'rss_mb'),
+        'worker_pss_mb': mean(workers, 'pss_mb'),
+        'worker_uss_mb': mean(workers, 'uss_mb'),
+        'parent_pss_mb': round(sum(row['pss_mb'] for row in others), 1),
+        'executor_processes': len(executors),
+        'executor_pss_mb': round(sum(row['pss_mb'] for row in executors), 1),
+        'total_pss_mb': round(sum(row['pss_mb'] for row in workers + others), 1),
+    }
+
+
+async def measure(mode: str, args: argparse.Namespace, image: bytes) -> Dict[str, Any]:
+    workdir = tempfile.mkdtemp(prefix='morphflux-prefork-')
+    processes = []
+    try:
+        if mode == 'prefork':
+            ports = [free_port()]
+            processes.append(start(mode, ports[0], args, workdir, args.workers))
+        else:
+            ports = [free_port() for _ in range(args.workers)]
+            processes.extend(start(mode, port, args, workdir, 1) for port in ports)
+        urls = [f'http://127.0.0.1:{port}' for port in ports]
+        await wait_ready(urls, processes)
+
+        if mode == 'prefork':
+            # The first worker answering does not mean every worker finished its lifespan
+            while len(children_by_parent().get(processes[0].pid, [])) < args.workers:
+                await asyncio.sleep(0.5)
+            await asyncio.sleep(5.0)
+            await send_requests(urls, image, args.requests * args.workers)
+        else:
+            await send_requests(urls, image, args.requests)
+
+        children = children_by_parent()
+        if mode == 'prefork':
+            parents = [processes[0].pid]
+            worker_pids = children.get(processes[0].pid, [])
+        else:
+            parents = []
+            worker_pids = [process.pid for process in processes]
+        executor_pids = [pid for worker in worker_pids for pid in descendants(worker, children)]
+
+        return summarize(
+            [memory(pid) for pid in worker_pids],
+            [memory(pid) for pid in parents],
+            [memory(pid) for pid in executor_pids]
+        )
+    finally:
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            process.wait()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--weights-mb', type=int, default=256, help='Size of the synthetic model weights')
+    parser.add_argument('--requests', type=int, default=4, help='Transformations per worker before measuring')
+    parser.add_argument('--executor-workers', type=int, default=1, help='MAX_CONCURRENT_JOBS per worker')
+    parser.add_argument('--modes', nargs='+', choices=MODES, default=list(MODES))
+    parser.add_argument('--json', help='Write results to this file')
+    parser.add_argument('--serve', choices=MODES, help=argparse.SUPPRESS)
+    parser.add_argument('--port', type=int, help=argparse.SUPPRESS)
+    parser.add_argument('--sqlite', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        serve(args.serve, args.port, args.sqlite, args.weights_mb, args.workers)
+        return
+
+    if not os.path.exists('/proc/self/smaps_rollup'):
+        parser.error("Memory is read from /proc/<pid>/smaps_rollup, which needs Linux 4.14 or later")
+
+    portrait, _ = make_portrait_image(1.0)
+    image = cv2.imencode('.jpg', portrait)[1].tobytes()
+
+    results = {}
+    for mode in args.modes:
+        result = asyncio.run(measure(mode, args, image))
+        results[mode] = result
+        print(
+            f"{mode:<12} {result['workers']} workers  per worker: RSS {result['worker_rss_mb']:>7.1f} MB  "
+            f"PSS {result['worker_pss_mb']:>7.1f} MB  USS {result['worker_uss_mb']:>7.1f} MB  "
+            f"total PSS {result['total_pss_mb']:>8.1f} MB  "
+            f"(+{result['executor_processes']} executor processes, {result['executor_pss_mb']:.1f} MB)",
+            flush=True
+        )
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'config': {'workers': args.workers, 'weights_mb': args.weights_mb}, 'modes': results}, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
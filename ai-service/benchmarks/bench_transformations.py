@@ -0,0 +1,272 @@
+"""
+End-to-end transformation latency, throughput and memory by image size
+
+Runs every transformation type through ModelManager.process_bytes (decode,
+face detection, kernel in the CPU executor, encode) on synthetic portraits
+with a foreground object and detectable faces. For each type and size it
+reports p50/p95 latency of sequential requests, throughput per core with
+the executor saturated, and the peak RSS of the process and its workers.
+
+Results are written as JSON with the commit and machine they were measured
+on; --compare prints the change against an earlier run and exits non-zero
+if any case regressed by more than --threshold.
+
+Usage:
+    python -m benchmarks.bench_transformations [--sizes 0.3 1 4 12 24] [--types ...] [--repeat 5]
+        [--workers 4] [--json out.json] [--compare baseline.json] [--threshold 0.1]
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import platform
+import resource
+import subprocess
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Dict, Any, List, Optional, Tuple
+
+import cv2
+import numpy as np
+
+from app.core.config import settings
+from app.core.logging import setup_logging
+from benchmarks.synthetic import make_portrait_image
+
+DEFAULT_SIZES = [0.3, 1, 2, 4, 8, 12, 24]
+DEFAULT_TYPES = ['background_removal', 'style_transfer', 'age_progression', 'face_enhancement']
+
+# Latency is compared on these keys; lower is better
+COMPARED_METRICS = ['p50_s', 'p95_s']
+
+
+class PeakRSS:
+    """Samples the summed RSS of this process and its descendants in a thread
+
+    Reads /proc, so it covers the executor's worker processes on Linux.
+    Elsewhere it falls back to this process's lifetime high-water mark.
+    """
+
+    def __init__(self, interval: float = 0.01):
+        self.interval = interval
+        self.peak_bytes = 0
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._page_size = os.sysconf('SC_PAGE_SIZE') if hasattr(os, 'sysconf') else 4096
+
+    @staticmethod
+    def _children(pid: int) -> List[int]:
+        children = []
+        try:
+            for task in os.listdir(f'/proc/{pid}/task'):
+                with open(f'/proc/{pid}/task/{task}/children') as f:
+                    children.extend(int(child) for child in f.read().split())
+        except OSError:
+            pass
+        return children
+
+    def _tree_rss(self) -> int:
+        total = 0
+        pending = [os.getpid()]
+        while pending:
+            pid = pending.pop()
+            try:
+                with open(f'/proc/{pid}/statm') as f:
+                    total += int(f.read().split()[1]) * self._page_size
+            except OSError:
+                continue
+            pending.extend(self._children(pid))
+        return total
+
+    def _sample(self) -> None:
+        while not self._stop.is_set():
+            self.peak_bytes = max(self.peak_bytes, self._tree_rss())
+            self._stop.wait(self.interval)
+
+    def __enter__(self) -> 'PeakRSS':
+        if os.path.exists('/proc/self/statm'):
+            self._thread = threading.Thread(target=self._sample, name='rss-sampler', daemon=True)
+            self._thread.start()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join()
+        else:
+            # ru_maxrss is in KiB on Linux and bytes on macOS
+            maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+            self.peak_bytes = maxrss if sys.platform == 'darwin' else maxrss * 1024
+
+
+def environment(workers: int) -> Dict[str, Any]:
+    """Describe what the results were measured on"""
+    try:
+        commit = subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+
+    return {
+        'commit': commit,
+        'timestamp': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'opencv': cv2.__version__,
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'workers': workers,
+    }
+
+
+def encode_portrait(megapixels: float) -> Tuple[bytes, Tuple[int, int]]:
+    """JPEG-encoded synthetic portrait and its (width, height)"""
+    image, _ = make_portrait_image(megapixels)
+    ok, encoded = cv2.imencode('.jpg', image, [cv2.IMWRITE_JPEG_QUALITY, 95])
+    if not ok:
+        raise RuntimeError(f"Failed to encode {megapixels} MP benchmark image")
+    return encoded.tobytes(), (image.shape[1], image.shape[0])
+
+
+async def bench_case(
+    model_manager,
+    image_bytes: bytes,
+    transformation_type: str,
+    repeat: int,
+    rounds: int
+) -> Dict[str, Any]:
+    """Measure one transformation on one image"""
+    workers = model_manager.executor.max_workers
+
+    async def transform() -> None:
+        await model_manager.process_bytes(image_bytes, transformation_type, {})
+
+    with PeakRSS() as rss:
+        # Warm up worker processes, the face cascade and allocator pools
+        await transform()
+
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            await transform()
+            timings.append(time.perf_counter() - start)
+
+        # Keep every worker busy to measure throughput
+        requests = workers * rounds
+        start = time.perf_counter()
+        await asyncio.gather(*(transform() for _ in range(requests)))
+        elapsed = time.perf_counter() - start
+
+    cores = min(workers, os.cpu_count() or 1)
+    throughput = requests / elapsed
+    return {
+        'p50_s': round(float(np.percentile(timings, 50)), 4),
+        'p95_s': round(float(np.percentile(timings, 95)), 4),
+        'min_s': round(min(timings), 4),
+        'throughput_per_s': round(throughput, 3),
+        'throughput_per_core_per_s': round(throughput / cores, 3),
+        'peak_rss_mb': round(rss.peak_bytes / 2 ** 20, 1),
+    }
+
+
+async def run(sizes: List[float], types: List[str], repeat: int, rounds: int) -> List[Dict[str, Any]]:
+    """Measure every transformation type at every size"""
+    from app.core.models import ModelManager
+
+    model_manager = ModelManager()
+    # process_bytes never reads or writes the result cache
+    model_manager.result_cache = None
+    await model_manager.load_models()
+
+    rows = []
+    try:
+        for megapixels in sizes:
+            image_bytes, (width, height) = encode_portrait(megapixels)
+            for transformation_type in types:
+                row = {
+                    'transformation_type': transformation_type,
+                    'megapixels': megapixels,
+                    'width': width,
+                    'height': height,
+                    **await bench_case(model_manager, image_bytes, transformation_type, repeat, rounds)
+                }
+                rows.append(row)
+                print(
+                    f"{megapixels:>6.1f} MP  {transformation_type:<20} "
+                    f"p50 {row['p50_s']:>8.3f}s  p95 {row['p95_s']:>8.3f}s  "
+                    f"{row['throughput_per_core_per_s']:>7.3f}/s/core  "
+                    f"peak RSS {row['peak_rss_mb']:>8.1f} MB",
+                    flush=True
+                )
+    finally:
+        await model_manager.shutdown()
+    return rows
+
+
+def compare(baseline: Dict[str, Any], current: Dict[str, Any], threshold: float) -> List[str]:
+    """Print latency changes against a baseline run and return the regressed cases"""
+    baseline_rows = {
+        (row['transformation_type'], row['megapixels']): row for row in baseline['results']
+    }
+    print(
+        f"\nCompared with {baseline['environment'].get('commit') or 'baseline'} "
+        f"(regression threshold {threshold:.0%})"
+    )
+
+    regressions = []
+    for row in current['results']:
+        case = (row['transformation_type'], row['megapixels'])
+        before = baseline_rows.get(case)
+        if before is None:
+            continue
+
+        changes = []
+        for metric in COMPARED_METRICS:
+            change = row[metric] / before[metric] - 1 if before[metric] else 0.0
+            changes.append(f"{metric} {before[metric]:.3f}s -> {row[metric]:.3f}s ({change:+.1%})")
+            if change > threshold:
+                regressions.append(f"{case[0]} @ {case[1]} MP {metric} {change:+.1%}")
+        print(f"{case[1]:>6.1f} MP  {case[0]:<20} " + "  ".join(changes))
+
+    if regressions:
+        print("\nRegressions:\n  " + "\n  ".join(regressions))
+    return regressions
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=float, nargs='+', default=DEFAULT_SIZES, help='Megapixels')
+    parser.add_argument('--types', nargs='+', default=DEFAULT_TYPES, choices=DEFAULT_TYPES)
+    parser.add_argument('--repeat', type=int, default=5, help='Sequential requests per case')
+    parser.add_argument('--rounds', type=int, default=2, help='Concurrent requests per worker for throughput')
+    parser.add_argument('--workers', type=int, default=settings.MAX_CONCURRENT_JOBS)
+    parser.add_argument('--json', help='Write results to this file')
+    parser.add_argument('--compare', help='Earlier --json output to compare against')
+    parser.add_argument('--threshold', type=float, default=0.1, help='Relative slowdown counted as a regression')
+    args = parser.parse_args()
+
+    setup_logging()
+    logging.getLogger().setLevel(logging.WARNING)
+    settings.MAX_CONCURRENT_JOBS = args.workers
+
+    report = {
+        'environment': environment(args.workers),
+        'results': asyncio.run(run(args.sizes, args.types, args.repeat, args.rounds)),
+    }
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=2)
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        if compare(baseline, report, args.threshold):
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,248 @@
+"""
+SQLite stand-in for DatabaseManager
+Runs the service without Postgres for load tests. The load generator seeds
+transformation rows into the same database file, as the backend API would.
+"""
+
+import asyncio
+import json
+import sqlite3
+import threading
+import uuid
+from typing import Dict, Any, List, Optional
+from app.core.status_cache import invalidate_transformations
+
+# The columns of the backend's transformations and images tables that the service reads or writes
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS images (
+    id TEXT PRIMARY KEY,
+    user_id TEXT,
+    original_filename TEXT NOT NULL,
+    stored_filename TEXT NOT NULL,
+    file_path TEXT NOT NULL,
+    s3_key TEXT,
+    s3_bucket TEXT,
+    mime_type TEXT NOT NULL,
+    file_size INTEGER NOT NULL,
+    width INTEGER,
+    height INTEGER,
+    metadata TEXT,
+    created_at TEXT DEFAULT CURRENT_TIMESTAMP
+);
+CREATE TABLE IF NOT EXISTS transformations (
+    id TEXT PRIMARY KEY,
+    user_id TEXT,
+    input_image_id TEXT,
+    output_image_id TEXT,
+    type TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    parameters TEXT NOT NULL,
+    result_metadata TEXT,
+    error_message TEXT,
+    processing_time_ms INTEGER,
+    started_at TEXT,
+    completed_at TEXT,
+    created_at TEXT DEFAULT CURRENT_TIMESTAMP
+);
+"""
+
+GET_TRANSFORMATION_QUERY = """
+    SELECT t.*,
+           i1.original_filename AS input_filename,
+           i1.s3_key AS input_s3_key,
+           i2.original_filename AS output_filename,
+           i2.s3_key AS output_s3_key
+    FROM transformations t
+    LEFT JOIN images i1 ON t.input_image_id = i1.id
+    LEFT JOIN images i2 ON t.output_image_id = i2.id
+    WHERE t.id = ?
+"""
+
+
+class SQLiteDatabase:
+    """One SQLite file in WAL mode, shared by the service and the load generator"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+
+    def connect(self) -> None:
+        """Open the database and create the tables"""
+        if self._conn is not None:
+            return
+        self._conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("PRAGMA busy_timeout=5000")
+        self._conn.executescript(SCHEMA)
+
+    def close(self) -> None:
+        """Close the database"""
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    def _execute(self, statements: List[tuple]) -> List[sqlite3.Row]:
+        """Run statements in one transaction, returning the last statement's rows"""
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                rows = []
+                for sql, args in statements:
+                    rows = self._conn.execute(sql, args).fetchall()
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+        return rows
+
+    async def run(self, *statements: tuple) -> List[sqlite3.Row]:
+        return await asyncio.to_thread(self._execute, list(statements))
+
+    async def create_transformation(
+        self, transformation_id: str, transformation_type: str, parameters: Dict[str, Any]
+    ) -> None:
+        """Insert a pending transformation, as the backend does before calling the service"""
+        await self.run((
+            "INSERT INTO transformations (id, type, parameters) VALUES (?, ?, ?)",
+            (transformation_id, transformation_type, json.dumps(parameters))
+        ))
+
+    # DatabaseManager interface; get_transformation reads through the status cache as usual
+
+    async def fetch_transformation(self, transformation_id: str) -> dict:
+        rows = await self.run((GET_TRANSFORMATION_QUERY, (transformation_id,)))
+        return dict(rows[0]) if rows else None
+
+    async def update_transformation_status(
+        self,
+        transformation_id: str,
+        status: str,
+        output_image_id: str = None,
+        error_message: str = None,
+        processing_time_ms: int = None
+    ) -> None:
+        if output_image_id:
+            statement = (
+                "UPDATE transformations SET status = ?, output_image_id = ?, processing_time_ms = ?, "
+                "completed_at = CURRENT_TIMESTAMP WHERE id = ?",
+                (status, output_image_id, processing_time_ms, transformation_id)
+            )
+        elif error_message:
+            statement = (
+                "UPDATE transformations SET status = ?, error_message = ?, "
+                "completed_at = CURRENT_TIMESTAMP WHERE id = ?",
+                (status, error_message, transformation_id)
+            )
+        else:
+            statement = (
+                "UPDATE transformations SET status = ?, started_at = CASE WHEN ? = 'processing' "
+                "THEN CURRENT_TIMESTAMP ELSE started_at END WHERE id = ?",
+                (status, status, transformation_id)
+            )
+        await self.run(statement)
+        await invalidate_transformations([transformation_id])
+
+    @staticmethod
+    def _insert_image(image_id: str, user_id: Optional[str], output: Dict[str, Any], s3_bucket: str) -> tuple:
+        return (
+            "INSERT INTO images (id, user_id, original_filename, stored_filename, file_path, s3_key, "
+            "s3_bucket, mime_type, file_size, width, height, metadata) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (
+                image_id, user_id, output['original_filename'], output['s3_key'].split('/')[-1],
+                f"s3://{s3_bucket}/{output['s3_key']}", output['s3_key'], s3_bucket,
+                output.get('mime_type', 'image/jpeg'), output['file_size'],
+                output.get('width'), output.get('height'),
+                json.dumps(output.get('metadata'), default=str)
+            )
+        )
+
+    async def create_output_image(
+        self,
+        user_id: str,
+        original_filename: str,
+        s3_key: str,
+        s3_bucket: str,
+        mime_type: str,
+        file_size: int,
+        width: int = None,
+        height: int = None,
+        metadata: dict = None
+    ) -> str:
+        image_id = str(uuid.uuid4())
+        await self.run(self._insert_image(image_id, user_id, {
+            'original_filename': original_filename,
+            's3_key': s3_key,
+            'mime_type': mime_type,
+            'file_size': file_size,
+            'width': width,
+            'height': height,
+            'metadata': metadata
+        }, s3_bucket))
+        return image_id
+
+    async def start_transformations(self, transformation_ids: List[str]) -> None:
+        await self.run(*(
+            (
+                "UPDATE transformations SET status = 'processing', started_at = CURRENT_TIMESTAMP WHERE id = ?",
+                (transformation_id,)
+            )
+            for transformation_id in transformation_ids
+        ))
+        await invalidate_transformations(transformation_ids)
+
+    async def finish_transformations(self, results: List[Dict[str, Any]], s3_bucket: str) -> Dict[str, str]:
+        statements = []
+        output_image_ids = {}
+        for result in results:
+            output = result.get('output')
+            output_image_id = None
+            if output:
+                output_image_id = output_image_ids[result['transformation_id']] = str(uuid.uuid4())
+                statements.append(self._insert_image(output_image_id, None, output, s3_bucket))
+            statements.append((
+                "UPDATE transformations SET status = ?, output_image_id = ?, error_message = ?, "
+                "processing_time_ms = ?, completed_at = CURRENT_TIMESTAMP WHERE id = ?",
+                (
+                    'completed' if output else 'failed', output_image_id, result.get('error_message'),
+                    result.get('processing_time_ms'), result['transformation_id']
+                )
+            ))
+        await self.run(*statements)
+        await invalidate_transformations(result['transformation_id'] for result in results)
+        return output_image_ids
+
+
+def install(path: str) -> SQLiteDatabase:
+    """Route DatabaseManager and the lifespan's database setup to a SQLite file
+
+    Must run before main is imported, since main binds init_db, init_pool
+    and close_pool at import time.
+    """
+    from app.core import database
+
+    db = SQLiteDatabase(path)
+    db.connect()
+
+    for name in (
+        'fetch_transformation', 'update_transformation_status', 'create_output_image',
+        'start_transformations', 'finish_transformations'
+    ):
+        setattr(database.DatabaseManager, name, staticmethod(getattr(db, name)))
+
+    async def init_db() -> None:
+        pass
+
+    async def init_pool() -> None:
+        pass
+
+    async def close_pool() -> None:
+        await asyncio.to_thread(db.close)
+
+    database.init_db = init_db
+    database.init_pool = init_pool
+    database.close_pool = close_pool
+    return db
@@ -0,0 +1,77 @@
+"""
+Synthetic benchmark images
+Deterministic test images with a textured background, a distinct foreground
+and optionally drawn faces that the Haar cascade detects
+"""
+
+import math
+from typing import List, Tuple
+import cv2
+import numpy as np
+
+
+def dimensions_for_megapixels(megapixels: float, aspect: float = 4 / 3) -> Tuple[int, int]:
+    """Get (width, height) for a target megapixel count"""
+    height = int(round(math.sqrt(megapixels * 1_000_000 / aspect)))
+    width = int(round(height * aspect))
+    return width, height
+
+
+def make_foreground_image(megapixels: float, seed: int = 0) -> np.ndarray:
+    """BGR image with a noisy gradient background and an elliptical foreground object"""
+    width, height = dimensions_for_megapixels(megapixels)
+    rng = np.random.default_rng(seed)
+
+    # Background: horizontal gradient plus low-amplitude noise
+    gradient = np.linspace(60, 160, width, dtype=np.float32)
+    image = np.empty((height, width, 3), np.uint8)
+    image[:, :, 0] = gradient.astype(np.uint8)
+    image[:, :, 1] = (gradient * 0.8).astype(np.uint8)
+    image[:, :, 2] = 90
+    noise = rng.integers(0, 20, (height, width, 3), dtype=np.uint8)
+    cv2.add(image, noise, dst=image)
+
+    # Foreground: warm ellipse with its own texture, inside the GrabCut rectangle
+    center = (width // 2, height // 2)
+    axes = (int(width * 0.25), int(height * 0.32))
+    cv2.ellipse(image, center, axes, 0, 0, 360, (40, 110, 220), -1)
+    cv2.ellipse(image, center, (axes[0] // 2, axes[1] // 3), 30, 0, 360, (30, 60, 180), -1)
+    return image
+
+
+def draw_face(image: np.ndarray, center: Tuple[int, int], size: int) -> None:
+    """Draw a frontal cartoon face about size pixels wide, centered at center"""
+    cx, cy = center
+
+    def scaled(value: float) -> int:
+        return max(1, int(size * value))
+
+    cv2.ellipse(image, center, (scaled(0.42), scaled(0.55)), 0, 0, 360, (150, 180, 225), -1)
+    for side in (-1, 1):
+        ex, ey = cx + side * scaled(0.18), cy - scaled(0.1)
+        cv2.ellipse(image, (ex, ey - scaled(0.1)), (scaled(0.11), scaled(0.025)), 0, 0, 360, (40, 50, 70), -1)
+        cv2.ellipse(image, (ex, ey), (scaled(0.09), scaled(0.045)), 0, 0, 360, (245, 245, 245), -1)
+        cv2.circle(image, (ex, ey), scaled(0.04), (30, 30, 40), -1)
+    cv2.ellipse(image, (cx, cy + scaled(0.08)), (scaled(0.04), scaled(0.1)), 0, 0, 360, (120, 150, 200), -1)
+    cv2.ellipse(image, (cx, cy + scaled(0.27)), (scaled(0.15), scaled(0.04)), 0, 0, 360, (60, 60, 150), -1)
+
+
+def make_portrait_image(megapixels: float, faces: int = 2, seed: int = 0) -> Tuple[np.ndarray, List[Tuple[int, int, int, int]]]:
+    """Foreground image with faces side by side inside the foreground object
+
+    Returns the image and the drawn face boxes as (x, y, w, h).
+    """
+    image = make_foreground_image(megapixels, seed)
+    height, width = image.shape[:2]
+    size = int(min(height * 0.22, width * 0.4 / max(1, faces)))
+
+    boxes = []
+    for i in range(faces):
+        center = (int(width * (0.5 + (i - (faces - 1) / 2) * 0.45 / max(1, faces))), int(height * 0.45))
+        draw_face(image, center, size)
+        boxes.append((center[0] - size // 2, center[1] - int(size * 0.55), size, int(size * 1.1)))
+
+    # Soften the drawn edges like a camera would, so the cascade sees gradients
+    sigma = size / 100 + 0.5
+    cv2.GaussianBlur(image, (0, 0), sigma, dst=image)
+    return image, boxes
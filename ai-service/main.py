@@ -6,6 +6,7 @@ FastAPI-based service for AI-powered image transformations
 import os
 import logging
 import asyncio
+from functools import partial
 from contextlib import asynccontextmanager
 from typing import Dict, Any, Optional
 import uvicorn
@@ -16,11 +17,17 @@ from fastapi.responses import JSONResponse
 import structlog
 
 from app.core.config import settings
-from app.core.database import init_db
+from app.core.database import init_db, init_pool, close_pool, start_status_writer, stop_status_writer
 from app.core.logging import setup_logging
 from app.api.v1.api import api_router
 from app.core.exceptions import MorphFluxException
 from app.core.middleware import add_middleware
+from app.core.queue import create_job_queue
+from app.core.events import create_event_broker
+from app.core.status_cache import init_status_cache, close_status_cache
+from app.core.storage import create_uploader
+from app.core.metrics import MetricsServer
+from app.core.worker import WorkerPool
 
 # Setup structured logging
 setup_logging()
@@ -35,6 +42,9 @@ async def lifespan(app: FastAPI):
     
     # Initialize database
     await init_db()
+    await init_pool()
+    await init_status_cache()
+    await start_status_writer()
     logger.info("Database initialized")
     
     # Load AI models
@@ -44,10 +54,61 @@ async def lifespan(app: FastAPI):
     app.state.model_manager = model_manager
     logger.info("AI models loaded")
     
+    # Start output uploader
+    uploader = create_uploader()
+    if uploader is not None:
+        await uploader.start()
+    app.state.uploader = uploader
+    
+    # Start progress event broker
+    event_broker = create_event_broker()
+    await event_broker.connect()
+    app.state.event_broker = event_broker
+    
+    # Start job queue and workers
+    from app.api.v1.endpoints.transformations import run_transformation_job, fail_dead_job
+    job_queue = create_job_queue()
+    await job_queue.connect()
+    worker_pool = WorkerPool(
+        job_queue,
+        partial(
+            run_transformation_job,
+            model_manager=model_manager,
+            uploader=uploader,
+            events=event_broker
+        ),
+        concurrency=settings.MAX_CONCURRENT_JOBS,
+        dead_letter=partial(fail_dead_job, events=event_broker)
+    )
+    await worker_pool.start()
+    app.state.job_queue = job_queue
+    app.state.worker_pool = worker_pool
+    logger.info("Job workers started")
+    
+    # Serve Prometheus metrics on their own port
+    metrics_server = None
+    if settings.ENABLE_METRICS:
+        metrics_server = MetricsServer(app.state)
+        await metrics_server.start()
+    
     yield
     
     # Shutdown
     logger.info("Shutting down MorphFlux AI Service")
+    if metrics_server is not None:
+        await metrics_server.stop()
+    await worker_pool.stop()
+    await job_queue.close()
+    await event_broker.close()
+    if uploader is not None:
+        await uploader.close()
+    await model_manager.shutdown()
+    rate_limiter = getattr(app.state, "rate_limiter", None)
+    if rate_limiter is not None:
+        await rate_limiter.close()
+    await stop_status_writer()
+    await close_status_cache()
+    await close_pool()
 
 
 # Create FastAPI application
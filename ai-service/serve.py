@@ -0,0 +1,210 @@
+"""
+Pre-fork launcher for MorphFlux AI Service
+Loads MODEL_PREWARM once, then forks workers that share the loaded models copy-on-write
+and accept connections on one listening socket
+
+Usage:
+    python serve.py [--workers 4] [--host 0.0.0.0] [--port 8001]
+"""
+
+import argparse
+import asyncio
+import gc
+import os
+import signal
+import socket
+import sys
+import time
+from typing import Dict, Any, List, Tuple
+import uvicorn
+import structlog
+
+from app.core.config import settings
+
+logger = structlog.get_logger(__name__)
+
+# Backends whose memory implementation keeps separate state in every worker, and whether each is in use
+PER_WORKER_BACKENDS = {
+    'RATE_LIMIT_BACKEND': lambda: settings.RATE_LIMIT_ENABLED and not settings.DEBUG,
+    'EVENTS_BACKEND': lambda: True,
+    'STATUS_CACHE_BACKEND': lambda: settings.STATUS_CACHE_ENABLED,
+}
+
+# Seconds to wait before replacing a worker that exited on its own, doubled
+# for each consecutive startup failure up to MAX_RESTART_DELAY
+RESTART_DELAY = 1.0
+MAX_RESTART_DELAY = 60.0
+
+# A worker exiting within STARTUP_GRACE seconds of being forked failed to start;
+# a slot is given up after MAX_STARTUP_FAILURES of those in a row
+STARTUP_GRACE = 10.0
+MAX_STARTUP_FAILURES = 5
+
+# Exit code of a worker whose lifespan startup failed
+STARTUP_FAILED = 3
+
+
+async def preload_models(names: List[str]) -> Dict[str, Tuple[Any, int]]:
+    """Load models in the parent, returning each with its size in bytes"""
+    from app.core.models import ModelManager
+
+    manager = ModelManager()
+    await manager.registry.prewarm(names)
+    return manager.registry.loaded_models()
+
+
+def bind_socket(host: str, port: int) -> socket.socket:
+    """Create the listening socket every worker accepts on"""
+    family = socket.AF_INET6 if ':' in host else socket.AF_INET
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(2048)
+    sock.set_inheritable(True)
+    return sock
+
+
+def run_worker(app, sock: socket.socket, slot: int) -> int:
+    """Serve the app on an inherited socket, returning the exit code; runs in a forked child"""
+    # Own process group, so a terminal's Ctrl-C reaches only the parent, which stops workers once
+    os.setpgid(0, 0)
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+
+    # Each worker exports its own metrics, on METRICS_PORT + slot
+    settings.METRICS_PORT += slot
+
+    config = uvicorn.Config(
+        app,
+        log_level="info" if not settings.DEBUG else "debug",
+        lifespan="on"
+    )
+    server = uvicorn.Server(config)
+    server.run(sockets=[sock])
+    return 0 if server.started else STARTUP_FAILED
+
+
+def serve(workers: int, host: str, port: int) -> None:
+    """Preload models, fork workers and replace any that exit until stopped"""
+    if sys.platform == 'win32':
+        raise SystemExit("serve.py forks workers and needs a POSIX platform; use main.py instead")
+
+    # Imported before forking, so workers share the parent's modules as well as its models
+    from main import app
+
+    if workers > 1:
+        for name, in_use in PER_WORKER_BACKENDS.items():
+            if in_use() and getattr(settings, name) == 'memory':
+                logger.warning("Backend state is per worker; set it to redis to share it", setting=name)
+
+    # ONNX Runtime sessions own thread pools, which do not survive fork; workers load them
+    shared = [name for name in settings.MODEL_PREWARM if settings.MODEL_BACKENDS.get(name) != 'onnx']
+    models = asyncio.run(preload_models(shared)) if shared else {}
+    torch = sys.modules.get('torch')
+    if torch is not None and torch.cuda.is_initialized():
+        raise SystemExit("CUDA was initialized while preloading; forked workers cannot use it. "
+                         "Leave CUDA models out of MODEL_PREWARM or run main.py per worker")
+
+    from app.core.registry import set_preloaded_models
+    set_preloaded_models(models)
+    # Keep the collector from touching, and so copying, the parent's objects in every worker
+    gc.freeze()
+
+    sock = bind_socket(host, port)
+    logger.info(
+        "Pre-fork server starting",
+        workers=workers,
+        host=host,
+        port=port,
+        preloaded={name: size_bytes for name, (_, size_bytes) in models.items()}
+    )
+
+    children: Dict[int, int] = {}
+    started: Dict[int, float] = {}
+    failures: Dict[int, int] = {}
+    restarts: Dict[int, float] = {}
+    stopping = False
+
+    def spawn(slot: int) -> None:
+        pid = os.fork()
+        if pid == 0:
+            code = 1
+            try:
+                code = run_worker(app, sock, slot)
+            except BaseException:
+                logger.exception("Worker failed", slot=slot)
+            finally:
+                os._exit(code)
+        children[pid] = slot
+        started[slot] = time.monotonic()
+        logger.info("Worker started", pid=pid, slot=slot)
+
+    def stop(signum, frame) -> None:
+        nonlocal stopping
+        stopping = True
+        for pid in children:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    for slot in range(workers):
+        spawn(slot)
+
+    while children or (restarts and not stopping):
+        try:
+            pid, status = os.waitpid(-1, os.WNOHANG)
+        except ChildProcessError:
+            pid = 0
+        if pid == 0:
+            now = time.monotonic()
+            for slot, due in list(restarts.items()):
+                if due <= now and not stopping:
+                    del restarts[slot]
+                    spawn(slot)
+            time.sleep(0.2)
+            continue
+
+        slot = children.pop(pid, None)
+        if slot is None:
+            continue
+        code = os.waitstatus_to_exitcode(status)
+        if stopping:
+            logger.info("Worker stopped", pid=pid, slot=slot)
+            continue
+
+        # Restart crashed workers promptly, but back off from ones that cannot start
+        if code == STARTUP_FAILED or time.monotonic() - started[slot] < STARTUP_GRACE:
+            failures[slot] = failures.get(slot, 0) + 1
+        else:
+            failures[slot] = 0
+        if failures[slot] >= MAX_STARTUP_FAILURES:
+            logger.error("Worker keeps failing at startup, not restarting it", slot=slot, status=code)
+            continue
+        delay = min(MAX_RESTART_DELAY, RESTART_DELAY * 2 ** failures[slot])
+        logger.warning("Worker exited, restarting", pid=pid, slot=slot, status=code, delay=delay)
+        restarts[slot] = time.monotonic() + delay
+
+    if not stopping:
+        sock.close()
+        raise SystemExit("Every worker failed at startup")
+
+    sock.close()
+    logger.info("Pre-fork server stopped")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--workers', type=int, default=settings.WORKERS)
+    parser.add_argument('--host', default=settings.HOST)
+    parser.add_argument('--port', type=int, default=settings.PORT)
+    args = parser.parse_args()
+
+    serve(args.workers, args.host, args.port)
+
+
+if __name__ == "__main__":
+    main()
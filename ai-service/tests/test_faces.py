@@ -0,0 +1,47 @@
+"""
+Face detection stage: concurrent requests share a detection that outlives a cancelled caller
+"""
+
+import asyncio
+
+import numpy as np
+
+from app.core.faces import FaceDetectionStage
+
+
+class SlowExecutor:
+    """Stands in for the CPU executor, finishing detections when released"""
+
+    def __init__(self):
+        self.calls = 0
+        self.release = None
+
+    async def run(self, transformation_type, image, parameters):
+        self.calls += 1
+        await self.release.wait()
+        return np.array([[1, 2, 3, 4]])
+
+
+def test_cancelled_caller_does_not_cancel_shared_detection():
+    async def scenario():
+        executor = SlowExecutor()
+        executor.release = asyncio.Event()
+        stage = FaceDetectionStage(executor, max_entries=4, max_side=0)
+        image = np.zeros((8, 8, 3), dtype=np.uint8)
+
+        first = asyncio.create_task(stage.detect(image, 'digest'))
+        second = asyncio.create_task(stage.detect(image, 'digest'))
+        await asyncio.sleep(0)
+        first.cancel()
+        await asyncio.sleep(0)
+        executor.release.set()
+
+        faces = await second
+        assert first.cancelled()
+        assert faces.tolist() == [[1, 2, 3, 4]]
+        assert (await stage.detect(image, 'digest')).tolist() == [[1, 2, 3, 4]]
+        return executor.calls, stage.get_stats()
+
+    calls, stats = asyncio.run(scenario())
+    assert calls == 1
+    assert stats['misses'] == 1 and stats['hits'] == 2
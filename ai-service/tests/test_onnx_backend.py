@@ -0,0 +1,51 @@
+"""
+ONNX backend: a network with a fixed input size is batched at that size
+"""
+
+import asyncio
+
+import numpy as np
+import pytest
+
+from app.core.batching import MicroBatcher, batch_policy
+from app.core.config import settings
+from app.core.onnx_backend import load_onnx_model
+
+onnx = pytest.importorskip('onnx')
+pytest.importorskip('onnxruntime')
+
+
+def write_identity_network(path, height, width):
+    """An identity network whose input is fixed at [N, 3, height, width]"""
+    from onnx import TensorProto, helper
+
+    graph = helper.make_graph(
+        [helper.make_node('Identity', ['input'], ['output'])],
+        'identity',
+        [helper.make_tensor_value_info('input', TensorProto.FLOAT, ['batch', 3, height, width])],
+        [helper.make_tensor_value_info('output', TensorProto.FLOAT, ['batch', 3, height, width])]
+    )
+    model = helper.make_model(graph, opset_imports=[helper.make_opsetid('', 17)])
+    model.ir_version = 8
+    onnx.save(model, str(path))
+
+
+def test_static_input_size_becomes_resize_to(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, 'MODEL_CACHE_DIR', str(tmp_path))
+    monkeypatch.setattr(settings, 'MODEL_BATCHING', {})
+    write_identity_network(tmp_path / 'style_transfer.onnx', 32, 48)
+
+    model, _ = load_onnx_model('style_transfer')
+    policy = batch_policy('style_transfer', model['input_size'])
+    assert model['input_size'] == (32, 48)
+    assert policy.resize_to == (32, 48)
+
+    async def scenario():
+        batcher = MicroBatcher('style_transfer', model['forward'], policy)
+        images = [np.full((h, w, 3), 100, dtype=np.uint8) for h, w in ((40, 50), (17, 23), (32, 48))]
+        return images, await asyncio.gather(*(batcher.submit(image) for image in images))
+
+    images, outputs = asyncio.run(scenario())
+    for image, output in zip(images, outputs):
+        assert output.shape == image.shape
+        assert np.array_equal(output, image)
@@ -0,0 +1,44 @@
+"""
+Pipelines with a batched step: alpha from earlier steps is carried past the network
+"""
+
+import asyncio
+
+import numpy as np
+
+from app.core.models import PIPELINE_TYPE, ModelManager
+
+
+def test_batched_pipeline_keeps_alpha(monkeypatch):
+    channels = []
+
+    def forward(batch):
+        channels.append(batch.shape[-1])
+        return 255 - batch
+
+    async def load_style_transfer(self):
+        return {'type': 'torch', 'forward': forward, 'device': 'cpu'}, 0
+
+    monkeypatch.setattr(ModelManager, '_load_style_transfer_model', load_style_transfer)
+
+    async def scenario():
+        manager = ModelManager()
+        manager.executor.start()
+        try:
+            image = np.full((64, 48, 3), 200, dtype=np.uint8)
+            image[16:48, 12:36] = (40, 90, 160)
+            steps = [
+                {'transformation_type': 'background_removal', 'parameters': {}},
+                {'transformation_type': 'style_transfer', 'parameters': {}},
+            ]
+            removed = await manager._apply('background_removal', image, None, {})
+            return removed, await manager._apply(PIPELINE_TYPE, image, None, {'steps': steps})
+        finally:
+            await manager.shutdown()
+
+    removed, result = asyncio.run(scenario())
+
+    assert channels and set(channels) == {3}
+    assert result.shape == (64, 48, 4)
+    assert np.array_equal(result[:, :, 3], removed[:, :, 3])
+    assert np.array_equal(result[:, :, :3], 255 - removed[:, :, :3])
@@ -0,0 +1,131 @@
+"""
+Job queue leases: jobs held by live processes stay theirs, abandoned jobs are requeued or dead-lettered
+"""
+
+import asyncio
+import time
+
+import fakeredis.aioredis
+import pytest
+import redis.asyncio
+
+from app.core.exceptions import QueueFullError
+from app.core.queue import MAX_PRIORITY, MIN_PRIORITY, Job, JobQueue, RedisQueueBackend, SQLiteQueueBackend
+
+
+def make_backends(kind, tmp_path, monkeypatch, lease_timeout=60.0, max_attempts=3):
+    """Two backends sharing one queue, as two worker processes would"""
+    if kind == 'sqlite':
+        path = str(tmp_path / 'queue.db')
+        return [SQLiteQueueBackend(path, lease_timeout, max_attempts) for _ in range(2)]
+
+    server = fakeredis.FakeServer()
+    monkeypatch.setattr(
+        redis.asyncio, 'from_url',
+        lambda url, **kwargs: fakeredis.aioredis.FakeRedis(server=server, **kwargs)
+    )
+    return [RedisQueueBackend('redis://fake', 'test:jobs', lease_timeout, max_attempts) for _ in range(2)]
+
+
+async def connected(backends):
+    for backend in backends:
+        await backend.connect()
+    return backends
+
+
+@pytest.mark.parametrize('kind', ['sqlite', 'redis'])
+def test_running_job_is_not_requeued_by_another_process(kind, tmp_path, monkeypatch):
+    async def scenario():
+        first, second = await connected(make_backends(kind, tmp_path, monkeypatch))
+        await first.push(Job('job-1', {}), 10)
+        job = await first.pop(0.1)
+        assert job.job_id == 'job-1' and job.attempts == 1
+
+        # A second process starting up, or sweeping, leaves a live lease alone
+        await second.connect()
+        assert await second.recover() == []
+        assert await second.pop(0.1) is None
+
+        await first.ack(job)
+        assert await first.size() == 0
+        for backend in (first, second):
+            await backend.close()
+
+    asyncio.run(scenario())
+
+
+@pytest.mark.parametrize('kind', ['sqlite', 'redis'])
+def test_expired_lease_is_requeued_then_dead_lettered(kind, tmp_path, monkeypatch):
+    async def scenario():
+        first, second = await connected(make_backends(kind, tmp_path, monkeypatch, lease_timeout=0.05, max_attempts=2))
+        await first.push(Job('job-1', {'n': 1}, priority=5), 10)
+
+        # The holder dies without acknowledging; its lease runs out
+        assert (await first.pop(0.1)).attempts == 1
+        time.sleep(0.1)
+        assert await second.recover() == []
+        job = await second.pop(0.1)
+        assert job.job_id == 'job-1' and job.attempts == 2 and job.payload == {'n': 1}
+
+        # A stale holder's ack does not remove the job from its new holder
+        await first.ack(job)
+        time.sleep(0.1)
+        dead = await first.recover()
+        assert [(job.job_id, job.attempts) for job in dead] == [('job-1', 2)]
+        assert await second.pop(0.1) is None
+        for backend in (first, second):
+            await backend.close()
+
+    asyncio.run(scenario())
+
+
+@pytest.mark.parametrize('kind', ['sqlite', 'redis'])
+def test_renewed_lease_survives_recovery(kind, tmp_path, monkeypatch):
+    async def scenario():
+        first, second = await connected(make_backends(kind, tmp_path, monkeypatch, lease_timeout=0.2))
+        await first.push(Job('job-1', {}), 10)
+        job = await first.pop(0.1)
+        for _ in range(3):
+            time.sleep(0.1)
+            await first.renew([job])
+            assert await second.recover() == []
+        assert await second.pop(0.05) is None
+        for backend in (first, second):
+            await backend.close()
+
+    asyncio.run(scenario())
+
+
+@pytest.mark.parametrize('kind', ['sqlite', 'redis'])
+def test_concurrent_submits_do_not_overfill_the_queue(kind, tmp_path, monkeypatch):
+    async def scenario():
+        backends = await connected(make_backends(kind, tmp_path, monkeypatch))
+        queues = [JobQueue(backend, max_size=3) for backend in backends]
+        results = await asyncio.gather(
+            *(queues[n % 2].submit(Job(f'job-{n}', {})) for n in range(10)),
+            return_exceptions=True
+        )
+        depth = await backends[0].size()
+        for backend in backends:
+            await backend.close()
+        return results, depth
+
+    results, depth = asyncio.run(scenario())
+    assert sum(result is None for result in results) == 3
+    assert all(result is None or isinstance(result, QueueFullError) for result in results)
+    assert depth == 3
+
+
+@pytest.mark.parametrize('kind', ['sqlite', 'redis'])
+def test_extreme_priorities_keep_fifo_order(kind, tmp_path, monkeypatch):
+    async def scenario():
+        backend, _ = await connected(make_backends(kind, tmp_path, monkeypatch))
+        for priority in (MIN_PRIORITY, MAX_PRIORITY):
+            for n in range(3):
+                await backend.push(Job(f'{priority}-{n}', {}, priority=priority), 10)
+        order = [(await backend.pop(0.1)).job_id for _ in range(6)]
+        await backend.close()
+        return order
+
+    order = asyncio.run(scenario())
+    assert order == [f'{MAX_PRIORITY}-{n}' for n in range(3)] + [f'{MIN_PRIORITY}-{n}' for n in range(3)]
@@ -0,0 +1,46 @@
+"""
+Result cache hits: a request gets its own copy of the cached output, which outlives eviction
+"""
+
+import asyncio
+import os
+
+import numpy as np
+import cv2
+
+from app.core.cache import ResultCache
+from app.core.models import ModelManager
+
+
+def test_cache_hit_returns_a_copy_at_the_request_output_path(tmp_path):
+    async def scenario():
+        manager = ModelManager()
+        manager.result_cache = ResultCache(str(tmp_path / 'cache'), max_bytes=10 ** 9)
+        await manager.result_cache.load()
+        manager.executor.start()
+        try:
+            image = np.random.default_rng(0).integers(0, 256, (32, 32, 3), dtype=np.uint8)
+            input_path = str(tmp_path / 'input.png')
+            cv2.imwrite(input_path, image)
+
+            first = await manager.process_image(input_path, 'style_transfer', {})
+            os.remove(first)
+            second = await manager.process_image(input_path, 'style_transfer', {})
+            pipeline_steps = {'steps': [{'transformation_type': 'style_transfer'}]}
+            await manager.process_image(input_path, 'pipeline', pipeline_steps)
+            pipeline = await manager.process_image(input_path, 'pipeline', pipeline_steps)
+            return first, second, pipeline, manager.result_cache
+        finally:
+            await manager.shutdown()
+
+    first, second, pipeline, cache = asyncio.run(scenario())
+
+    assert cache.hits == 2
+    assert second == first == str(tmp_path / 'input_styled.png')
+    assert pipeline == str(tmp_path / 'input_pipeline.png')
+
+    # Evicting everything leaves the requests' outputs in place
+    cache.max_bytes = 0
+    cache._evict()
+    assert os.listdir(cache.directory) == []
+    assert os.path.exists(second) and os.path.exists(pipeline)
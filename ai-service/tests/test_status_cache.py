@@ -0,0 +1,37 @@
+"""
+Status cache: a resubmit seen by one worker reaches the others' final rows within the TTL
+"""
+
+import asyncio
+import time
+
+from app.core.status_cache import StatusCache
+
+
+def test_resubmit_in_one_worker_reaches_another_workers_final_row():
+    async def scenario():
+        rows = {'job-1': {'id': 'job-1', 'status': 'completed'}}
+
+        async def fetch(transformation_id):
+            return dict(rows[transformation_id])
+
+        # Two workers' memory caches over one database row
+        first, second = (StatusCache(ttl=0.05, terminal_ttl=300, max_entries=10) for _ in range(2))
+        for cache in (first, second):
+            assert (await cache.get('job-1', fetch))['status'] == 'completed'
+
+        # The first worker takes the resubmit; the second never hears of it
+        rows['job-1']['status'] = 'pending'
+        await first.invalidate(['job-1'])
+        assert (await first.get('job-1', fetch))['status'] == 'pending'
+
+        time.sleep(0.1)
+        assert (await second.get('job-1', fetch))['status'] == 'pending'
+
+        # And the resubmitted job's new final status
+        rows['job-1']['status'] = 'failed'
+        time.sleep(0.1)
+        assert (await first.get('job-1', fetch))['status'] == 'failed'
+        assert (await second.get('job-1', fetch))['status'] == 'failed'
+
+    asyncio.run(scenario())
@@ -0,0 +1,93 @@
+"""
+S3 uploads against a moto server: single and multipart uploads, and which failures are retried
+"""
+
+import asyncio
+import socket
+
+import pytest
+from botocore.exceptions import ClientError, EndpointConnectionError
+from moto.server import ThreadedMotoServer
+
+from app.core.config import settings
+from app.core.storage import MIN_PART_SIZE, S3Uploader, is_retryable
+
+
+@pytest.fixture(scope='module')
+def endpoint_url():
+    with socket.socket() as probe:
+        probe.bind(('127.0.0.1', 0))
+        port = probe.getsockname()[1]
+    server = ThreadedMotoServer(ip_address='127.0.0.1', port=port)
+    server.start()
+    yield f"http://127.0.0.1:{port}"
+    server.stop()
+
+
+@pytest.fixture
+def credentials(monkeypatch):
+    monkeypatch.setattr(settings, 'AWS_ACCESS_KEY_ID', 'testing')
+    monkeypatch.setattr(settings, 'AWS_SECRET_ACCESS_KEY', 'testing')
+
+
+def client_error(status, code='Error'):
+    return ClientError({'Error': {'Code': code}, 'ResponseMetadata': {'HTTPStatusCode': status}}, 'PutObject')
+
+
+def test_uploads_single_and_multipart_objects(endpoint_url, credentials):
+    async def scenario():
+        uploader = S3Uploader(
+            bucket='outputs', endpoint_url=endpoint_url,
+            multipart_threshold=MIN_PART_SIZE, part_size=MIN_PART_SIZE, max_attempts=1
+        )
+        await uploader.start()
+        try:
+            await uploader._client.create_bucket(Bucket='outputs')
+            small = b'small output'
+            large = bytes(range(256)) * (MIN_PART_SIZE // 256 * 2 + 3)
+            assert await uploader.upload_bytes(small, 'a/small.jpg', 'image/jpeg') == len(small)
+            assert await uploader.upload_bytes(large, 'a/large.png', 'image/png') == len(large)
+
+            stored = {}
+            for key in ('a/small.jpg', 'a/large.png'):
+                response = await uploader._client.get_object(Bucket='outputs', Key=key)
+                async with response['Body'] as body:
+                    stored[key] = (await body.read(), response['ContentType'])
+            uploads = await uploader._client.list_multipart_uploads(Bucket='outputs')
+            return uploader.get_stats(), stored, uploads.get('Uploads', [])
+        finally:
+            await uploader.close()
+
+    stats, stored, pending_uploads = asyncio.run(scenario())
+
+    assert stored['a/small.jpg'][0] == b'small output' and stored['a/small.jpg'][1] == 'image/jpeg'
+    assert len(stored['a/large.png'][0]) == MIN_PART_SIZE * 2 + 3 * 256
+    assert stats['uploads'] == 2 and stats['multipart_uploads'] == 1 and stats['failures'] == 0
+    assert pending_uploads == []
+
+
+def test_missing_bucket_is_not_retried(endpoint_url, credentials):
+    async def scenario():
+        uploader = S3Uploader(bucket='missing', endpoint_url=endpoint_url, max_attempts=4)
+        await uploader.start()
+        try:
+            with pytest.raises(Exception, match='NoSuchBucket'):
+                await uploader.upload_bytes(b'data', 'key.jpg', 'image/jpeg')
+            return uploader.get_stats()
+        finally:
+            await uploader.close()
+
+    stats = asyncio.run(scenario())
+    assert stats['retries'] == 0 and stats['failures'] == 1
+
+
+def test_only_transient_failures_are_retryable():
+    assert is_retryable(client_error(503))
+    assert is_retryable(client_error(429))
+    assert is_retryable(client_error(400, 'RequestTimeout'))
+    assert is_retryable(EndpointConnectionError(endpoint_url='http://s3'))
+    assert is_retryable(asyncio.TimeoutError())
+    assert not is_retryable(client_error(403, 'AccessDenied'))
+    assert not is_retryable(client_error(404, 'NoSuchBucket'))
+    assert not is_retryable(ValueError('bad argument'))
+    assert not is_retryable(FileNotFoundError('output.jpg'))
@@ -0,0 +1,45 @@
+"""
+Transformation endpoints: pipeline steps without a kernel are rejected before queueing
+"""
+
+from fastapi import FastAPI
+from fastapi.responses import JSONResponse
+from fastapi.testclient import TestClient
+
+from app.api.v1.endpoints import transformations
+from app.core.database import get_db
+from app.core.exceptions import MorphFluxException
+
+
+def make_client():
+    app = FastAPI()
+    app.include_router(transformations.router)
+    app.dependency_overrides[get_db] = lambda: None
+
+    @app.exception_handler(MorphFluxException)
+    async def handle(request, exc):
+        return JSONResponse(status_code=exc.status_code, content={'error': exc.message})
+
+    return TestClient(app)
+
+
+def test_pipeline_steps_without_a_kernel_are_rejected(tmp_path):
+    client = make_client()
+    image_path = tmp_path / 'input.jpg'
+    image_path.write_bytes(b'jpeg')
+
+    for step_type in ('object_removal', 'background_replacement'):
+        response = client.post('/process/pipeline', json={
+            'transformation_id': 'job-1',
+            'input_image_path': str(image_path),
+            'steps': [{'transformation_type': 'style_transfer'}, {'transformation_type': step_type}]
+        })
+        assert response.status_code == 400
+        assert step_type in response.json()['error']
+
+        response = client.post(
+            '/process/raw',
+            params={'transformation_type': 'pipeline', 'parameters': f'{{"steps": [{{"transformation_type": "{step_type}"}}]}}'},
+            content=b'jpeg'
+        )
+        assert response.status_code == 400
@@ -0,0 +1,80 @@
+"""
+Worker pool: a worker loop survives handler cancellation and acknowledgement failures
+"""
+
+import asyncio
+
+from app.core.queue import Job, JobQueue, MemoryQueueBackend
+from app.core.worker import WorkerPool
+
+
+class FlakyAckBackend(MemoryQueueBackend):
+    """Memory backend whose first acknowledgement fails, as on a Redis blip"""
+
+    lease_timeout = 0.3
+
+    def __init__(self, dead=()):
+        super().__init__()
+        self.acked = []
+        self.dead = list(dead)
+
+    async def ack(self, job):
+        if not self.acked:
+            self.acked.append(None)
+            raise ConnectionError("connection reset")
+        self.acked.append(job.job_id)
+
+    async def recover(self):
+        dead, self.dead = self.dead, []
+        return dead
+
+
+def test_worker_survives_cancelled_handler_and_failed_ack():
+    async def scenario():
+        handled = []
+
+        async def handler(job):
+            handled.append(job.job_id)
+            if job.job_id == 'cancelled':
+                raise asyncio.CancelledError()
+
+        backend = FlakyAckBackend()
+        queue = JobQueue(backend, max_size=10)
+        pool = WorkerPool(queue, handler, concurrency=1)
+        await pool.start()
+        for job_id in ('cancelled', 'second', 'third'):
+            await queue.submit(Job(job_id, {}))
+
+        for _ in range(50):
+            if len(handled) == 3:
+                break
+            await asyncio.sleep(0.02)
+        await pool.stop()
+
+        assert handled == ['cancelled', 'second', 'third']
+        assert backend.acked == [None, 'second', 'third']
+
+    asyncio.run(scenario())
+
+
+def test_dead_lettered_jobs_reach_the_handler():
+    async def scenario():
+        dead_lettered = []
+
+        async def dead_letter(job):
+            dead_lettered.append((job.job_id, job.attempts))
+
+        async def handler(job):
+            pass
+
+        backend = FlakyAckBackend(dead=[Job('stuck', {}, attempts=3)])
+        queue = JobQueue(backend, max_size=10)
+        pool = WorkerPool(queue, handler, concurrency=1, dead_letter=dead_letter)
+        await pool.start()
+        await asyncio.sleep(0.05)
+        await pool.stop()
+
+        assert dead_lettered == [('stuck', 3)]
+        assert (await queue.get_stats())['dead_lettered'] == 1
+
+    asyncio.run(scenario())